@@ -0,0 +1,51 @@
+import importlib
+import json
+
+from django.core.management.base import BaseCommand
+
+BENCHMARKS = {
+    'estabelecimentos': 'benchmarks.estabelecimentos',
+    'export': 'benchmarks.export',
+    'gravacao': 'benchmarks.gravacao',
+    'indicadores': 'benchmarks.indicadores',
+    'ingestao': 'benchmarks.ingestao',
+    'mapeamento': 'benchmarks.mapeamento',
+    'proximos': 'benchmarks.proximos',
+    'rollups': 'benchmarks.rollups',
+}
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks against an isolated test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(BENCHMARKS))
+        parser.add_argument('--rows', type=int, default=50000)
+        # Opções da API simulada, usadas pelas suítes estabelecimentos e ingestao
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Delay per simulated API request, in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of simulated API requests answered with 500')
+        parser.add_argument('--throttle-rate', type=float, default=0.0,
+                            help='Fraction of simulated API requests answered with 429')
+        parser.add_argument('--recording', help='JSON file with recorded API records per route')
+        parser.add_argument('--rate-limit', type=float,
+                            help='Requests per second the simulated API accepts before answering 429')
+        parser.add_argument('--max-page-size', type=int,
+                            help='Largest limit the simulated API accepts; larger pages get 400')
+        parser.add_argument('--no-rate-limiter', dest='rate_limiter', action='store_false',
+                            help='Turn off the rate limiter of the ETL HTTP client')
+        parser.add_argument('--page-size', type=int,
+                            help='Fixed API page size for the ETLs instead of negotiating one')
+        parser.add_argument('--uf', default='29',
+                            help="UFs loaded by the ingestao suite, separated by commas, or 'all'")
+        parser.add_argument('--shard-workers', type=int, default=4,
+                            help='UFs downloaded in parallel by the ingestao suite')
+        parser.add_argument('--cache', action='store_true',
+                            help='Also run the ETLs with a cold, revalidated and offline page cache')
+
+    def handle(self, *args, **options):
+        module = importlib.import_module(BENCHMARKS[options['suite']])
+        results = module.run(**options)
+        for result in results:
+            self.stdout.write(json.dumps(result, ensure_ascii=False))
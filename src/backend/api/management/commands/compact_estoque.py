@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from api.snapshots import compact_snapshots, rebuild_snapshots
+
+class Command(BaseCommand):
+    help = 'Compact Estoque snapshot partitions older than the configured retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retencao-dias', type=int, default=None,
+                            help='Override ESTOQUE_SNAPSHOT_RETENCAO_DIAS')
+        parser.add_argument('--serie-retencao-dias', type=int, default=None,
+                            help='Override ESTOQUE_SERIE_RETENCAO_DIAS')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild the snapshot catalog, time series and spatial index before compacting')
+
+    def handle(self, *args, **options):
+        try:
+            if options['rebuild']:
+                rebuild_snapshots()
+            result = compact_snapshots(options['retencao_dias'], options['serie_retencao_dias'])
+            self.stdout.write(self.style.SUCCESS(f'Compaction completed: {result}'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Compaction failed: {str(e)}'))
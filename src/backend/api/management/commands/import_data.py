@@ -4,10 +4,47 @@ from etl.data_processor import HealthDataETL
 class Command(BaseCommand):
     help = 'Run ETL process for health indicators'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--export-csv',
+            action='store_true',
+            help='Also write the parsed sheets and metadata to CSV under assets/ (implies --full)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reprocess every sheet, ignoring the content hashes of the last import',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of processes used to parse sheets (default: CPU count)',
+        )
+        parser.add_argument(
+            '--validate',
+            action='store_true',
+            help='Check header position, year columns, IBGE codes, value ranges and duplicate '
+                 'municipalities of the parsed sheets and abort before writing if any check fails',
+        )
+        parser.add_argument(
+            '--report',
+            metavar='PATH',
+            help="Write a JSON report with per-stage timings, row counts and memory to PATH ('-' for stdout)",
+        )
+
     def handle(self, *args, **options):
-        etl = HealthDataETL()
+        etl = HealthDataETL(workers=options['workers'])
         try:
-            etl.process_excel_file('assets/data/serie_historica.xlsx')
+            etl.process_excel_file(
+                'assets/data/serie_historica.xlsx',
+                export_csv=options['export_csv'],
+                full=options['full'],
+                validate=options['validate'],
+            )
             self.stdout.write(self.style.SUCCESS('ETL completed successfully'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'ETL failed: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'ETL failed: {str(e)}'))
+        finally:
+            if options['report']:
+                etl.report.write(options['report'])
@@ -1,13 +1,77 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from etl.etl_estoque import EstoqueETL
+from etl.page_cache import PageCache
+from etl.sharding import parse_ufs
 
 class Command(BaseCommand):
-    help = 'Run ETL process for health indicators'
+    help = (
+        'Load stock positions from the DAF API. Each page is written to the final tables as it is '
+        'downloaded, so they are not atomic during a run; rows of the current snapshot and its derived '
+        'tables only change when each UF is published'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uf',
+            type=parse_ufs,
+            default='29',
+            help="UF codes or abbreviations separated by commas, or 'all' (default: 29)",
+        )
+        parser.add_argument(
+            '--shard-workers',
+            type=int,
+            default=4,
+            help='Number of UFs downloaded in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            help='Records per API page (default: the largest size the API accepts)',
+        )
+        parser.add_argument(
+            '--cache',
+            action='store_true',
+            help='Keep raw API pages in ETL_API_CACHE_DIR and revalidate them with conditional requests',
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='Read API pages only from the cache, without network access (implies --cache)',
+        )
+        parser.add_argument(
+            '--bulk-load',
+            action='store_true',
+            help='Load with fast, non-durable SQLite settings, executemany upserts and deferred '
+                 'indexes, restoring the settings and running an integrity check at the end',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue the last unpublished run from its last staged page instead of starting over',
+        )
+        parser.add_argument(
+            '--report',
+            metavar='PATH',
+            help="Write a JSON report with per-stage timings, row counts and memory to PATH ('-' for stdout)",
+        )
 
     def handle(self, *args, **options):
-        etl = EstoqueETL()
+        cache = None
+        if options['cache'] or options['offline']:
+            cache = PageCache(settings.ETL_API_CACHE_DIR, offline=options['offline'])
+        etl = EstoqueETL(
+            uf_code=options['uf'],
+            shard_workers=options['shard_workers'],
+            page_size=options['page_size'],
+            cache=cache,
+            bulk_load=options['bulk_load'],
+        )
         try:
-            etl.run()
+            etl.run(resume=options['resume'])
             self.stdout.write(self.style.SUCCESS('ETL completed successfully'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'ETL failed: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'ETL failed: {str(e)}'))
+        finally:
+            if options['report']:
+                etl.report.write(options['report'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.rollups import refresh_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild all precomputed Estoque rollups from scratch'
+
+    def handle(self, *args, **options):
+        try:
+            refreshed = refresh_rollups()
+            for name, rows in refreshed.items():
+                self.stdout.write(f'{name}: {rows} rows')
+            self.stdout.write(self.style.SUCCESS('Rollups rebuilt successfully'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Rollup rebuild failed: {str(e)}'))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_estabelecimento_codigo_atividade_ensino_unidade_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Estoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_uf', models.IntegerField(default=0)),
+                ('uf', models.CharField(max_length=2, null=True)),
+                ('codigo_municipio', models.IntegerField()),
+                ('municipio', models.CharField(max_length=255, null=True)),
+                ('codigo_cnes', models.IntegerField()),
+                ('data_posicao_estoque', models.CharField(max_length=255, null=True)),
+                ('codigo_catmat', models.CharField(max_length=255, null=True)),
+                ('descricao_produto', models.CharField(max_length=255, null=True)),
+                ('quantidade_estoque', models.IntegerField()),
+                ('numero_lote', models.CharField(max_length=255, null=True)),
+                ('data_validade', models.CharField(max_length=255, null=True)),
+                ('tipo_produto', models.CharField(max_length=255, null=True)),
+                ('sigla_programa_saude', models.CharField(max_length=255, null=True)),
+                ('descricao_programa_saude', models.CharField(max_length=255, null=True)),
+                ('sigla_sistema_origem', models.CharField(max_length=255, null=True)),
+                ('razao_social', models.CharField(max_length=255, null=True)),
+                ('nome_fantasia', models.CharField(max_length=255, null=True)),
+                ('cep', models.CharField(max_length=20, null=True)),
+                ('logradouro', models.CharField(max_length=255, null=True)),
+                ('numero_endereco', models.CharField(max_length=255, null=True)),
+                ('bairro', models.CharField(max_length=255)),
+                ('telefone', models.CharField(max_length=20, null=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('email', models.CharField(max_length=255, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from django.db import migrations, models
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y%m%d', '%d-%m-%Y')
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    text = str(value).strip().replace('T', ' ').split(' ')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_dates(apps, schema_editor):
+    Estoque = apps.get_model('api', 'Estoque')
+    batch = []
+    for estoque in Estoque.objects.only(
+        'id', 'data_posicao_estoque_original', 'data_validade_original'
+    ).iterator(chunk_size=2000):
+        estoque.data_posicao_estoque = _parse_date(estoque.data_posicao_estoque_original)
+        estoque.data_validade = _parse_date(estoque.data_validade_original)
+        batch.append(estoque)
+        if len(batch) >= 2000:
+            Estoque.objects.bulk_update(batch, ['data_posicao_estoque', 'data_validade'])
+            batch = []
+    if batch:
+        Estoque.objects.bulk_update(batch, ['data_posicao_estoque', 'data_validade'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_estoque'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='estoque',
+            old_name='data_posicao_estoque',
+            new_name='data_posicao_estoque_original',
+        ),
+        migrations.RenameField(
+            model_name='estoque',
+            old_name='data_validade',
+            new_name='data_validade_original',
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='data_posicao_estoque',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='data_validade',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.RunPython(parse_dates, migrations.RunPython.noop),
+    ]
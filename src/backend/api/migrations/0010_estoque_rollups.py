@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_estoque_typed_dates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='estoque',
+            name='codigo_catmat',
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='estoque',
+            name='codigo_cnes',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.CreateModel(
+            name='EstoqueEstabelecimentoTipoProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_estoque', models.BigIntegerField(default=0)),
+                ('lotes', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('codigo_cnes', models.IntegerField()),
+                ('tipo_produto', models.CharField(max_length=255, null=True)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('codigo_cnes', 'tipo_produto')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EstoqueProdutoMunicipio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_estoque', models.BigIntegerField(default=0)),
+                ('lotes', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('codigo_catmat', models.CharField(max_length=255, null=True)),
+                ('codigo_municipio', models.IntegerField()),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('codigo_catmat', 'codigo_municipio')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EstoqueProdutoPrograma',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_estoque', models.BigIntegerField(default=0)),
+                ('lotes', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('codigo_catmat', models.CharField(max_length=255, null=True)),
+                ('sigla_programa_saude', models.CharField(max_length=255, null=True)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('codigo_catmat', 'sigla_programa_saude')},
+            },
+        ),
+    ]
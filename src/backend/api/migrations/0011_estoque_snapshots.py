@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:00
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+SNAPSHOT_KEY = ('data_posicao_estoque', 'codigo_cnes', 'codigo_catmat', 'numero_lote', 'sigla_programa_saude')
+
+
+def deduplicate_estoque(apps, schema_editor):
+    """Normaliza campos nulos da chave natural e remove linhas repetidas antes da restrição única"""
+    Estoque = apps.get_model('api', 'Estoque')
+    Estoque.objects.filter(numero_lote__isnull=True).update(numero_lote='')
+    Estoque.objects.filter(sigla_programa_saude__isnull=True).update(sigla_programa_saude='')
+    duplicates = Estoque.objects.values(*SNAPSHOT_KEY).annotate(
+        keep=Max('id'), total=Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in duplicates:
+        keep = row.pop('keep')
+        row.pop('total')
+        Estoque.objects.filter(**row).exclude(id=keep).delete()
+
+
+def build_snapshots(apps, schema_editor):
+    Estoque = apps.get_model('api', 'Estoque')
+    EstoqueSnapshot = apps.get_model('api', 'EstoqueSnapshot')
+    EstoqueSerie = apps.get_model('api', 'EstoqueSerie')
+
+    for row in Estoque.objects.exclude(data_posicao_estoque=None).values(
+        'data_posicao_estoque'
+    ).annotate(registros=Count('id')).order_by():
+        EstoqueSnapshot.objects.create(
+            data_posicao=row['data_posicao_estoque'], registros=row['registros']
+        )
+
+    EstoqueSerie.objects.bulk_create(
+        [
+            EstoqueSerie(
+                data_posicao=row['data_posicao_estoque'],
+                codigo_cnes=row['codigo_cnes'],
+                codigo_catmat=row['codigo_catmat'],
+                quantidade_estoque=row['quantidade_estoque'],
+                lotes=row['lotes'],
+            )
+            for row in Estoque.objects.exclude(data_posicao_estoque=None).values(
+                'data_posicao_estoque', 'codigo_cnes', 'codigo_catmat'
+            ).annotate(
+                quantidade_estoque=Sum('quantidade_estoque'), lotes=Count('id')
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+
+    por_data = defaultdict(list)
+    for row in Estoque.objects.values('codigo_cnes').annotate(
+        data=Max('data_posicao_estoque')
+    ).order_by():
+        por_data[row['data']].append(row['codigo_cnes'])
+    for data_posicao, cnes in por_data.items():
+        for i in range(0, len(cnes), 500):
+            Estoque.objects.filter(
+                codigo_cnes__in=cnes[i:i + 500], data_posicao_estoque=data_posicao
+            ).update(atual=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_estoque_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstoqueSerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_posicao', models.DateField()),
+                ('codigo_cnes', models.IntegerField()),
+                ('codigo_catmat', models.CharField(max_length=255, null=True)),
+                ('quantidade_estoque', models.BigIntegerField(default=0)),
+                ('lotes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstoqueSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_posicao', models.DateField(unique=True)),
+                ('registros', models.IntegerField(default=0)),
+                ('compactado', models.BooleanField(default=False)),
+                ('carregado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='atual',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddIndex(
+            model_name='estoque',
+            index=models.Index(fields=['codigo_cnes', 'data_posicao_estoque'], name='estoque_cnes_posicao_idx'),
+        ),
+        migrations.RunPython(deduplicate_estoque, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='estoque',
+            constraint=models.UniqueConstraint(fields=('data_posicao_estoque', 'codigo_cnes', 'codigo_catmat', 'numero_lote', 'sigla_programa_saude'), name='estoque_snapshot_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='estoqueserie',
+            index=models.Index(fields=['codigo_catmat', 'data_posicao'], name='serie_catmat_posicao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estoqueserie',
+            index=models.Index(fields=['codigo_cnes', 'data_posicao'], name='serie_cnes_posicao_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='estoqueserie',
+            unique_together={('data_posicao', 'codigo_cnes', 'codigo_catmat')},
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Max
+
+FACILITY_FIELDS = [
+    'codigo_uf', 'uf', 'codigo_municipio', 'municipio', 'razao_social', 'nome_fantasia',
+    'cep', 'logradouro', 'numero_endereco', 'bairro', 'telefone', 'latitude', 'longitude', 'email',
+]
+PRODUCT_FIELDS = ['descricao_produto', 'tipo_produto']
+PROGRAMME_FIELDS = ['descricao_programa_saude']
+REMOVED_FIELDS = (
+    FACILITY_FIELDS + PRODUCT_FIELDS + PROGRAMME_FIELDS
+    + ['codigo_cnes', 'codigo_catmat', 'sigla_programa_saude']
+)
+
+
+def populate_dimensions(apps, schema_editor):
+    """Move as colunas repetidas de Estoque para as dimensões, usando a linha mais recente de cada chave"""
+    Estoque = apps.get_model('api', 'Estoque')
+    EstabelecimentoEstoque = apps.get_model('api', 'EstabelecimentoEstoque')
+    Produto = apps.get_model('api', 'Produto')
+    ProgramaSaude = apps.get_model('api', 'ProgramaSaude')
+
+    # NULL e '' viram a mesma chave da dimensão, então precisam formar um único grupo
+    Estoque.objects.filter(codigo_catmat__isnull=True).update(codigo_catmat='')
+    Estoque.objects.filter(sigla_programa_saude__isnull=True).update(sigla_programa_saude='')
+
+    def latest_rows(key):
+        ids = Estoque.objects.values(key).annotate(ultimo=Max('id')).values_list('ultimo', flat=True)
+        return Estoque.objects.filter(id__in=list(ids))
+
+    EstabelecimentoEstoque.objects.bulk_create([
+        EstabelecimentoEstoque(codigo_cnes=row.codigo_cnes, **{f: getattr(row, f) for f in FACILITY_FIELDS})
+        for row in latest_rows('codigo_cnes')
+    ], batch_size=1000)
+    Estoque.objects.update(estabelecimento_id=F('codigo_cnes'))
+
+    for row in latest_rows('codigo_catmat'):
+        produto = Produto.objects.create(
+            codigo_catmat=row.codigo_catmat, **{f: getattr(row, f) for f in PRODUCT_FIELDS}
+        )
+        Estoque.objects.filter(codigo_catmat=row.codigo_catmat).update(produto=produto)
+
+    for row in latest_rows('sigla_programa_saude'):
+        programa = ProgramaSaude.objects.create(
+            sigla_programa_saude=row.sigla_programa_saude,
+            **{f: getattr(row, f) for f in PROGRAMME_FIELDS}
+        )
+        Estoque.objects.filter(sigla_programa_saude=row.sigla_programa_saude).update(programa=programa)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_estoque_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstabelecimentoEstoque',
+            fields=[
+                ('codigo_cnes', models.IntegerField(primary_key=True, serialize=False)),
+                ('codigo_uf', models.IntegerField(default=0)),
+                ('uf', models.CharField(max_length=2, null=True)),
+                ('codigo_municipio', models.IntegerField(db_index=True)),
+                ('municipio', models.CharField(max_length=255, null=True)),
+                ('razao_social', models.CharField(max_length=255, null=True)),
+                ('nome_fantasia', models.CharField(max_length=255, null=True)),
+                ('cep', models.CharField(max_length=20, null=True)),
+                ('logradouro', models.CharField(max_length=255, null=True)),
+                ('numero_endereco', models.CharField(max_length=255, null=True)),
+                ('bairro', models.CharField(max_length=255)),
+                ('telefone', models.CharField(max_length=20, null=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('email', models.CharField(max_length=255, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Produto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_catmat', models.CharField(max_length=255, unique=True)),
+                ('descricao_produto', models.CharField(max_length=255, null=True)),
+                ('tipo_produto', models.CharField(max_length=255, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProgramaSaude',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sigla_programa_saude', models.CharField(max_length=255, unique=True)),
+                ('descricao_programa_saude', models.CharField(max_length=255, null=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='estoque',
+            name='estoque_snapshot_unico',
+        ),
+        migrations.RemoveIndex(
+            model_name='estoque',
+            name='estoque_cnes_posicao_idx',
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='estabelecimento',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.estabelecimentoestoque'),
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='produto',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.produto'),
+        ),
+        migrations.AddField(
+            model_name='estoque',
+            name='programa',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.programasaude'),
+        ),
+        migrations.RunPython(populate_dimensions, migrations.RunPython.noop),
+        *[
+            migrations.RemoveField(model_name='estoque', name=field)
+            for field in REMOVED_FIELDS
+        ],
+        migrations.AlterField(
+            model_name='estoque',
+            name='estabelecimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.estabelecimentoestoque'),
+        ),
+        migrations.AlterField(
+            model_name='estoque',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.produto'),
+        ),
+        migrations.AlterField(
+            model_name='estoque',
+            name='programa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.programasaude'),
+        ),
+        migrations.AddConstraint(
+            model_name='estoque',
+            constraint=models.UniqueConstraint(fields=('data_posicao_estoque', 'estabelecimento', 'produto', 'numero_lote', 'programa'), name='estoque_snapshot_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='estoque',
+            index=models.Index(fields=['estabelecimento', 'data_posicao_estoque'], name='estoque_cnes_posicao_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_estoque_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstoqueLocalizacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celula_lat', models.IntegerField()),
+                ('celula_lon', models.IntegerField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('quantidade_estoque', models.BigIntegerField(default=0)),
+                ('estabelecimento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.estabelecimentoestoque')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.produto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['produto', 'celula_lat', 'celula_lon'], name='localizacao_celula_idx')],
+                'unique_together': {('produto', 'estabelecimento')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_estoque_localizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManifestoPlanilha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('hash_conteudo', models.CharField(max_length=64)),
+                ('importado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Une macrorregiões e regiões repetidas antes de criar as chaves naturais"""
+    MacroRegiao = apps.get_model('api', 'MacroRegiao')
+    RegiaoSaude = apps.get_model('api', 'RegiaoSaude')
+    Cidade = apps.get_model('api', 'Cidade')
+
+    duplicadas = (
+        MacroRegiao.objects.values('nome')
+        .annotate(manter=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicadas:
+        outras = MacroRegiao.objects.filter(nome=grupo['nome']).exclude(id=grupo['manter'])
+        RegiaoSaude.objects.filter(macro_regiao__in=outras).update(macro_regiao_id=grupo['manter'])
+        outras.delete()
+
+    duplicadas = (
+        RegiaoSaude.objects.values('nome', 'macro_regiao')
+        .annotate(manter=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicadas:
+        outras = RegiaoSaude.objects.filter(
+            nome=grupo['nome'], macro_regiao=grupo['macro_regiao']
+        ).exclude(id=grupo['manter'])
+        Cidade.objects.filter(regiao_saude__in=outras).update(regiao_saude_id=grupo['manter'])
+        outras.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_manifesto_planilha'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='macroregiao',
+            name='nome',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='regiaosaude',
+            unique_together={('nome', 'macro_regiao')},
+        ),
+    ]
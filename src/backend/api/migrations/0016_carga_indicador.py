@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_regiao_natural_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaIndicador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash_conteudo', models.CharField(max_length=64)),
+                ('inseridos', models.IntegerField(default=0)),
+                ('atualizados', models.IntegerField(default=0)),
+                ('removidos', models.IntegerField(default=0)),
+                ('carregado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('indicador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas', to='api.indicador')),
+            ],
+            options={
+                'ordering': ['-carregado_em'],
+            },
+        ),
+    ]
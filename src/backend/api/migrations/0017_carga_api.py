@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:46
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_carga_indicador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaApi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('fonte', models.CharField(max_length=50)),
+                ('uf', models.IntegerField()),
+                ('status', models.CharField(choices=[('baixando', 'Baixando'), ('baixado', 'Baixado'), ('publicado', 'Publicado')], default='baixando', max_length=20)),
+                ('ultimo_offset', models.IntegerField(default=0)),
+                ('registros', models.IntegerField(default=0)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('iniciada_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizada_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-iniciada_em'],
+                'indexes': [models.Index(fields=['fonte', 'uf', 'status'], name='api_cargaap_fonte_cecc4f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaginaCargaApi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.IntegerField()),
+                ('hash_conteudo', models.CharField(max_length=64)),
+                ('registros', models.JSONField()),
+                ('carga', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paginas', to='api.cargaapi')),
+            ],
+            options={
+                'ordering': ['offset'],
+                'unique_together': {('carga', 'offset')},
+            },
+        ),
+    ]
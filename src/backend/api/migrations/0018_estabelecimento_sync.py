@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_carga_api'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estabelecimento',
+            name='hash_registro',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='estabelecimento',
+            name='removido_em',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
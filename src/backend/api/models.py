@@ -1,7 +1,9 @@
+import uuid
+
 from django.db import models
 
 class MacroRegiao(models.Model):
-    nome = models.CharField(max_length=100)
+    nome = models.CharField(max_length=100, unique=True)
 
     class Meta:
         app_label = 'api'
@@ -15,6 +17,7 @@ class RegiaoSaude(models.Model):
 
     class Meta:
         app_label = 'api'
+        unique_together = ['nome', 'macro_regiao']
 
     def __str__(self):
         return self.nome
@@ -44,6 +47,18 @@ class Indicador(models.Model):
     def __str__(self):
         return self.titulo
 
+class ManifestoPlanilha(models.Model):
+    """Hash do conteúdo de cada planilha (e do municipios.csv) na última importação bem-sucedida"""
+    nome = models.CharField(max_length=100, unique=True)
+    hash_conteudo = models.CharField(max_length=64)
+    importado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'api'
+
+    def __str__(self):
+        return f"{self.nome}: {self.hash_conteudo[:12]}"
+
 class ValorIndicador(models.Model):
     cidade = models.ForeignKey(Cidade, on_delete=models.CASCADE)
     indicador = models.ForeignKey(Indicador, on_delete=models.CASCADE)
@@ -57,10 +72,79 @@ class ValorIndicador(models.Model):
     def __str__(self):
         return f"{self.cidade} - {self.indicador} ({self.ano}): {self.valor}"
 
+class CargaIndicador(models.Model):
+    """Registro das alterações aplicadas em ValorIndicador a cada carga de uma planilha"""
+    indicador = models.ForeignKey(Indicador, on_delete=models.CASCADE, related_name='cargas')
+    hash_conteudo = models.CharField(max_length=64)
+    inseridos = models.IntegerField(default=0)
+    atualizados = models.IntegerField(default=0)
+    removidos = models.IntegerField(default=0)
+    carregado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = 'api'
+        ordering = ['-carregado_em']
+
+    def __str__(self):
+        return (
+            f"{self.indicador.nome_arquivo} em {self.carregado_em}: "
+            f"+{self.inseridos} ~{self.atualizados} -{self.removidos}"
+        )
+
+class CargaApi(models.Model):
+    """Checkpoint de uma execução de ETL da API: até onde o download foi gravado em staging"""
+    BAIXANDO = 'baixando'
+    BAIXADO = 'baixado'
+    PUBLICADO = 'publicado'
+    STATUS_CHOICES = [
+        (BAIXANDO, 'Baixando'),
+        (BAIXADO, 'Baixado'),
+        (PUBLICADO, 'Publicado'),
+    ]
+
+    run_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    fonte = models.CharField(max_length=50)
+    uf = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=BAIXANDO)
+    # Offset da próxima página a baixar; tudo antes dele já está em PaginaCargaApi
+    ultimo_offset = models.IntegerField(default=0)
+    registros = models.IntegerField(default=0)
+    erro = models.TextField(null=True, blank=True)
+    iniciada_em = models.DateTimeField(auto_now_add=True)
+    atualizada_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'api'
+        ordering = ['-iniciada_em']
+        indexes = [models.Index(fields=['fonte', 'uf', 'status'])]
+
+    def __str__(self):
+        return f"{self.fonte}/{self.uf} {self.run_id} ({self.status}, offset {self.ultimo_offset})"
+
+class PaginaCargaApi(models.Model):
+    """Página bruta da API gravada em staging, publicada ao fim da carga"""
+    carga = models.ForeignKey(CargaApi, on_delete=models.CASCADE, related_name='paginas')
+    offset = models.IntegerField()
+    hash_conteudo = models.CharField(max_length=64)
+    registros = models.JSONField()
+
+    class Meta:
+        app_label = 'api'
+        ordering = ['offset']
+        unique_together = ['carga', 'offset']
+
+    def __str__(self):
+        return f"{self.carga.run_id} @ {self.offset}"
+
 class TipoUnidade(models.Model):
     codigo_tipo_unidade = models.IntegerField(primary_key=True)
     descricao_tipo_unidade = models.CharField(max_length=255)
 
+class EstabelecimentoQuerySet(models.QuerySet):
+    def ativos(self):
+        """Estabelecimentos ainda presentes na última sincronização do CNES"""
+        return self.filter(removido_em__isnull=True)
+
 class Estabelecimento(models.Model):
     codigo_cnes = models.IntegerField(primary_key=True)
     nome_fantasia = models.CharField(max_length=255)
@@ -98,30 +182,213 @@ class Estabelecimento(models.Model):
     codigo_natureza_organizacao_unidade = models.CharField(max_length=4, null=True)
     codigo_nivel_hierarquia_unidade = models.CharField(max_length=4, null=True)
     codigo_esfera_administrativa_unidade = models.CharField(max_length=4, null=True)
+    # Hash do registro recebido da API na última sincronização em que mudou
+    hash_registro = models.CharField(max_length=64, null=True)
+    # Preenchido quando o estabelecimento deixa de aparecer na API
+    removido_em = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = EstabelecimentoQuerySet.as_manager()
+
+class EstabelecimentoEstoque(models.Model):
+    """Dimensão de estabelecimentos que informam estoque"""
+    codigo_cnes = models.IntegerField(primary_key=True)
+    codigo_uf = models.IntegerField(default=0)
+    uf = models.CharField(max_length=2, null=True)
+    codigo_municipio = models.IntegerField(db_index=True)
+    municipio = models.CharField(max_length=255, null=True)
+    razao_social = models.CharField(max_length=255, null=True)
+    nome_fantasia = models.CharField(max_length=255, null=True)
+    cep = models.CharField(max_length=20, null=True)
+    logradouro = models.CharField(max_length=255, null=True)
+    numero_endereco = models.CharField(max_length=255, null=True)
+    bairro = models.CharField(max_length=255)
+    telefone = models.CharField(max_length=20, null=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    email = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        app_label = 'api'
+
+    def __str__(self):
+        return f"{self.nome_fantasia} ({self.codigo_cnes})"
+
+class Produto(models.Model):
+    """Dimensão de produtos (CATMAT)"""
+    codigo_catmat = models.CharField(max_length=255, unique=True)
+    descricao_produto = models.CharField(max_length=255, null=True)
+    tipo_produto = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        app_label = 'api'
+
+    def __str__(self):
+        return f"{self.descricao_produto} ({self.codigo_catmat})"
+
+class ProgramaSaude(models.Model):
+    """Dimensão de programas de saúde"""
+    sigla_programa_saude = models.CharField(max_length=255, unique=True)
+    descricao_programa_saude = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        app_label = 'api'
+
+    def __str__(self):
+        return self.sigla_programa_saude
+
+class EstoqueQuerySet(models.QuerySet):
+    """
+    Permite consultar o fato de estoque pelos nomes de campo da API, que
+    correspondem ao modelo desnormalizado original, resolvendo-os em joins
+    com as dimensões.
+    """
+
+    CAMPOS = {
+        'codigo_uf': 'estabelecimento__codigo_uf',
+        'uf': 'estabelecimento__uf',
+        'codigo_municipio': 'estabelecimento__codigo_municipio',
+        'municipio': 'estabelecimento__municipio',
+        'codigo_cnes': 'estabelecimento_id',
+        'codigo_catmat': 'produto__codigo_catmat',
+        'descricao_produto': 'produto__descricao_produto',
+        'tipo_produto': 'produto__tipo_produto',
+        'sigla_programa_saude': 'programa__sigla_programa_saude',
+        'descricao_programa_saude': 'programa__descricao_programa_saude',
+        'razao_social': 'estabelecimento__razao_social',
+        'nome_fantasia': 'estabelecimento__nome_fantasia',
+        'cep': 'estabelecimento__cep',
+        'logradouro': 'estabelecimento__logradouro',
+        'numero_endereco': 'estabelecimento__numero_endereco',
+        'bairro': 'estabelecimento__bairro',
+        'telefone': 'estabelecimento__telefone',
+        'latitude': 'estabelecimento__latitude',
+        'longitude': 'estabelecimento__longitude',
+        'email': 'estabelecimento__email',
+    }
+
+    @classmethod
+    def path(cls, lookup: str) -> str:
+        campo, _, resto = lookup.partition('__')
+        path = cls.CAMPOS.get(campo, campo)
+        return f'{path}__{resto}' if resto else path
+
+    def filter_api(self, **filters):
+        return self.filter(**{self.path(k): v for k, v in filters.items()})
+
+    def values_api(self, *campos):
+        diretos = [c for c in campos if c not in self.CAMPOS]
+        return self.values(
+            *diretos,
+            **{c: models.F(self.CAMPOS[c]) for c in campos if c in self.CAMPOS}
+        )
+
+    def values_list_api(self, *campos):
+        return self.values_list(*[self.path(c) for c in campos])
 
 class Estoque(models.Model):
-    codigo_uf= models.IntegerField(default=0)
-    uf= models.CharField(max_length=2, null=True)
-    codigo_municipio= models.IntegerField()
-    municipio= models.CharField(max_length=255, null=True)
-    codigo_cnes= models.IntegerField()
-    data_posicao_estoque= models.CharField(max_length=255, null=True)
-    codigo_catmat= models.CharField(max_length=255, null=True)
-    descricao_produto= models.CharField(max_length=255, null=True)
+    """Fato de estoque: chaves das dimensões, datas e quantidades"""
+    estabelecimento= models.ForeignKey(EstabelecimentoEstoque, on_delete=models.CASCADE)
+    produto= models.ForeignKey(Produto, on_delete=models.CASCADE)
+    programa= models.ForeignKey(ProgramaSaude, on_delete=models.CASCADE)
+    data_posicao_estoque= models.DateField(null=True, db_index=True)
+    data_posicao_estoque_original= models.CharField(max_length=255, null=True)
     quantidade_estoque= models.IntegerField()
     numero_lote= models.CharField(max_length=255, null=True)
-    data_validade= models.CharField(max_length=255, null=True)
-    tipo_produto= models.CharField(max_length=255, null=True)
-    sigla_programa_saude= models.CharField(max_length=255, null=True)
-    descricao_programa_saude= models.CharField(max_length=255, null=True)
+    data_validade= models.DateField(null=True, db_index=True)
+    data_validade_original= models.CharField(max_length=255, null=True)
     sigla_sistema_origem= models.CharField(max_length=255, null=True)
-    razao_social= models.CharField(max_length=255, null=True)
-    nome_fantasia= models.CharField(max_length=255, null=True)
-    cep= models.CharField(max_length=20, null=True)
-    logradouro= models.CharField(max_length=255, null=True)
-    numero_endereco= models.CharField(max_length=255, null=True)
-    bairro= models.CharField(max_length=255)
-    telefone= models.CharField(max_length=20, null=True)
-    latitude= models.FloatField()
-    longitude= models.FloatField()
-    email= models.CharField(max_length=255, null=True)
\ No newline at end of file
+    atual= models.BooleanField(default=False, db_index=True)
+
+    objects = EstoqueQuerySet.as_manager()
+
+    class Meta:
+        app_label = 'api'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data_posicao_estoque', 'estabelecimento', 'produto', 'numero_lote', 'programa'],
+                name='estoque_snapshot_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['estabelecimento', 'data_posicao_estoque'], name='estoque_cnes_posicao_idx'),
+        ]
+
+class EstoqueLocalizacao(models.Model):
+    """
+    Índice espacial do snapshot atual: uma entrada por produto e estabelecimento
+    com estoque positivo, agrupada em células de grade de latitude/longitude.
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    estabelecimento = models.ForeignKey(EstabelecimentoEstoque, on_delete=models.CASCADE)
+    celula_lat = models.IntegerField()
+    celula_lon = models.IntegerField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    quantidade_estoque = models.BigIntegerField(default=0)
+
+    class Meta:
+        app_label = 'api'
+        unique_together = ['produto', 'estabelecimento']
+        indexes = [
+            models.Index(fields=['produto', 'celula_lat', 'celula_lon'], name='localizacao_celula_idx'),
+        ]
+
+class EstoqueSnapshot(models.Model):
+    """Catálogo das partições de Estoque, uma por data de posição"""
+    data_posicao = models.DateField(unique=True)
+    registros = models.IntegerField(default=0)
+    compactado = models.BooleanField(default=False)
+    carregado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'api'
+
+    def __str__(self):
+        return f"{self.data_posicao} ({self.registros})"
+
+class EstoqueSerie(models.Model):
+    """Série histórica de estoque por data de posição, estabelecimento e produto"""
+    data_posicao = models.DateField()
+    codigo_cnes = models.IntegerField()
+    codigo_catmat = models.CharField(max_length=255, null=True)
+    quantidade_estoque = models.BigIntegerField(default=0)
+    lotes = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'api'
+        unique_together = ['data_posicao', 'codigo_cnes', 'codigo_catmat']
+        indexes = [
+            models.Index(fields=['codigo_catmat', 'data_posicao'], name='serie_catmat_posicao_idx'),
+            models.Index(fields=['codigo_cnes', 'data_posicao'], name='serie_cnes_posicao_idx'),
+        ]
+
+class EstoqueRollup(models.Model):
+    """Agregado pré-calculado de Estoque em uma granularidade fixa"""
+    quantidade_estoque = models.BigIntegerField(default=0)
+    lotes = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+        app_label = 'api'
+
+class EstoqueProdutoMunicipio(EstoqueRollup):
+    codigo_catmat = models.CharField(max_length=255, null=True)
+    codigo_municipio = models.IntegerField()
+
+    class Meta(EstoqueRollup.Meta):
+        unique_together = ['codigo_catmat', 'codigo_municipio']
+
+class EstoqueProdutoPrograma(EstoqueRollup):
+    codigo_catmat = models.CharField(max_length=255, null=True)
+    sigla_programa_saude = models.CharField(max_length=255, null=True)
+
+    class Meta(EstoqueRollup.Meta):
+        unique_together = ['codigo_catmat', 'sigla_programa_saude']
+
+class EstoqueEstabelecimentoTipoProduto(EstoqueRollup):
+    codigo_cnes = models.IntegerField()
+    tipo_produto = models.CharField(max_length=255, null=True)
+
+    class Meta(EstoqueRollup.Meta):
+        unique_together = ['codigo_cnes', 'tipo_produto']
@@ -0,0 +1,91 @@
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Mapping, Optional, Set
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import (
+    Estoque,
+    EstoqueEstabelecimentoTipoProduto,
+    EstoqueProdutoMunicipio,
+    EstoqueProdutoPrograma,
+)
+
+RollupSpec = namedtuple('RollupSpec', ['model', 'dimensoes'])
+
+# O primeiro campo de cada granularidade é a chave usada na atualização incremental
+ROLLUPS = {
+    'produto_municipio': RollupSpec(
+        EstoqueProdutoMunicipio, ('codigo_catmat', 'codigo_municipio')
+    ),
+    'produto_programa': RollupSpec(
+        EstoqueProdutoPrograma, ('codigo_catmat', 'sigla_programa_saude')
+    ),
+    'estabelecimento_tipo_produto': RollupSpec(
+        EstoqueEstabelecimentoTipoProduto, ('codigo_cnes', 'tipo_produto')
+    ),
+}
+
+MEDIDAS = ('quantidade_estoque', 'lotes')
+
+# Mantém as listas de __in abaixo do limite de parâmetros do SQLite
+CHUNK_SIZE = 500
+
+
+def find_rollup(dimensoes: Iterable[str]) -> Optional[RollupSpec]:
+    """Retorna a menor granularidade que contém todas as dimensões pedidas"""
+    pedidas = set(dimensoes)
+    candidatos = [spec for spec in ROLLUPS.values() if pedidas <= set(spec.dimensoes)]
+    return min(candidatos, key=lambda spec: len(spec.dimensoes), default=None)
+
+
+def touched_keys(rows: Iterable[Mapping[str, Any]], keys: Optional[Dict[str, Set]] = None) -> Dict[str, Set]:
+    """
+    Coleta (ou acumula em `keys`) as chaves de cada granularidade afetadas por
+    uma carga. `rows` usa os nomes de campo da API, como os registros brutos.
+    """
+    keys = keys if keys is not None else {name: set() for name in ROLLUPS}
+    for row in rows:
+        for name, spec in ROLLUPS.items():
+            keys[name].add(row.get(spec.dimensoes[0]))
+    return keys
+
+
+def _rebuild(spec: RollupSpec, queryset) -> int:
+    rows = queryset.values_api(*spec.dimensoes).annotate(
+        quantidade_estoque=Sum('quantidade_estoque'), lotes=Count('id')
+    ).order_by()
+    objects = [spec.model(**row) for row in rows]
+    spec.model.objects.bulk_create(objects, batch_size=1000)
+    return len(objects)
+
+
+@transaction.atomic
+def refresh_rollups(keys: Optional[Dict[str, Set]] = None) -> Dict[str, int]:
+    """
+    Recalcula os agregados do snapshot atual de estoque.
+
+    Sem `keys` todas as granularidades são reconstruídas do zero; com `keys`
+    apenas os grupos cuja chave principal foi tocada pela carga são refeitos.
+    """
+    refreshed = {}
+    for name, spec in ROLLUPS.items():
+        key_field = spec.dimensoes[0]
+        if keys is None:
+            spec.model.objects.all().delete()
+            refreshed[name] = _rebuild(spec, Estoque.objects.filter_api(atual=True))
+            continue
+
+        values = list(keys.get(name, ()))
+        refreshed[name] = 0
+        for i in range(0, len(values), CHUNK_SIZE):
+            chunk = values[i:i + CHUNK_SIZE]
+            # NULL não casa com __in, por isso é tratado separadamente
+            lookup = {f'{key_field}__in': [v for v in chunk if v is not None]}
+            spec.model.objects.filter(**lookup).delete()
+            refreshed[name] += _rebuild(spec, Estoque.objects.filter_api(atual=True, **lookup))
+            if None in chunk:
+                null_lookup = {f'{key_field}__isnull': True}
+                spec.model.objects.filter(**null_lookup).delete()
+                refreshed[name] += _rebuild(spec, Estoque.objects.filter_api(atual=True, **null_lookup))
+    return refreshed
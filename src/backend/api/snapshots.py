@@ -0,0 +1,137 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Estoque, EstoqueSerie, EstoqueSnapshot
+from .rollups import CHUNK_SIZE, touched_keys
+from .spatial import refresh_spatial_index
+
+
+def _chunks(values, size: int = CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def snapshot_keys(estoques: Iterable[Estoque], keys: Optional[Dict[date, Set[int]]] = None) -> Dict[date, Set[int]]:
+    """Coleta (ou acumula em `keys`) os estabelecimentos tocados por data de posição"""
+    keys = keys if keys is not None else defaultdict(set)
+    for estoque in estoques:
+        keys[estoque.data_posicao_estoque].add(estoque.estabelecimento_id)
+    return keys
+
+
+def _refresh_serie(data_posicao: date, cnes: Iterable[int]) -> None:
+    for chunk in _chunks(sorted(cnes)):
+        EstoqueSerie.objects.filter(data_posicao=data_posicao, codigo_cnes__in=chunk).delete()
+        rows = Estoque.objects.filter_api(
+            data_posicao_estoque=data_posicao, codigo_cnes__in=chunk
+        ).values_api('codigo_cnes', 'codigo_catmat').annotate(
+            quantidade_estoque=Sum('quantidade_estoque'), lotes=Count('id')
+        ).order_by()
+        EstoqueSerie.objects.bulk_create(
+            [EstoqueSerie(data_posicao=data_posicao, **row) for row in rows],
+            batch_size=1000,
+        )
+
+
+def _refresh_atual(cnes: Iterable[int], rollup_keys: Optional[Dict[str, Set]] = None) -> None:
+    """Marca como atuais apenas as linhas do snapshot mais recente de cada estabelecimento"""
+    for chunk in _chunks(sorted(cnes)):
+        current = Estoque.objects.filter_api(atual=True, codigo_cnes__in=chunk)
+        if rollup_keys is not None:
+            # Linhas que deixam de ser atuais também alteram os agregados
+            touched_keys(current.values_api('codigo_catmat', 'codigo_cnes'), rollup_keys)
+        current.update(atual=False)
+
+        latest = Estoque.objects.filter_api(codigo_cnes__in=chunk).values_api('codigo_cnes').annotate(
+            data=Max('data_posicao_estoque')
+        ).order_by()
+        por_data = defaultdict(list)
+        for row in latest:
+            por_data[row['data']].append(row['codigo_cnes'])
+        for data_posicao, cnes_data in por_data.items():
+            Estoque.objects.filter_api(
+                codigo_cnes__in=cnes_data, data_posicao_estoque=data_posicao
+            ).update(atual=True)
+
+
+@transaction.atomic
+def refresh_snapshots(keys: Dict[date, Set[int]], rollup_keys: Optional[Dict[str, Set]] = None) -> None:
+    """
+    Atualiza o catálogo de partições, a série histórica e o snapshot atual
+    dos estabelecimentos tocados por uma carga.
+    """
+    for data_posicao, cnes in keys.items():
+        EstoqueSnapshot.objects.update_or_create(
+            data_posicao=data_posicao,
+            defaults={
+                'registros': Estoque.objects.filter(data_posicao_estoque=data_posicao).count(),
+                'compactado': False,
+            },
+        )
+        _refresh_serie(data_posicao, cnes)
+
+    _refresh_atual(set().union(*keys.values()) if keys else set(), rollup_keys)
+
+
+@transaction.atomic
+def rebuild_snapshots() -> None:
+    """
+    Reconstrói catálogo, série, snapshot atual e índice espacial a partir de
+    todas as linhas de Estoque.
+    """
+    EstoqueSnapshot.objects.all().delete()
+    EstoqueSerie.objects.all().delete()
+    keys = defaultdict(set)
+    for data_posicao, codigo_cnes in Estoque.objects.values_list_api(
+        'data_posicao_estoque', 'codigo_cnes'
+    ).distinct().order_by():
+        keys[data_posicao].add(codigo_cnes)
+    refresh_snapshots(keys)
+    refresh_spatial_index()
+
+
+@transaction.atomic
+def compact_snapshots(retencao_dias: Optional[int] = None, serie_retencao_dias: Optional[int] = None) -> Dict[str, int]:
+    """
+    Compacta as partições mais antigas que a retenção configurada.
+
+    As linhas brutas são removidas, exceto as que ainda formam o snapshot atual
+    de algum estabelecimento; a série histórica agregada é preservada até
+    `serie_retencao_dias` (None mantém a série indefinidamente).
+    """
+    if retencao_dias is None:
+        retencao_dias = settings.ESTOQUE_SNAPSHOT_RETENCAO_DIAS
+    if serie_retencao_dias is None:
+        serie_retencao_dias = settings.ESTOQUE_SERIE_RETENCAO_DIAS
+
+    hoje = timezone.localdate()
+    cutoff = hoje - timedelta(days=retencao_dias)
+    result = {'particoes': 0, 'linhas_removidas': 0, 'series_removidas': 0}
+
+    # Uma partição já compactada volta a ter linhas obsoletas quando um
+    # estabelecimento publica um snapshot mais novo, por isso todas são revisitadas
+    antigas = Estoque.objects.filter(data_posicao_estoque__lt=cutoff, atual=False)
+    datas = list(antigas.values_list('data_posicao_estoque', flat=True).distinct().order_by())
+    result['linhas_removidas'], _ = antigas.delete()
+
+    for snapshot in EstoqueSnapshot.objects.filter(data_posicao__lt=cutoff).filter(
+        Q(compactado=False) | Q(data_posicao__in=datas)
+    ):
+        snapshot.registros = Estoque.objects.filter(data_posicao_estoque=snapshot.data_posicao).count()
+        snapshot.compactado = True
+        snapshot.save()
+        result['particoes'] += 1
+
+    if serie_retencao_dias is not None:
+        serie_cutoff = hoje - timedelta(days=serie_retencao_dias)
+        result['series_removidas'], _ = EstoqueSerie.objects.filter(
+            data_posicao__lt=serie_cutoff
+        ).delete()
+    return result
@@ -0,0 +1,131 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Estoque, EstoqueLocalizacao, Produto
+from .rollups import CHUNK_SIZE
+
+# Tamanho da célula da grade em graus (~28 km no equador)
+CELL_SIZE = 0.25
+
+# Produtos com poucas localizações são ordenados diretamente, sem busca por anéis
+SCAN_THRESHOLD = 2000
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+
+def cell_of(latitude: float, longitude: float):
+    return math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+@transaction.atomic
+def refresh_spatial_index(cnes: Optional[Iterable[int]] = None) -> int:
+    """
+    Reconstrói o índice espacial a partir das linhas atuais com estoque positivo.
+
+    Sem `cnes` o índice é refeito por completo; caso contrário apenas os
+    estabelecimentos informados são reindexados.
+    """
+    if cnes is None:
+        EstoqueLocalizacao.objects.all().delete()
+        return _index(Estoque.objects.filter_api(atual=True, quantidade_estoque__gt=0))
+
+    indexed = 0
+    cnes = sorted(cnes)
+    for i in range(0, len(cnes), CHUNK_SIZE):
+        chunk = cnes[i:i + CHUNK_SIZE]
+        EstoqueLocalizacao.objects.filter(estabelecimento_id__in=chunk).delete()
+        indexed += _index(Estoque.objects.filter_api(
+            atual=True, quantidade_estoque__gt=0, codigo_cnes__in=chunk
+        ))
+    return indexed
+
+
+def _index(queryset) -> int:
+    rows = queryset.values('produto_id', 'estabelecimento_id').annotate(
+        quantidade=Sum('quantidade_estoque'),
+    ).values_list(
+        'produto_id', 'estabelecimento_id', 'estabelecimento__latitude',
+        'estabelecimento__longitude', 'quantidade',
+    ).order_by()
+    objects = []
+    for produto_id, estabelecimento_id, latitude, longitude, quantidade in rows:
+        if latitude is None or longitude is None:
+            continue
+        celula_lat, celula_lon = cell_of(latitude, longitude)
+        objects.append(EstoqueLocalizacao(
+            produto_id=produto_id,
+            estabelecimento_id=estabelecimento_id,
+            celula_lat=celula_lat,
+            celula_lon=celula_lon,
+            latitude=latitude,
+            longitude=longitude,
+            quantidade_estoque=quantidade,
+        ))
+    EstoqueLocalizacao.objects.bulk_create(objects, batch_size=1000)
+    return len(objects)
+
+
+def _min_distance_outside(latitude: float, radius: int) -> float:
+    """Limite inferior da distância até qualquer ponto fora do quadrado de `radius` células"""
+    # O ponto pode estar na borda da sua célula, então a folga garantida é de
+    # `radius` células; em longitude a largura encolhe com o cosseno da latitude
+    lat_extremo = min(abs(latitude) + (radius + 1) * CELL_SIZE, 90.0)
+    return radius * CELL_SIZE * KM_PER_DEGREE * math.cos(math.radians(lat_extremo))
+
+
+def nearest(produto: Produto, latitude: float, longitude: float, k: int) -> List[Dict]:
+    """
+    Retorna as k localizações mais próximas com estoque do produto.
+
+    A busca expande quadrados de células ao redor do ponto até que a k-ésima
+    distância encontrada seja menor que a menor distância possível fora do
+    quadrado já visitado.
+    """
+    base = EstoqueLocalizacao.objects.filter(produto=produto)
+    fields = ('estabelecimento_id', 'latitude', 'longitude', 'quantidade_estoque')
+
+    def ranked(rows):
+        return heapq.nsmallest(k, (
+            {
+                'codigo_cnes': cnes,
+                'latitude': lat,
+                'longitude': lon,
+                'quantidade_estoque': quantidade,
+                'distancia_km': round(haversine_km(latitude, longitude, lat, lon), 3),
+            }
+            for cnes, lat, lon, quantidade in rows
+        ), key=lambda item: item['distancia_km'])
+
+    total = base.count()
+    if total <= SCAN_THRESHOLD:
+        return ranked(base.values_list(*fields))
+
+    celula_lat, celula_lon = cell_of(latitude, longitude)
+    max_radius = int(360 / CELL_SIZE)
+    radius = 0
+    while True:
+        rows = list(base.filter(
+            celula_lat__range=(celula_lat - radius, celula_lat + radius),
+            celula_lon__range=(celula_lon - radius, celula_lon + radius),
+        ).values_list(*fields))
+        if len(rows) == total or radius >= max_radius:
+            return ranked(rows)
+        if len(rows) >= k:
+            best = ranked(rows)
+            if best[-1]['distancia_km'] <= _min_distance_outside(latitude, radius):
+                return best
+        radius = radius * 2 + 1
@@ -1,3 +1,147 @@
-from django.test import TestCase
+from django.conf import settings
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from api.models import CargaApi, Estabelecimento, EstabelecimentoEstoque, Estoque, Produto, ProgramaSaude
+from benchmarks.fake_api import FakeDatasusServer, fake_estabelecimento, fake_estoque
+from etl.checkpoint import finish_download, stage_page, start_run
+from etl.data_processor import HealthDataETL
+from etl.etl_estabelecimentos import EstabelecimentosETL
+from etl.etl_estoque import EstoqueETL
+from etl.fetch_client import FetchClient
+from etl.sharding import shard
+from etl.validation import AVISO, ERRO
+
+DATA_DIR = settings.BASE_DIR.parent / 'assets' / 'data'
+
+
+class WorkbookValidationTests(SimpleTestCase):
+    def test_bundled_workbook_validates(self):
+        etl = HealthDataETL(workers=1)
+        etl.data_dir = DATA_DIR
+        etl.schema = etl.build_schema()
+        sheets = etl.read_workbook(str(DATA_DIR / 'serie_historica.xlsx'))
+
+        etl.check_validation(sheets)
+
+        issues = [issue for sheet in sheets for issue in sheet.problemas]
+        self.assertFalse([issue for issue in issues if issue.nivel == ERRO])
+        # indicador_8 tem o cabeçalho fora da linha esperada e é ignorado pelo carregador
+        self.assertIn(
+            ('indicador_8', AVISO),
+            [(issue.planilha, issue.nivel) for issue in issues if 'cabeçalho' in issue.mensagem],
+        )
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        self.etl = EstabelecimentosETL(uf_code=29)
+        self.publish([fake_estabelecimento(i) for i in range(4)])
+
+    def publish(self, registros):
+        carga = start_run('estabelecimentos', 29)
+        if registros:
+            stage_page(carga, registros, len(registros))
+        finish_download(carga)
+        self.etl.publish(carga)
+        return carga
+
+    def ativos(self):
+        return Estabelecimento.objects.filter(removido_em__isnull=True).count()
+
+    def test_empty_download_soft_deletes_nothing(self):
+        carga = self.publish([])
+
+        self.assertEqual(self.ativos(), 4)
+        carga.refresh_from_db()
+        self.assertEqual(carga.status, CargaApi.PUBLICADO)
+
+    def test_truncated_download_soft_deletes_nothing(self):
+        self.publish([fake_estabelecimento(0)])
+
+        self.assertEqual(self.ativos(), 4)
+
+    def test_missing_establishment_is_soft_deleted(self):
+        self.publish([fake_estabelecimento(i) for i in range(3)])
+
+        self.assertEqual(self.ativos(), 3)
+        removido = Estabelecimento.objects.get(codigo_cnes=fake_estabelecimento(3)['codigo_cnes'])
+        self.assertIsNotNone(removido.removido_em)
+
+    def test_rows_without_hash_are_soft_deleted(self):
+        # Linhas carregadas antes de hash_registro existir
+        Estabelecimento.objects.update(hash_registro=None)
+
+        self.publish([fake_estabelecimento(i) for i in range(3)])
+
+        self.assertEqual(self.ativos(), 3)
+
+    def test_rows_without_hash_count_as_active_for_truncation(self):
+        Estabelecimento.objects.update(hash_registro=None)
+
+        self.publish([fake_estabelecimento(0)])
+
+        self.assertEqual(self.ativos(), 4)
+
+
+class DimensionCacheTests(TestCase):
+    def test_rolled_back_page_does_not_cache_dimensions(self):
+        etl = EstoqueETL(uf_code='29,28')
+        registros = [fake_estoque(i) for i in range(3)]
+        bahia, sergipe = shard(etl, 29), shard(etl, 28)
+
+        # A página é desfeita depois de gravar as dimensões, como numa falha do staging
+        bahia.start_publish()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            bahia.publish_page(registros)
+            raise RuntimeError('staging failed')
+        sergipe.start_publish()
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            sergipe.publish_page(registros)
+
+        self.assertEqual(Estoque.objects.count(), 3)
+        self.assertEqual(
+            Estoque.objects.exclude(produto__in=Produto.objects.all()).count()
+            + Estoque.objects.exclude(programa__in=ProgramaSaude.objects.all()).count()
+            + Estoque.objects.exclude(estabelecimento__in=EstabelecimentoEstoque.objects.all()).count(),
+            0,
+        )
+        self.assertEqual(set(etl.produto_ids), {registro['codigo_catmat'] for registro in registros})
+
+
+class CurrentSnapshotTests(TestCase):
+    def test_current_snapshot_changes_only_when_published(self):
+        etl = EstoqueETL(uf_code=29)
+        registros = [fake_estoque(i) for i in range(3)]
+        carga = start_run('estoque', 29)
+        stage_page(carga, registros, len(registros))
+        finish_download(carga)
+        etl.publish(carga)
+
+        for registro in registros:
+            registro['quantidade_estoque'] += 1
+        etl.start_publish()
+        etl.publish_page(registros)
+        atuais = Estoque.objects.filter(atual=True).order_by('numero_lote')
+        self.assertEqual(
+            list(atuais.values_list('quantidade_estoque', flat=True)),
+            [registro['quantidade_estoque'] - 1 for registro in registros],
+        )
+
+        etl.finish_publish(start_run('estoque', 29))
+        self.assertEqual(
+            list(atuais.values_list('quantidade_estoque', flat=True)),
+            [registro['quantidade_estoque'] for registro in registros],
+        )
+
+
+class NegotiatePageSizeTests(SimpleTestCase):
+    def test_small_first_page_is_not_a_cap(self):
+        client = FetchClient()
+        with FakeDatasusServer(records=37, max_page_size=500) as server:
+            url = f'{server.url}/cnes/estabelecimentos'
+            self.assertEqual(client.negotiate_page_size(url, {'codigo_uf': 29}, 'estabelecimentos'), 500)
+            requests_before = server.requests
+            # O tamanho negociado vale para o host, qualquer que seja a UF seguinte
+            self.assertEqual(client.negotiate_page_size(url, {'codigo_uf': 35}, 'estabelecimentos'), 500)
+            self.assertEqual(server.requests, requests_before)
@@ -1,7 +1,10 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.db import models
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from .models import (
     Indicador,
     Cidade,
@@ -11,9 +14,17 @@ from .models import (
     Estabelecimento,
     TipoUnidade,
     Estoque,
+    EstoqueSerie,
+    EstoqueSnapshot,
+    EstabelecimentoEstoque,
+    Produto,
 )
+from .rollups import MEDIDAS, ROLLUPS, find_rollup
+from .spatial import nearest
 import pandas as pd
+import csv
 import json
+from datetime import timedelta
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import re
@@ -62,6 +73,92 @@ indicadores_dic = {
 }
 
 
+ESTABELECIMENTO_FIELDS = (
+    "codigo_cnes",
+    "nome_fantasia",
+    "endereco_estabelecimento",
+    "numero_estabelecimento",
+    "bairro_estabelecimento",
+    "codigo_cep_estabelecimento",
+    "latitude_estabelecimento_decimo_grau",
+    "longitude_estabelecimento_decimo_grau",
+    "numero_telefone_estabelecimento",
+    "descricao_turno_atendimento",
+    "estabelecimento_faz_atendimento_ambulatorial_sus",
+    "estabelecimento_possui_centro_cirurgico",
+    "estabelecimento_possui_servico_apoio",
+    "estabelecimento_possui_atendimento_ambulatorial",
+    "codigo_municipio",
+    "numero_cnpj_entidade",
+    "nome_razao_social",
+    "natureza_organizacao_entidade",
+    "tipo_gestao",
+    "descricao_nivel_hierarquia",
+    "descricao_esfera_administrativa",
+    "codigo_tipo_unidade",
+    "endereco_email_estabelecimento",
+    "numero_cnpj",
+    "codigo_identificador_turno_atendimento",
+    "codigo_estabelecimento_saude",
+    "codigo_uf",
+    "descricao_natureza_juridica_estabelecimento",
+    "codigo_motivo_desabilitacao_estabelecimento",
+    "estabelecimento_possui_centro_obstetrico",
+    "estabelecimento_possui_centro_neonatal",
+    "estabelecimento_possui_atendimento_hospitalar",
+    "codigo_atividade_ensino_unidade",
+    "codigo_natureza_organizacao_unidade",
+    "codigo_nivel_hierarquia_unidade",
+    "codigo_esfera_administrativa_unidade",
+)
+
+ESTOQUE_FIELDS = (
+    "codigo_uf",
+    "uf",
+    "codigo_municipio",
+    "municipio",
+    "codigo_cnes",
+    "data_posicao_estoque",
+    "codigo_catmat",
+    "descricao_produto",
+    "quantidade_estoque",
+    "numero_lote",
+    "data_validade",
+    "tipo_produto",
+    "sigla_programa_saude",
+    "descricao_programa_saude",
+    "sigla_sistema_origem",
+    "razao_social",
+    "nome_fantasia",
+    "cep",
+    "logradouro",
+    "numero_endereco",
+    "bairro",
+    "telefone",
+    "latitude",
+    "longitude",
+    "email",
+)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Dimensões aceitas pelo endpoint de vencimentos e as colunas correspondentes
+VENCIMENTO_DIMENSOES = {
+    "municipio": ("codigo_municipio", "municipio"),
+    "produto": ("codigo_catmat", "descricao_produto"),
+    "programa": ("sigla_programa_saude", "descricao_programa_saude"),
+}
+
+# Limite de estabelecimentos retornados pela busca por proximidade
+PROXIMOS_MAX_K = 50
+
+# Linhas lidas do banco por vez durante a exportação e agrupadas por chunk enviado
+EXPORT_CHUNK_SIZE = 2000
+
+
 def extract_meta_value(meta_text):
     match = re.search(r"(\d+(\.\d+)?)(?=%|)", meta_text)
     if match:
@@ -206,43 +303,8 @@ class EstabelecimentosSaudeProxy(APIView):
 class EstabelecimentosView(APIView):
     def get(self, request):
         filters = self.build_filters(request)
-        estabelecimentos = Estabelecimento.objects.filter(**filters).values(
-            "codigo_cnes",
-            "nome_fantasia",
-            "endereco_estabelecimento",
-            "numero_estabelecimento",
-            "bairro_estabelecimento",
-            "codigo_cep_estabelecimento",
-            "latitude_estabelecimento_decimo_grau",
-            "longitude_estabelecimento_decimo_grau",
-            "numero_telefone_estabelecimento",
-            "descricao_turno_atendimento",
-            "estabelecimento_faz_atendimento_ambulatorial_sus",
-            "estabelecimento_possui_centro_cirurgico",
-            "estabelecimento_possui_servico_apoio",
-            "estabelecimento_possui_atendimento_ambulatorial",
-            "codigo_municipio",
-            "numero_cnpj_entidade",
-            "nome_razao_social",
-            "natureza_organizacao_entidade",
-            "tipo_gestao",
-            "descricao_nivel_hierarquia",
-            "descricao_esfera_administrativa",
-            "codigo_tipo_unidade",
-            "endereco_email_estabelecimento",
-            "numero_cnpj",
-            "codigo_identificador_turno_atendimento",
-            "codigo_estabelecimento_saude",
-            "codigo_uf",
-            "descricao_natureza_juridica_estabelecimento",
-            "codigo_motivo_desabilitacao_estabelecimento",
-            "estabelecimento_possui_centro_obstetrico",
-            "estabelecimento_possui_centro_neonatal",
-            "estabelecimento_possui_atendimento_hospitalar",
-            "codigo_atividade_ensino_unidade",
-            "codigo_natureza_organizacao_unidade",
-            "codigo_nivel_hierarquia_unidade",
-            "codigo_esfera_administrativa_unidade",
+        estabelecimentos = Estabelecimento.objects.ativos().filter(**filters).values(
+            *ESTABELECIMENTO_FIELDS
         )
         return JsonResponse({"estabelecimentos": list(estabelecimentos)}, safe=False)
 
@@ -303,34 +365,10 @@ class CidadeListView(APIView):
 class EstoqueView(APIView):
     def get(self, request):
         filters = self.build_filters(request)
-        estoque = Estoque.objects.filter(**filters).values(
-            "codigo_uf",
-            "uf",
-            "codigo_municipio",
-            "municipio",
-            "codigo_cnes",
-            "data_posicao_estoque",
-            "codigo_catmat",
-            "descricao_produto",
-            "quantidade_estoque",
-            "numero_lote",
-            "data_validade",
-            "tipo_produto",
-            "sigla_programa_saude",
-            "descricao_programa_saude",
-            "sigla_sistema_origem",
-            "razao_social",
-            "nome_fantasia",
-            "cep",
-            "logradouro",
-            "numero_endereco",
-            "bairro",
-            "telefone",
-            "latitude",
-            "longitude",
-            "email"
+        estoque = Estoque.objects.filter_api(**filters).values_list_api(*ESTOQUE_FIELDS)
+        return JsonResponse(
+            {"estoque": [dict(zip(ESTOQUE_FIELDS, row)) for row in estoque]}, safe=False
         )
-        return JsonResponse({"estoque": list(estoque)}, safe=False)
     
     
     def build_filters(self, request):
@@ -355,4 +393,305 @@ class EstoqueView(APIView):
             for param in filter_params
             if request.GET.get(param)
         }
-        return filters
\ No newline at end of file
+        # Sem data de posição explícita, consulta apenas o snapshot mais recente
+        if "data_posicao_estoque" not in filters:
+            filters["atual"] = True
+        return filters
+
+
+class Echo:
+    """Objeto com interface de arquivo que apenas devolve o que foi escrito"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, fields, formato, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Gera o conteúdo da exportação em blocos, sem materializar o queryset.
+    `queryset` deve ser um values_list com as colunas na ordem de `fields`.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    if formato == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        encode = writer.writerow
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+        def encode(row):
+            return encoder.encode(dict(zip(fields, row))) + "\n"
+
+    buffer = []
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def export_response(request, queryset, fields, filename):
+    """Monta a resposta de exportação em NDJSON ou CSV via streaming"""
+    formato = request.GET.get("formato", "ndjson")
+    if formato not in EXPORT_FORMATS:
+        return JsonResponse(
+            {"error": f"Formato inválido: {formato}. Use ndjson ou csv"}, status=400
+        )
+    response = StreamingHttpResponse(
+        iter_export_rows(queryset, fields, formato),
+        content_type=EXPORT_FORMATS[formato],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{formato}"'
+    return response
+
+
+class EstabelecimentosExportView(EstabelecimentosView):
+    def get(self, request):
+        filters = self.build_filters(request)
+        queryset = (
+            Estabelecimento.objects.ativos()
+            .filter(**filters)
+            .order_by("codigo_cnes")
+            .values_list(*ESTABELECIMENTO_FIELDS)
+        )
+        return export_response(
+            request, queryset, ESTABELECIMENTO_FIELDS, "estabelecimentos"
+        )
+
+
+class EstoqueExportView(EstoqueView):
+    def get(self, request):
+        filters = self.build_filters(request)
+        # A exportação sempre percorre o resultado completo
+        filters.pop("limit", None)
+        filters.pop("offset", None)
+        queryset = (
+            Estoque.objects.filter_api(**filters)
+            .order_by("id")
+            .values_list_api(*ESTOQUE_FIELDS)
+        )
+        return export_response(request, queryset, ESTOQUE_FIELDS, "estoque")
+
+
+class EstoqueVencimentoView(EstoqueView):
+    """Lotes com validade nos próximos N dias, agregados por município, produto e programa"""
+
+    def get(self, request):
+        try:
+            dias = int(request.GET.get("dias", 30))
+        except ValueError:
+            return JsonResponse({"error": "dias deve ser um número inteiro"}, status=400)
+        if dias < 0:
+            return JsonResponse({"error": "dias deve ser maior ou igual a zero"}, status=400)
+
+        agrupar_por = [
+            dimensao.strip()
+            for dimensao in request.GET.get(
+                "agrupar_por", ",".join(VENCIMENTO_DIMENSOES)
+            ).split(",")
+            if dimensao.strip()
+        ]
+        invalidas = [d for d in agrupar_por if d not in VENCIMENTO_DIMENSOES]
+        if invalidas or not agrupar_por:
+            return JsonResponse(
+                {
+                    "error": f"Dimensões inválidas: {', '.join(invalidas)}. "
+                    f"Use {', '.join(VENCIMENTO_DIMENSOES)}"
+                },
+                status=400,
+            )
+
+        filters = self.build_filters(request)
+        filters.pop("limit", None)
+        filters.pop("offset", None)
+
+        hoje = timezone.localdate()
+        limite = hoje + timedelta(days=dias)
+        colunas = [
+            coluna for dimensao in agrupar_por for coluna in VENCIMENTO_DIMENSOES[dimensao]
+        ]
+        vencimentos = (
+            Estoque.objects.filter_api(
+                **filters,
+                data_validade__gte=hoje,
+                data_validade__lte=limite,
+                quantidade_estoque__gt=0,
+            )
+            .values_api(*colunas)
+            .annotate(
+                quantidade_total=Sum("quantidade_estoque"),
+                lotes=Count("id"),
+                vencimento_mais_proximo=Min("data_validade"),
+            )
+            .order_by("vencimento_mais_proximo", *colunas)
+        )
+        return JsonResponse(
+            {
+                "data_referencia": hoje,
+                "data_limite": limite,
+                "dias": dias,
+                "vencimentos": list(vencimentos),
+            },
+            safe=False,
+        )
+
+
+class EstoquePivotView(APIView):
+    """Consulta os agregados pré-calculados de estoque por dimensões e medidas"""
+
+    def get(self, request):
+        dimensoes = self.parse_list(request.GET.get("dimensoes", ""))
+        medidas = self.parse_list(request.GET.get("medidas", ",".join(MEDIDAS)))
+        if not dimensoes:
+            return JsonResponse({"error": "dimensoes é um parâmetro obrigatório"}, status=400)
+
+        medidas_invalidas = [m for m in medidas if m not in MEDIDAS]
+        if medidas_invalidas or not medidas:
+            return JsonResponse(
+                {
+                    "error": f"Medidas inválidas: {', '.join(medidas_invalidas)}. "
+                    f"Use {', '.join(MEDIDAS)}"
+                },
+                status=400,
+            )
+
+        rollup = find_rollup(dimensoes)
+        if rollup is None:
+            disponiveis = [",".join(spec.dimensoes) for spec in ROLLUPS.values()]
+            return JsonResponse(
+                {
+                    "error": "Combinação de dimensões indisponível",
+                    "combinacoes_disponiveis": disponiveis,
+                },
+                status=400,
+            )
+
+        filters = {
+            dimensao: request.GET.get(dimensao)
+            for dimensao in rollup.dimensoes
+            if request.GET.get(dimensao)
+        }
+        pivot = (
+            rollup.model.objects.filter(**filters)
+            .values(*dimensoes)
+            .annotate(**{medida: Sum(medida) for medida in medidas})
+            .order_by(f"-{medidas[0]}", *dimensoes)
+        )
+        return JsonResponse(
+            {"dimensoes": dimensoes, "medidas": medidas, "pivot": list(pivot)},
+            safe=False,
+        )
+
+    @staticmethod
+    def parse_list(value):
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class EstoqueSnapshotListView(APIView):
+    def get(self, request):
+        snapshots = EstoqueSnapshot.objects.order_by("-data_posicao").values(
+            "data_posicao", "registros", "compactado", "carregado_em"
+        )
+        return JsonResponse({"snapshots": list(snapshots)}, safe=False)
+
+
+class EstoqueSerieView(APIView):
+    """Série histórica de estoque de um produto e/ou estabelecimento"""
+
+    def get(self, request):
+        filters = {
+            param: request.GET.get(param)
+            for param in ["codigo_catmat", "codigo_cnes"]
+            if request.GET.get(param)
+        }
+        if not filters:
+            return JsonResponse(
+                {"error": "Informe codigo_catmat e/ou codigo_cnes"}, status=400
+            )
+        if request.GET.get("data_inicio"):
+            filters["data_posicao__gte"] = request.GET.get("data_inicio")
+        if request.GET.get("data_fim"):
+            filters["data_posicao__lte"] = request.GET.get("data_fim")
+
+        serie = (
+            EstoqueSerie.objects.filter(**filters)
+            .values("data_posicao")
+            .annotate(
+                quantidade_estoque=Sum("quantidade_estoque"),
+                lotes=Sum("lotes"),
+                estabelecimentos=Count("codigo_cnes", distinct=True),
+            )
+            .order_by("data_posicao")
+        )
+        return JsonResponse({"serie": list(serie)}, safe=False)
+
+
+class EstoqueProximosView(APIView):
+    """Estabelecimentos mais próximos de um ponto com estoque positivo de um produto"""
+
+    def get(self, request):
+        codigo_catmat = request.GET.get("codigo_catmat")
+        if not codigo_catmat:
+            return JsonResponse({"error": "codigo_catmat é um parâmetro obrigatório"}, status=400)
+        try:
+            latitude = float(request.GET.get("latitude"))
+            longitude = float(request.GET.get("longitude"))
+            k = int(request.GET.get("k", 5))
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"error": "latitude e longitude são obrigatórias e k deve ser inteiro"},
+                status=400,
+            )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return JsonResponse({"error": "Coordenadas inválidas"}, status=400)
+        if not 1 <= k <= PROXIMOS_MAX_K:
+            return JsonResponse(
+                {"error": f"k deve estar entre 1 e {PROXIMOS_MAX_K}"}, status=400
+            )
+
+        try:
+            produto = Produto.objects.get(codigo_catmat=codigo_catmat)
+        except Produto.DoesNotExist:
+            return JsonResponse(
+                {"error": f"Produto {codigo_catmat} não encontrado"}, status=404
+            )
+
+        proximos = nearest(produto, latitude, longitude, k)
+        cnes = [item["codigo_cnes"] for item in proximos]
+        estabelecimentos = EstabelecimentoEstoque.objects.in_bulk(cnes)
+        lotes = {codigo: [] for codigo in cnes}
+        for lote in (
+            Estoque.objects.filter(
+                atual=True,
+                produto=produto,
+                estabelecimento_id__in=cnes,
+                quantidade_estoque__gt=0,
+            )
+            .values("estabelecimento_id", "numero_lote", "quantidade_estoque", "data_validade")
+            .order_by("data_validade")
+        ):
+            lotes[lote.pop("estabelecimento_id")].append(lote)
+
+        for item in proximos:
+            estabelecimento = estabelecimentos[item["codigo_cnes"]]
+            item.update(
+                {
+                    "nome_fantasia": estabelecimento.nome_fantasia,
+                    "municipio": estabelecimento.municipio,
+                    "logradouro": estabelecimento.logradouro,
+                    "numero_endereco": estabelecimento.numero_endereco,
+                    "bairro": estabelecimento.bairro,
+                    "telefone": estabelecimento.telefone,
+                    "lotes": lotes[item["codigo_cnes"]],
+                }
+            )
+        return JsonResponse(
+            {
+                "codigo_catmat": produto.codigo_catmat,
+                "descricao_produto": produto.descricao_produto,
+                "estabelecimentos": proximos,
+            },
+            safe=False,
+        )
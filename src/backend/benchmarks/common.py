@@ -0,0 +1,45 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def test_database(name: str = None):
+    """
+    Cria um banco de testes isolado para que os benchmarks não alterem os dados reais.
+    `name` grava o banco em um arquivo; sem ele, o banco de testes do SQLite fica em memória
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if name:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        teardown_test_environment()
+
+
+@contextmanager
+def measure(result: Dict[str, Any], rows_key: str = 'rows'):
+    """Mede tempo de parede e pico de memória do bloco, calculando linhas por segundo"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['seconds'] = round(elapsed, 4)
+        result['peak_memory_mb'] = round(peak / 1024 / 1024, 2)
+        rows = result.get(rows_key) or 0
+        result['rows_per_second'] = round(rows / elapsed, 1) if elapsed else None
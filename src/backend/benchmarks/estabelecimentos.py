@@ -0,0 +1,76 @@
+"""Benchmark do download paginado e da carga de estabelecimentos contra a API simulada"""
+import logging
+from typing import Any, Dict, List
+
+from django.db import transaction
+
+from api.models import Estabelecimento
+from etl.etl_estabelecimentos import ESTABELECIMENTO_MAPPING, EstabelecimentosETL
+from .common import measure, test_database
+from .fake_api import FakeDatasusServer
+
+
+def _etl(
+    server: FakeDatasusServer, concurrency: int, page_size: int = None, rate_limiter: bool = True
+) -> EstabelecimentosETL:
+    etl = EstabelecimentosETL(concurrency=concurrency, page_size=page_size)
+    etl.base_url = f'{server.url}/cnes/estabelecimentos'
+    etl.client.rate_limited = rate_limiter
+    return etl
+
+
+@transaction.atomic
+def _legacy_import_estabelecimentos(etl: EstabelecimentosETL) -> None:
+    """Carga anterior ao pipeline: baixa tudo para uma lista e só então grava"""
+    estabelecimentos = etl.fetch_all_estabelecimentos()
+    for i in range(0, len(estabelecimentos), etl.batch_size):
+        Estabelecimento.objects.bulk_create(
+            [ESTABELECIMENTO_MAPPING(est) for est in estabelecimentos[i:i + etl.batch_size]],
+            ignore_conflicts=True,
+            batch_size=etl.batch_size,
+        )
+
+
+def run(
+    rows: int = 50000, latency: float = 0.05, concurrency: tuple = (1, 4, 8, 16), page_size: int = None,
+    rate_limiter: bool = True, **options
+) -> List[Dict[str, Any]]:
+    """
+    `rows` é o número de estabelecimentos servidos; `latency` é o atraso por página, em
+    segundos. O tamanho de página é fixo (20, salvo `page_size`) para que só a concorrência
+    varie entre as medições; `rate_limiter` falso desliga o limite de taxa do cliente HTTP
+    """
+    page_size = page_size or 20
+    # Uma linha de log por página distorceria a medição
+    logging.getLogger('etl.etl_estabelecimentos').setLevel(logging.WARNING)
+    results = []
+    with FakeDatasusServer(records=rows, latency=latency) as server:
+        sequencial = None
+        for workers in concurrency:
+            etl = _etl(server, workers, page_size, rate_limiter)
+            requests_before = server.requests
+            result = {'stage': 'fetch_all_estabelecimentos', 'concurrency': workers, 'latency': latency}
+            with measure(result):
+                estabelecimentos = etl.fetch_all_estabelecimentos()
+                result['rows'] = len(estabelecimentos)
+            result['requests'] = server.requests - requests_before
+            codigos = [est['codigo_cnes'] for est in estabelecimentos]
+            if sequencial is None:
+                sequencial = codigos
+            result['same_order_as_sequential'] = codigos == sequencial
+            results.append(result)
+
+        # Com uma página por vez o download é dominado pela latência, que o pipeline sobrepõe à gravação
+        workers = min(concurrency)
+        with test_database():
+            for stage, load in (
+                ('import_legacy', _legacy_import_estabelecimentos),
+                ('import_pipeline', EstabelecimentosETL.import_estabelecimentos),
+            ):
+                Estabelecimento.objects.all().delete()
+                result = {'stage': stage, 'concurrency': workers, 'latency': latency}
+                with measure(result):
+                    load(_etl(server, workers, page_size, rate_limiter))
+                    result['rows'] = Estabelecimento.objects.count()
+                results.append(result)
+    return results
@@ -0,0 +1,82 @@
+"""Benchmark dos endpoints de exportação em streaming (NDJSON/CSV)"""
+from typing import Dict, List, Any
+
+from django.test import RequestFactory
+
+from api.models import EstabelecimentoEstoque, Estoque, Produto, ProgramaSaude
+from api.views import EstoqueExportView
+from .common import measure, test_database
+
+
+def _populate_estoque(rows: int, batch_size: int = 5000) -> None:
+    EstabelecimentoEstoque.objects.bulk_create([
+        EstabelecimentoEstoque(
+            codigo_cnes=1000000 + i,
+            codigo_uf=29,
+            uf='BA',
+            codigo_municipio=2927408,
+            municipio='SALVADOR',
+            razao_social='SECRETARIA MUNICIPAL DE SAUDE',
+            nome_fantasia='FARMACIA BASICA',
+            cep='40000000',
+            logradouro='RUA EXEMPLO',
+            numero_endereco='100',
+            bairro='CENTRO',
+            telefone='7130000000',
+            latitude=-12.97,
+            longitude=-38.50,
+            email='farmacia@example.com',
+        )
+        for i in range(500)
+    ], ignore_conflicts=True)
+    Produto.objects.bulk_create([
+        Produto(
+            codigo_catmat=f'BR{i:07d}',
+            descricao_produto='PARACETAMOL 500 MG COMPRIMIDO',
+            tipo_produto='BASICO',
+        )
+        for i in range(3000)
+    ], ignore_conflicts=True)
+    programa, _ = ProgramaSaude.objects.get_or_create(
+        sigla_programa_saude='CBAF',
+        defaults={'descricao_programa_saude': 'COMPONENTE BASICO DA ASSISTENCIA FARMACEUTICA'},
+    )
+    produto_ids = dict(Produto.objects.values_list('codigo_catmat', 'id'))
+
+    for start in range(0, rows, batch_size):
+        Estoque.objects.bulk_create([
+            Estoque(
+                estabelecimento_id=1000000 + i % 500,
+                produto_id=produto_ids[f'BR{i % 3000:07d}'],
+                programa=programa,
+                data_posicao_estoque='2024-11-20',
+                quantidade_estoque=i % 1000,
+                numero_lote=f'L{i:08d}',
+                data_validade='2025-06-30',
+                sigla_sistema_origem='HORUS',
+                atual=True,
+            )
+            for i in range(start, min(start + batch_size, rows))
+        ])
+
+
+def _consume_export(formato: str, rows: int) -> Dict[str, Any]:
+    request = RequestFactory().get('/api/estoque/export/', {'formato': formato})
+    result = {'format': formato, 'rows': rows, 'bytes': 0}
+    with measure(result):
+        response = EstoqueExportView.as_view()(request)
+        for chunk in response.streaming_content:
+            result['bytes'] += len(chunk)
+    return result
+
+
+def run(rows: int = 50000, **options) -> List[Dict[str, Any]]:
+    """Exporta N e 2N linhas em cada formato; o pico de memória deve se manter estável"""
+    results = []
+    with test_database():
+        for total in (rows, rows * 2):
+            Estoque.objects.all().delete()
+            _populate_estoque(total)
+            for formato in ('ndjson', 'csv'):
+                results.append(_consume_export(formato, total))
+    return results
@@ -0,0 +1,257 @@
+"""Servidor local que imita a API de dados abertos do DATASUS para os benchmarks de ETL"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Rota paginada -> chave da lista de registros na resposta
+ROUTES = {
+    '/cnes/estabelecimentos': 'estabelecimentos',
+    '/daf/estoque-medicamentos-bnafar-horus': 'estoque',
+}
+TIPOS_UNIDADE = {
+    1: 'POSTO DE SAUDE',
+    2: 'CENTRO DE SAUDE/UNIDADE BASICA',
+    4: 'POLICLINICA',
+    5: 'HOSPITAL GERAL',
+    7: 'HOSPITAL ESPECIALIZADO',
+    36: 'CLINICA/CENTRO DE ESPECIALIDADE',
+    43: 'FARMACIA',
+    70: 'CENTRO DE ATENCAO PSICOSSOCIAL',
+}
+
+
+def fake_estabelecimento(i: int, uf_code: int = 29) -> Dict[str, Any]:
+    """
+    Registro de estabelecimento no formato retornado por /cnes/estabelecimentos; o
+    código CNES começa pelo código da UF, para que UFs diferentes não colidam
+    """
+    return {
+        'codigo_cnes': uf_code * 100000 + i,
+        'numero_cnpj_entidade': None,
+        'nome_razao_social': f'ESTABELECIMENTO {i}',
+        'nome_fantasia': f'UNIDADE DE SAUDE {i}',
+        'natureza_organizacao_entidade': None,
+        'tipo_gestao': 'M',
+        'descricao_nivel_hierarquia': None,
+        'descricao_esfera_administrativa': 'MUNICIPAL',
+        'codigo_tipo_unidade': 2,
+        'codigo_cep_estabelecimento': '40000000',
+        'endereco_estabelecimento': 'RUA DA SAUDE',
+        'numero_estabelecimento': str(i % 1000),
+        'bairro_estabelecimento': 'CENTRO',
+        'numero_telefone_estabelecimento': None,
+        'latitude_estabelecimento_decimo_grau': -12.97 - (i % 100) / 100,
+        'longitude_estabelecimento_decimo_grau': -38.5 - (i % 100) / 100,
+        'endereco_email_estabelecimento': None,
+        'numero_cnpj': None,
+        'codigo_identificador_turno_atendimento': '03',
+        'descricao_turno_atendimento': 'MANHA E TARDE',
+        'estabelecimento_faz_atendimento_ambulatorial_sus': 'SIM',
+        'codigo_estabelecimento_saude': None,
+        'codigo_uf': uf_code,
+        'codigo_municipio': 292740,
+        'descricao_natureza_juridica_estabelecimento': '1244',
+        'codigo_motivo_desabilitacao_estabelecimento': None,
+        'estabelecimento_possui_centro_cirurgico': 0,
+        'estabelecimento_possui_centro_obstetrico': 0,
+        'estabelecimento_possui_centro_neonatal': 0,
+        'estabelecimento_possui_atendimento_hospitalar': 0,
+        'estabelecimento_possui_servico_apoio': 1,
+        'estabelecimento_possui_atendimento_ambulatorial': 1,
+        'codigo_atividade_ensino_unidade': '04',
+        'codigo_natureza_organizacao_unidade': None,
+        'codigo_nivel_hierarquia_unidade': None,
+        'codigo_esfera_administrativa_unidade': None,
+    }
+
+
+def fake_estoque(i: int, uf_code: int = 29) -> Dict[str, Any]:
+    """
+    Registro de estoque no formato de /daf/estoque-medicamentos-bnafar-horus; cada
+    estabelecimento tem 40 lotes, distribuídos entre 200 produtos e 5 programas
+    """
+    cnes = uf_code * 100000 + i // 40
+    return {
+        'codigo_cnes': cnes,
+        'codigo_uf': uf_code,
+        'uf': 'BA',
+        'codigo_municipio': 292740,
+        'municipio': 'SALVADOR',
+        'razao_social': f'FARMACIA {cnes}',
+        'nome_fantasia': f'FARMACIA BASICA {cnes}',
+        'cep': '40000000',
+        'logradouro': 'RUA DA SAUDE',
+        'numero_endereco': str(cnes % 1000),
+        'bairro': 'CENTRO',
+        'telefone': None,
+        'latitude': -12.97 - (cnes % 100) / 100,
+        'longitude': -38.5 - (cnes % 100) / 100,
+        'email': None,
+        'codigo_catmat': f'BR{i % 200:07d}',
+        'descricao_produto': f'MEDICAMENTO {i % 200}',
+        'tipo_produto': 'BASICO' if i % 3 else 'ESTRATEGICO',
+        'sigla_programa_saude': f'PRG{i % 5}',
+        'descricao_programa_saude': f'PROGRAMA DE SAUDE {i % 5}',
+        'quantidade_estoque': (i * 37) % 5000,
+        'numero_lote': f'L{i:08d}',
+        'data_validade': f'2027-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+        'data_posicao_estoque': '2026-10-01',
+        'sigla_sistema_origem': 'HORUS',
+    }
+
+
+def load_recording(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Lê uma gravação da API: um JSON com a rota como chave e a lista completa de
+    registros como valor (ex.: {"/cnes/estabelecimentos": [...]})
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FakeDatasusServer:
+    """
+    Servidor HTTP em thread que responde às rotas da API com `records` registros
+    sintéticos por rota paginada, ou com os registros de `recording` quando a rota
+    estiver gravada, e `latency` segundos de atraso por requisição.
+
+    `error_rate` e `throttle_rate` são as frações de requisições respondidas com 500 e
+    com 429 (com Retry-After de `retry_after` segundos); o sorteio usa `seed` para que
+    execuções sejam comparáveis. Acima de `rate_limit` requisições por segundo a resposta
+    também é 429, e um `limit` maior que `max_page_size` é recusado com 400. As respostas
+    têm ETag, e um If-None-Match igual recebe 304.
+
+    Use como context manager; `url` é a base a ser usada no lugar de
+    https://apidadosabertos.saude.gov.br.
+    """
+
+    def __init__(
+        self,
+        records: int = 1000,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 0,
+        recording: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        seed: int = 0,
+        rate_limit: Optional[float] = None,
+        max_page_size: Optional[int] = None,
+    ):
+        self.records = records
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.recording = recording or {}
+        self.rate_limit = rate_limit
+        self.max_page_size = max_page_size
+        self._recent = deque()
+        self.requests = 0
+        self.statuses = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self) -> 'FakeDatasusServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def page(self, path: str, params: Dict[str, list]) -> Optional[Dict[str, Any]]:
+        """Conteúdo da resposta para a rota; None para rotas desconhecidas"""
+        if path == '/cnes/tipounidades':
+            return {'tipos_unidade': self.recording.get(path) or [
+                {'codigo_tipo_unidade': codigo, 'descricao_tipo_unidade': descricao}
+                for codigo, descricao in TIPOS_UNIDADE.items()
+            ]}
+        if path not in ROUTES:
+            return None
+        limit = int(params.get('limit', ['20'])[0])
+        if self.max_page_size is not None and limit > self.max_page_size:
+            return {'error': f'limit deve ser no máximo {self.max_page_size}'}
+        offset = int(params.get('offset', ['0'])[0])
+        uf_code = int(params.get('codigo_uf', ['29'])[0])
+        if path in self.recording:
+            registros = self.recording[path][offset:offset + limit]
+        else:
+            fake = fake_estabelecimento if path == '/cnes/estabelecimentos' else fake_estoque
+            registros = [fake(i, uf_code) for i in range(offset, min(offset + limit, self.records))]
+        return {ROUTES[path]: registros}
+
+    def fault(self) -> Optional[int]:
+        """Status de erro sorteado para a próxima requisição, ou None para respondê-la"""
+        with self._lock:
+            sorteio = self._random.random()
+            if self.rate_limit is not None:
+                # Janela deslizante de um segundo com as requisições aceitas
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    return 429
+                self._recent.append(now)
+        if sorteio < self.throttle_rate:
+            return 429
+        if sorteio < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, status: int, body: bytes = b'', headers: Dict[str, str] = None):
+                with server._lock:
+                    server.statuses[status] += 1
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                status = server.fault()
+                if status == 429:
+                    self.respond(429, headers={'Retry-After': str(server.retry_after)})
+                    return
+                if status is not None:
+                    self.respond(status)
+                    return
+                parsed = urlparse(self.path)
+                data = server.page(parsed.path, parse_qs(parsed.query))
+                if data is None:
+                    self.respond(404)
+                    return
+                if 'error' in data:
+                    self.respond(400, json.dumps(data).encode('utf-8'), {'Content-Type': 'application/json'})
+                    return
+                body = json.dumps(data).encode('utf-8')
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.respond(304, headers={'ETag': etag})
+                    return
+                self.respond(200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+        return Handler
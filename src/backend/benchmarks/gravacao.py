@@ -0,0 +1,66 @@
+"""Benchmark da gravação das cargas da API no SQLite, com e sem o modo de carga em massa"""
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from api.models import CargaApi, Estabelecimento, Estoque
+from etl.bulk_load import bulk_mode
+from etl.checkpoint import finish_download, stage_page, start_run
+from etl.etl_estabelecimentos import EstabelecimentosETL
+from etl.etl_estoque import EstoqueETL
+from .common import measure, test_database
+from .fake_api import fake_estabelecimento, fake_estoque
+
+PAGE_SIZE = 1000
+
+
+def _stage(fonte: str, registros: List[Dict[str, Any]]) -> CargaApi:
+    carga = start_run(fonte, 29)
+    for i in range(0, len(registros), PAGE_SIZE):
+        stage_page(carga, registros[i:i + PAGE_SIZE], PAGE_SIZE)
+    finish_download(carga)
+    return carga
+
+
+def _registros(fake, rows: int, versao: int) -> List[Dict[str, Any]]:
+    registros = [fake(i) for i in range(rows)]
+    # Na recarga, todos os registros mudam e viram atualizações das mesmas chaves
+    for registro in registros:
+        if 'quantidade_estoque' in registro:
+            registro['quantidade_estoque'] += versao
+        else:
+            registro['nome_fantasia'] = f"{registro['nome_fantasia']} v{versao}"
+    return registros
+
+
+def run(rows: int = 50000, **options) -> List[Dict[str, Any]]:
+    """
+    Grava `rows` registros sintéticos de cada carga em staging e os publica, sem acesso à
+    rede, em um banco de testes em arquivo, para que o fsync e o journal entrem na medição.
+    Cada modo usa um banco novo, com uma carga inicial e uma recarga que atualiza todas
+    as linhas
+    """
+    # Uma linha de log por lote distorceria a medição
+    for name in ('etl.etl_estabelecimentos', 'etl.etl_estoque'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    results = []
+    for bulk_load in (False, True):
+        with tempfile.TemporaryDirectory() as directory, test_database(os.path.join(directory, 'gravacao.sqlite3')):
+            for versao, carga in enumerate(('inicial', 'recarga')):
+                for stage, build, fake, model in (
+                    ('estabelecimentos', EstabelecimentosETL, fake_estabelecimento, Estabelecimento),
+                    ('estoque', EstoqueETL, fake_estoque, Estoque),
+                ):
+                    registros = _registros(fake, rows, versao)
+                    etl = build(bulk_load=bulk_load)
+                    result = {'stage': stage, 'carga': carga, 'bulk_load': bulk_load}
+                    with measure(result):
+                        with bulk_mode(bulk_load, report=etl.report):
+                            etl.publish(_stage(stage, registros))
+                        result['rows'] = model.objects.count()
+                    result['stage_seconds'] = {
+                        stats['stage']: stats['wall_seconds'] for stats in etl.report.to_dict()['stages']
+                    }
+                    results.append(result)
+    return results
@@ -0,0 +1,107 @@
+"""Benchmark das cargas da API (estabelecimentos e estoque) contra a API simulada, sem acesso à rede"""
+import logging
+import tempfile
+from contextlib import suppress
+from typing import Any, Dict, List
+
+from api.models import Estabelecimento, Estoque
+from etl.etl_estabelecimentos import EstabelecimentosETL
+from etl.etl_estoque import EstoqueETL
+from etl.page_cache import PageCache
+from .common import measure, test_database
+from .fake_api import FakeDatasusServer, load_recording
+
+
+def _estabelecimentos(server: FakeDatasusServer, cache: PageCache, **kwargs) -> EstabelecimentosETL:
+    etl = EstabelecimentosETL(cache=cache, **kwargs)
+    etl.base_url = f'{server.url}/cnes/estabelecimentos'
+    etl.tipo_unidade_url = f'{server.url}/cnes/tipounidades'
+    return etl
+
+
+def _estoque(server: FakeDatasusServer, cache: PageCache, **kwargs) -> EstoqueETL:
+    etl = EstoqueETL(cache=cache, **kwargs)
+    etl.base_url = f'{server.url}/daf/estoque-medicamentos-bnafar-horus'
+    return etl
+
+
+def run(
+    rows: int = 50000,
+    latency: float = 0.05,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    retry_after: int = 0,
+    recording: str = None,
+    rate_limit: float = None,
+    max_page_size: int = None,
+    page_size: int = None,
+    cache: bool = False,
+    uf: str = '29',
+    shard_workers: int = 4,
+    rate_limiter: bool = True,
+    **options
+) -> List[Dict[str, Any]]:
+    """
+    `rows` é o número de registros servidos por rota; `error_rate` e `throttle_rate` são as
+    frações de respostas 500 e 429, e `recording` um JSON de load_recording no lugar dos
+    registros sintéticos. `rate_limit` e `max_page_size` são os limites impostos pela API
+    simulada; sem `page_size`, as cargas negociam o tamanho de página. Com `cache`, cada
+    carga roda três vezes sobre um cache de páginas temporário: vazio, revalidado com
+    requisições condicionais e offline. `uf` aceita várias UFs (ou "all"), baixadas por
+    `shard_workers` threads; `rows` vale por UF. `rate_limiter` falso desliga o limite de
+    taxa do cliente HTTP
+    """
+    modes = ('cold', 'revalidate', 'offline') if cache else (None,)
+    # Uma linha de log por página distorceria a medição
+    for name in ('etl.etl_estabelecimentos', 'etl.etl_estoque'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    results = []
+    with FakeDatasusServer(
+        records=rows,
+        latency=latency,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        retry_after=retry_after,
+        recording=load_recording(recording) if recording else None,
+        rate_limit=rate_limit,
+        max_page_size=max_page_size,
+    ) as server, test_database(), tempfile.TemporaryDirectory() as cache_dir:
+        for (stage, build, model), mode in (
+            (carga, mode)
+            for carga in (
+                ('estabelecimentos', _estabelecimentos, Estabelecimento),
+                ('estoque', _estoque, Estoque),
+            )
+            for mode in modes
+        ):
+            page_cache = PageCache(cache_dir, offline=mode == 'offline') if mode else None
+            etl = build(server, page_cache, uf_code=uf, shard_workers=shard_workers, page_size=page_size)
+            etl.client.rate_limited = rate_limiter
+            requests_before, statuses_before = server.requests, server.statuses.copy()
+            result = {
+                'stage': stage,
+                'latency': latency,
+                'error_rate': error_rate,
+                'throttle_rate': throttle_rate,
+                'ufs': len(etl.uf_codes),
+                'shard_workers': shard_workers,
+            }
+            if mode:
+                result['cache'] = mode
+            with measure(result):
+                # Uma carga que esgota as novas tentativas fica registrada no status do relatório
+                with suppress(Exception):
+                    etl.run()
+                result['rows'] = model.objects.count()
+            report = etl.report.to_dict()
+            result['status'] = report['status']
+            result['requests'] = server.requests - requests_before
+            result['responses'] = {
+                str(status): count for status, count in sorted((server.statuses - statuses_before).items())
+            }
+            result['http_retries'] = report['http_retries']
+            result['page_size'] = etl.page_size
+            result['hosts'] = report['hosts']
+            result['stage_seconds'] = {stats['stage']: stats['wall_seconds'] for stats in report['stages']}
+            results.append(result)
+    return results
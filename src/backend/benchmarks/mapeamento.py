@@ -0,0 +1,50 @@
+"""Benchmark da conversão de registros da API em instâncias dos modelos, sem banco nem rede"""
+from typing import Any, Dict, List
+
+from etl.etl_estabelecimentos import ESTABELECIMENTO_MAPPING
+from etl.etl_estoque import ESTABELECIMENTO_MAPPING as ESTABELECIMENTO_ESTOQUE_MAPPING
+from etl.etl_estoque import ESTOQUE_MAPPING, PRODUTO_MAPPING, PROGRAMA_MAPPING
+from .common import measure
+from .fake_api import fake_estabelecimento, fake_estoque
+
+
+def _corrupt(registros: List[Dict[str, Any]], invalid_rate: float) -> List[Dict[str, Any]]:
+    """Cópia dos registros com uma fração de números inválidos e campos obrigatórios ausentes"""
+    registros = [dict(registro) for registro in registros]
+    if invalid_rate:
+        step = max(1, round(1 / invalid_rate))
+        for registro in registros[::step]:
+            for chave in ('quantidade_estoque', 'latitude_estabelecimento_decimo_grau', 'latitude'):
+                if chave in registro:
+                    registro[chave] = 'n/d'
+            registro['codigo_cnes'] = None
+    return registros
+
+
+def run(rows: int = 50000, batch_size: int = 100, invalid_rate: float = 0.01, **options) -> List[Dict[str, Any]]:
+    """
+    Converte `rows` registros sintéticos por mapeamento, em lotes de `batch_size` como nas
+    cargas, sem e com uma fração `invalid_rate` de registros inválidos
+    """
+    estabelecimentos = [fake_estabelecimento(i) for i in range(rows)]
+    estoque = [fake_estoque(i) for i in range(rows)]
+    results = []
+    for name, mapping, registros in (
+        ('estabelecimento', ESTABELECIMENTO_MAPPING, estabelecimentos),
+        ('estabelecimento_estoque', ESTABELECIMENTO_ESTOQUE_MAPPING, estoque),
+        ('produto', PRODUTO_MAPPING, estoque),
+        ('programa', PROGRAMA_MAPPING, estoque),
+        ('estoque', ESTOQUE_MAPPING, estoque),
+    ):
+        for rate in (0.0, invalid_rate):
+            lote = _corrupt(registros, rate)
+            result = {'stage': name, 'fields': len(mapping.specs), 'invalid_rate': rate}
+            with measure(result):
+                rejected = 0
+                for i in range(0, len(lote), batch_size):
+                    _, failures = mapping.convert_batch(lote[i:i + batch_size])
+                    rejected += len(failures)
+                result['rows'] = len(lote) - rejected
+            result['rejected'] = rejected
+            results.append(result)
+    return results
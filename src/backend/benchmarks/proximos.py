@@ -0,0 +1,71 @@
+"""Benchmark da busca por proximidade com o índice espacial contra a varredura completa"""
+import random
+import time
+from typing import Any, Dict, List
+
+from api.models import EstabelecimentoEstoque, Estoque, Produto, ProgramaSaude
+from api.spatial import haversine_km, nearest, refresh_spatial_index
+from .common import test_database
+
+
+def _populate(facilities: int) -> Produto:
+    rng = random.Random(42)
+    EstabelecimentoEstoque.objects.bulk_create([
+        EstabelecimentoEstoque(
+            codigo_cnes=i,
+            codigo_municipio=2927408,
+            bairro='CENTRO',
+            # Caixa aproximada do estado da Bahia
+            latitude=rng.uniform(-18.3, -8.5),
+            longitude=rng.uniform(-46.6, -37.3),
+        )
+        for i in range(facilities)
+    ], batch_size=5000)
+    produto = Produto.objects.create(codigo_catmat='BR0267686', descricao_produto='DIPIRONA')
+    programa = ProgramaSaude.objects.create(sigla_programa_saude='CBAF')
+    Estoque.objects.bulk_create([
+        Estoque(
+            estabelecimento_id=i,
+            produto=produto,
+            programa=programa,
+            data_posicao_estoque='2024-11-20',
+            quantidade_estoque=rng.randint(1, 500),
+            numero_lote=f'L{i}',
+            atual=True,
+        )
+        for i in range(facilities)
+    ], batch_size=5000)
+    return produto
+
+
+def run(rows: int = 50000, k: int = 10, queries: int = 50, **options) -> List[Dict[str, Any]]:
+    """`rows` é o número de estabelecimentos com estoque do produto"""
+    rng = random.Random(7)
+    with test_database():
+        produto = _populate(rows)
+        start = time.perf_counter()
+        indexed = refresh_spatial_index()
+        build_seconds = time.perf_counter() - start
+
+        points = [(rng.uniform(-18.3, -8.5), rng.uniform(-46.6, -37.3)) for _ in range(queries)]
+        coords = list(EstabelecimentoEstoque.objects.values_list('codigo_cnes', 'latitude', 'longitude'))
+
+        start = time.perf_counter()
+        indexed_results = [nearest(produto, lat, lon, k) for lat, lon in points]
+        indexed_ms = (time.perf_counter() - start) / queries * 1000
+
+        start = time.perf_counter()
+        mismatches = 0
+        for (lat, lon), result in zip(points, indexed_results):
+            brute = sorted(coords, key=lambda c: haversine_km(lat, lon, c[1], c[2]))[:k]
+            mismatches += [c[0] for c in brute] != [r['codigo_cnes'] for r in result]
+        scan_ms = (time.perf_counter() - start) / queries * 1000
+
+    return [{
+        'locations': indexed,
+        'index_build_seconds': round(build_seconds, 3),
+        'k': k,
+        'indexed_query_ms': round(indexed_ms, 3),
+        'full_scan_query_ms': round(scan_ms, 3),
+        'mismatches': mismatches,
+    }]
@@ -0,0 +1,42 @@
+"""Benchmark do endpoint de pivot contra o GROUP BY direto sobre Estoque"""
+import time
+from typing import Any, Dict, List
+
+from django.db.models import Count, Sum
+from django.test import RequestFactory
+
+from api.models import Estoque
+from api.rollups import refresh_rollups
+from api.views import EstoquePivotView
+from .common import test_database
+from .export import _populate_estoque
+
+
+def _timed(func, repeat: int = 5) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return round((time.perf_counter() - start) / repeat * 1000, 3)
+
+
+def run(rows: int = 50000, **options) -> List[Dict[str, Any]]:
+    """Compara a latência das duas abordagens com N e 4N linhas brutas"""
+    request = RequestFactory().get(
+        '/api/estoque/pivot/', {'dimensoes': 'codigo_catmat,codigo_municipio'}
+    )
+    results = []
+    with test_database():
+        for total in (rows, rows * 4):
+            Estoque.objects.all().delete()
+            _populate_estoque(total)
+            refresh_rollups()
+            results.append({
+                'rows': total,
+                'group_by_ms': _timed(lambda: list(
+                    Estoque.objects.values_api('codigo_catmat', 'codigo_municipio')
+                    .annotate(quantidade_estoque=Sum('quantidade_estoque'), lotes=Count('id'))
+                    .order_by()
+                )),
+                'pivot_ms': _timed(lambda: EstoquePivotView.as_view()(request)),
+            })
+    return results
@@ -0,0 +1,144 @@
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional, Sequence
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models.fields import AutoFieldMixin
+
+from etl.instrumentation import RunReport
+
+# PRAGMAs do modo de carga em massa: sem fsync, journal em memória, 256 MiB de cache
+# de páginas e ordenações da recriação de índices em memória
+BULK_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'cache_size': -262144,
+    'temp_store': 'MEMORY',
+}
+# Registros por lote da publicação no modo de carga em massa
+BULK_BATCH_SIZE = 5000
+
+
+class IntegrityCheckError(DatabaseError):
+    """PRAGMA integrity_check encontrou problemas no banco ao fim da carga em massa"""
+
+
+def _pragma(cursor, name: str, value=None):
+    cursor.execute(f'PRAGMA {name}' if value is None else f'PRAGMA {name} = {value}')
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def integrity_check(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Roda PRAGMA integrity_check e levanta IntegrityCheckError se o resultado não for ok"""
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA integrity_check')
+        problems = [row[0] for row in cursor.fetchall()]
+    if problems != ['ok']:
+        raise IntegrityCheckError('; '.join(problems[:10]))
+
+
+@contextmanager
+def bulk_mode(
+    enabled: bool = True, using: str = DEFAULT_DB_ALIAS, report: Optional[RunReport] = None
+) -> Iterator[None]:
+    """
+    Modo de carga em massa do SQLite na conexão da thread atual, que nas cargas da API
+    é a única que grava. Aplica BULK_PRAGMAS, que trocam a durabilidade diante de uma
+    queda do sistema por velocidade de escrita; ao sair, mesmo após uma falha, restaura
+    os valores anteriores e roda o integrity_check. Fora do SQLite ou sem `enabled`,
+    não faz nada. Deve ser aberto fora de transações, onde o journal_mode não muda.
+    """
+    connection = connections[using]
+    if not enabled or connection.vendor != 'sqlite':
+        yield
+        return
+    if connection.in_atomic_block:
+        raise RuntimeError('SQLite bulk mode must be entered outside a transaction')
+    with connection.cursor() as cursor:
+        saved = {name: _pragma(cursor, name) for name in BULK_PRAGMAS}
+        for name, value in BULK_PRAGMAS.items():
+            _pragma(cursor, name, value)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in saved.items():
+                _pragma(cursor, name, value)
+        with report.stage('integrity_check') if report is not None else nullcontext():
+            integrity_check(using)
+
+
+@contextmanager
+def deferred_indexes(
+    model, using: str = DEFAULT_DB_ALIAS, report: Optional[RunReport] = None
+) -> Iterator[bool]:
+    """
+    Remove os índices secundários da tabela de `model` durante o bloco e os recria ao
+    sair, de uma vez sobre a tabela inteira. Os índices únicos ficam, pois os upserts
+    dependem deles. Só compensa na carga inicial, então os índices só são adiados com a
+    tabela vazia; fora disso, ou fora do SQLite, são mantidos. Produz True quando os
+    índices foram adiados.
+
+    O bloco pode abranger várias transações, como as páginas de import_shards. Os
+    índices são recriados mesmo após uma falha, mas se o processo for interrompido a
+    tabela fica sem eles, assim como o banco pode ficar corrompido no modo de carga em
+    massa: restaure o backup.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        yield False
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+            "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%%'",
+            [model._meta.db_table],
+        )
+        indexes = cursor.fetchall()
+    if not indexes or model._base_manager.using(using).exists():
+        yield False
+        return
+    with connection.cursor() as cursor:
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield True
+    finally:
+        # Uma transação marcada para rollback já vai restaurar os índices removidos
+        if not connection.needs_rollback:
+            with report.stage('index_rebuild') if report is not None else nullcontext():
+                with connection.cursor() as cursor:
+                    for _, sql in indexes:
+                        cursor.execute(sql)
+
+
+def bulk_upsert(
+    model, objs: Sequence, unique_fields: Sequence[str], update_fields: Sequence[str],
+    using: str = DEFAULT_DB_ALIAS
+) -> int:
+    """
+    Equivalente a bulk_create(update_conflicts=True) com um único executemany de um
+    INSERT ... ON CONFLICT preparado uma vez, em vez de comandos com várias linhas
+    limitados a 999 parâmetros cada (poucas dezenas de linhas por comando nas tabelas
+    largas). Não preenche a chave primária automática das instâncias.
+    """
+    if not objs:
+        return 0
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields if not isinstance(field, AutoFieldMixin)]
+    updates = [quote(opts.get_field(name).column) for name in update_fields]
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"ON CONFLICT ({', '.join(quote(opts.get_field(name).column) for name in unique_fields)}) "
+        f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in updates)}"
+    )
+    rows = [
+        [field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields]
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
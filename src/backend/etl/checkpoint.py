@@ -0,0 +1,72 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterator, List
+
+from django.db import transaction
+
+from api.models import CargaApi, PaginaCargaApi
+
+
+def content_hash(value: Any) -> str:
+    """Hash estável de um valor JSON da API, seja uma página ou um único registro"""
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+def start_run(fonte: str, uf: int, resume: bool = False) -> CargaApi:
+    """
+    Retoma a última carga não publicada de (fonte, uf) quando `resume` é informado;
+    caso contrário descarta o staging de cargas abandonadas e inicia uma nova.
+    """
+    pendentes = CargaApi.objects.filter(fonte=fonte, uf=uf).exclude(status=CargaApi.PUBLICADO)
+    if resume:
+        carga = pendentes.first()
+        if carga is not None:
+            return carga
+    pendentes.delete()
+    return CargaApi.objects.create(fonte=fonte, uf=uf)
+
+
+def stage_page(carga: CargaApi, registros: List[Dict[str, Any]], page_size: int) -> None:
+    """
+    Grava uma página em staging no offset `carga.ultimo_offset`, avançando o checkpoint
+    na mesma transação. Uma falha no meio do download mantém tudo o que já foi gravado.
+    """
+    with transaction.atomic():
+        PaginaCargaApi.objects.create(
+            carga=carga,
+            offset=carga.ultimo_offset,
+            hash_conteudo=content_hash(registros),
+            registros=registros,
+        )
+        carga.ultimo_offset += page_size
+        carga.registros += len(registros)
+        carga.save(update_fields=['ultimo_offset', 'registros', 'atualizada_em'])
+
+
+def finish_download(carga: CargaApi) -> None:
+    """Marca o fim das páginas: a carga passa a BAIXADO e pode ser publicada"""
+    carga.status = CargaApi.BAIXADO
+    carga.erro = None
+    carga.save(update_fields=['status', 'erro', 'atualizada_em'])
+
+
+def fail_run(carga: CargaApi, error: BaseException) -> None:
+    """Registra o erro na carga, preservando o checkpoint para um --resume"""
+    carga.erro = str(error)
+    carga.save(update_fields=['erro', 'atualizada_em'])
+
+
+def staged_records(carga: CargaApi, chunk_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """Registros gravados em staging, na ordem dos offsets da API"""
+    paginas = carga.paginas.order_by('offset').values_list('registros', flat=True)
+    for registros in paginas.iterator(chunk_size=chunk_size):
+        yield from registros
+
+
+def publish_run(carga: CargaApi) -> None:
+    """Marca a carga como publicada e limpa o staging; chamar na transação da publicação"""
+    carga.paginas.all().delete()
+    carga.status = CargaApi.PUBLICADO
+    carga.save(update_fields=['status', 'atualizada_em'])
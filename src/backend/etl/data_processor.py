@@ -1,15 +1,62 @@
+import numpy as np
 import pandas as pd
+import hashlib
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
 from django.db import transaction
-from api.models import Cidade, Indicador, MacroRegiao, RegiaoSaude, ValorIndicador
+from openpyxl import load_workbook
+from api.models import CargaIndicador, Cidade, Indicador, MacroRegiao, ManifestoPlanilha, RegiaoSaude, ValorIndicador
+from etl.instrumentation import RunReport
+from etl.validation import ERRO, SheetSchema, SheetValidationError, validate_sheet
 import re
 
+ANOS_INDICADOR = range(2010, 2021)
+VALORES_BATCH_SIZE = 5000
+HEADER_ROW = 2
+REQUIRED_COLUMNS = ['Macrorregião de Saúde', 'Região de Saúde', 'Cod. IBGE', 'Município']
+REGIOES_INDICADOR = 'indicador_3'
+MUNICIPIOS_CSV = 'municipios.csv'
+INDICADORES_PARQUET = 'indicadores.parquet'
+# Colunas e tipos do cache em formato longo lido por scripts/indicator_store.py; título,
+# subtítulo e fonte de cada indicador ficam nos metadados do arquivo (DataFrame.attrs)
+STORE_COLUMNS = {
+    'Macrorregião de Saúde': 'macrorregiao',
+    'Região de Saúde': 'regiao_saude',
+    'Cod. IBGE': 'cod_ibge',
+    'Município': 'municipio',
+}
+STORE_DTYPES = {
+    'nome_arquivo': 'category',
+    'macrorregiao': 'category',
+    'regiao_saude': 'category',
+    'cod_ibge': 'string',
+    'municipio': 'string',
+    'ano': 'int16',
+    'valor': 'float64',
+}
+YEAR_COLUMN = re.compile(r'^\d{4}$')
+
+# Metadados e dados de uma planilha de indicador; `dados` é None quando a estrutura é inválida
+# e `problemas` só é preenchido quando a validação está ativa
+IndicatorSheet = namedtuple(
+    'IndicatorSheet',
+    ['nome_arquivo', 'titulo', 'subtitulo', 'fonte', 'hash_conteudo', 'dados', 'problemas'],
+    defaults=((),),
+)
+
 class HealthDataETL:
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None):
         self.data_dir = Path('assets/data')
         self.indicadores_dir = Path('assets/indicadores')
+        self.workers = workers or os.cpu_count() or 1
+        self.report = RunReport('indicadores')
+        self.schema = None
         self.setup_logging()
 
     def setup_logging(self):
@@ -33,104 +80,272 @@ class HealthDataETL:
         except (ValueError, TypeError):
             return None
 
-    def validate_sheet_structure(self, df: pd.DataFrame) -> bool:
+    def clean_numeric_series(self, values: pd.Series) -> pd.Series:
+        """Versão vetorizada de clean_numeric_value para uma coluna inteira"""
+        cleaned = values.astype('string').str.replace(',', '.', regex=False).str.strip()
+        return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+
+    def validate_sheet_structure(self, columns: Iterable[str]) -> bool:
         """Valida se a planilha possui as colunas necessárias"""
-        required_cols = ['Macrorregião de Saúde', 'Região de Saúde', 'Cod. IBGE', 'Município']
-        return all(col in df.columns for col in required_cols)
+        return all(col in columns for col in REQUIRED_COLUMNS)
 
     @transaction.atomic
-    def process_excel_file(self, xlsx_path: str):
-        """Processo principal de ETL"""
+    def process_excel_file(
+        self, xlsx_path: str, export_csv: bool = False, full: bool = False, validate: bool = False
+    ):
+        """Processo principal de ETL
+
+        Planilhas cujo conteúdo não mudou desde a última importação são ignoradas, a menos
+        que `full` seja informado. A exportação de CSV sempre reprocessa todas as planilhas.
+        Com `validate`, as planilhas lidas são verificadas contra o esquema esperado e a
+        carga é interrompida antes de qualquer escrita se houver erros.
+        """
         try:
             self.logger.info(f"Iniciando processo ETL para {xlsx_path}")
-            
-            xl = pd.ExcelFile(xlsx_path)
-            metadata_df = self.extract_metadata(xl)
-            self.save_metadata(metadata_df)
-            
-            for sheet_name in xl.sheet_names:
-                if not self.is_valid_indicator_sheet(sheet_name):
-                    continue
-                    
-                self.logger.info(f"Processando planilha: {sheet_name}")
-                df = self.process_indicator_sheet(xl, sheet_name)
-                if df is not None:
-                    self.save_indicator_data(sheet_name, df)
-            
-            self.import_to_database()
-            
+
+            manifest = {} if full or export_csv else self.load_manifest()
+            municipios_hash = self.file_hash(self.data_dir / MUNICIPIOS_CSV)
+            self.schema = self.build_schema() if validate else None
+            if manifest and manifest.get(MUNICIPIOS_CSV) != municipios_hash:
+                self.logger.info(f"{MUNICIPIOS_CSV} alterado, reprocessando todas as planilhas")
+                manifest = {}
+
+            with self.report.stage('read_workbook') as stage:
+                sheets = self.read_workbook(xlsx_path, manifest)
+                stage.add(rows_out=sum(len(sheet.dados) for sheet in sheets if sheet.dados is not None))
+            if not sheets:
+                self.logger.info("Nenhuma planilha alterada desde a última importação")
+                self.report.finish()
+                return
+
+            if validate:
+                with self.report.stage('validate') as stage:
+                    self.check_validation(sheets)
+                    stage.add(rows_in=sum(len(sheet.dados) for sheet in sheets if sheet.dados is not None))
+
+            if export_csv:
+                with self.report.stage('export_csv'):
+                    self.save_metadata(
+                        pd.DataFrame([sheet._asdict() for sheet in sheets])
+                        .drop(columns=['hash_conteudo', 'dados', 'problemas'])
+                    )
+                    for sheet in sheets:
+                        if sheet.dados is not None:
+                            self.save_indicator_data(sheet.nome_arquivo, sheet.dados)
+
+            self.import_to_database(sheets)
+            with self.report.stage('store') as stage:
+                stage.add(rows_out=self.save_indicator_store(sheets, replace=not manifest))
+            with self.report.stage('manifest') as stage:
+                self.save_manifest(
+                    {sheet.nome_arquivo: sheet.hash_conteudo for sheet in sheets},
+                    municipios_hash,
+                )
+                stage.add(rows_out=len(sheets))
+
             self.logger.info("Processo ETL concluído com sucesso")
-            
+            self.report.finish()
+
         except Exception as e:
             self.logger.error(f"Processo ETL falhou: {str(e)}")
+            self.report.finish(error=e)
             raise
 
-    def extract_metadata(self, xl: pd.ExcelFile) -> pd.DataFrame:
-        """Extrai metadados (título, subtítulo, fonte) das planilhas"""
-        metadata = []
-        
-        for sheet_name in xl.sheet_names:
-            if not self.is_valid_indicator_sheet(sheet_name):
+    def read_workbook(self, xlsx_path: str, manifest: Optional[Dict[str, str]] = None) -> List[IndicatorSheet]:
+        """Lê cada planilha de indicador uma única vez, em modo somente leitura
+
+        Retorna apenas as planilhas cujo hash difere do registrado em `manifest`. As planilhas
+        são distribuídas entre `workers` processos; a gravação no banco continua neste processo.
+        """
+        manifest = manifest or {}
+        workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+        try:
+            sheet_names = [name for name in workbook.sheetnames if self.is_valid_indicator_sheet(name)]
+            workers = min(self.workers, len(sheet_names))
+            # Os workers herdam o Django já configurado, o que só é possível com fork
+            sequential = workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods()
+            if sequential:
+                parsed = self.parse_sheets(workbook, sheet_names, manifest)
+        finally:
+            workbook.close()
+
+        if not sequential:
+            groups = [sheet_names[i::workers] for i in range(workers)]
+            parsed = {}
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                for result in pool.map(
+                    _parse_sheets, repeat(xlsx_path), groups, repeat(manifest), repeat(self.schema)
+                ):
+                    parsed.update(result)
+
+        return [parsed[name] for name in sheet_names if parsed[name] is not None]
+
+    def parse_sheets(
+        self, workbook, sheet_names: List[str], manifest: Dict[str, str]
+    ) -> Dict[str, Optional[IndicatorSheet]]:
+        """Lê as planilhas informadas do workbook; None indica planilha sem alterações"""
+        sheets = {}
+        for sheet_name in sheet_names:
+            sheets[sheet_name] = None
+            grid = self.read_grid(workbook[sheet_name])
+            metadata = self.extract_metadata(sheet_name, grid)
+            hash_conteudo = self.grid_hash(grid)
+            if manifest.get(metadata['nome_arquivo']) == hash_conteudo:
+                self.logger.info(f"Planilha sem alterações: {sheet_name}")
                 continue
-                
-            df = xl.parse(sheet_name, header=None)
-            metadata.append({
-                'nome_arquivo': sheet_name.lower().replace(" ", "_"),
-                'titulo': df.iloc[0, 0],
-                'subtitulo': df.iloc[1, 0],
-                'fonte': self.extract_source(df)
-            })
-            
-        return pd.DataFrame(metadata)
 
-    def extract_source(self, df: pd.DataFrame) -> Optional[str]:
-        """Extrai informações da fonte do dataframe"""
-        for i in range(min(10, len(df))):
-            cell = df.iloc[-(i+1), 0]
+            self.logger.info(f"Processando planilha: {sheet_name}")
+            dados = self.process_indicator_sheet(sheet_name, grid)
+            sheets[sheet_name] = IndicatorSheet(
+                **metadata,
+                hash_conteudo=hash_conteudo,
+                dados=dados,
+                problemas=(
+                    tuple(validate_sheet(metadata['nome_arquivo'], grid, dados, self.schema))
+                    if self.schema is not None else ()
+                ),
+            )
+        return sheets
+
+    def build_schema(self) -> SheetSchema:
+        """Esquema esperado das planilhas, com os códigos IBGE conhecidos do municipios.csv"""
+        codigos = pd.read_csv(self.data_dir / MUNICIPIOS_CSV, usecols=['codigo_ibge'], dtype=str)
+        return SheetSchema(
+            header_row=HEADER_ROW,
+            required_columns=tuple(REQUIRED_COLUMNS),
+            anos=ANOS_INDICADOR,
+            # As planilhas trazem o código IBGE sem o dígito verificador
+            codigos_ibge=frozenset(codigos['codigo_ibge'].str[:-1]),
+        )
+
+    def check_validation(self, sheets: List[IndicatorSheet]):
+        """Registra os problemas encontrados e interrompe a carga se algum for erro"""
+        issues = [issue for sheet in sheets for issue in sheet.problemas]
+        for issue in issues:
+            log = self.logger.error if issue.nivel == ERRO else self.logger.warning
+            log(f"Validação {issue.planilha}: {issue.mensagem}")
+        if any(issue.nivel == ERRO for issue in issues):
+            raise SheetValidationError(issues)
+        self.logger.info(f"Validação concluída: {len(sheets)} planilhas, {len(issues)} avisos")
+
+    def read_grid(self, worksheet) -> List[tuple]:
+        """Carrega as células da planilha, descartando as linhas vazias do final"""
+        grid = list(worksheet.iter_rows(values_only=True))
+        while grid and all(cell is None for cell in grid[-1]):
+            grid.pop()
+        return grid
+
+    def grid_hash(self, grid: List[tuple]) -> str:
+        """Hash do conteúdo das células, independente da formatação e dos metadados do arquivo"""
+        return hashlib.sha256(repr(grid).encode('utf-8')).hexdigest()
+
+    def file_hash(self, path: Path) -> str:
+        """Hash do conteúdo de um arquivo"""
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    def load_manifest(self) -> Dict[str, str]:
+        """Hashes registrados na última importação bem-sucedida"""
+        return dict(ManifestoPlanilha.objects.values_list('nome', 'hash_conteudo'))
+
+    def save_manifest(self, hashes: Dict[str, str], municipios_hash: str):
+        """Registra os hashes das planilhas importadas e do municipios.csv"""
+        hashes = {**hashes, MUNICIPIOS_CSV: municipios_hash}
+        ManifestoPlanilha.objects.bulk_create(
+            [ManifestoPlanilha(nome=nome, hash_conteudo=valor) for nome, valor in hashes.items()],
+            update_conflicts=True,
+            unique_fields=['nome'],
+            update_fields=['hash_conteudo', 'importado_em'],
+        )
+
+    def extract_metadata(self, sheet_name: str, grid: List[tuple]) -> Dict[str, Optional[str]]:
+        """Extrai metadados (título, subtítulo, fonte) da planilha"""
+        return {
+            'nome_arquivo': sheet_name.lower().replace(" ", "_"),
+            'titulo': grid[0][0] if grid else None,
+            'subtitulo': grid[1][0] if len(grid) > 1 else None,
+            'fonte': self.extract_source(grid),
+        }
+
+    def extract_source(self, grid: List[tuple]) -> Optional[str]:
+        """Extrai informações da fonte das últimas linhas da planilha"""
+        for row in grid[::-1][:10]:
+            cell = row[0] if row else None
             if isinstance(cell, str) and 'fonte:' in cell.lower():
                 return cell.strip()
         return None
 
-    def extract_year_columns(self, df: pd.DataFrame) -> List[str]:
-        """Extrai colunas que representam anos"""
-        return [col for col in df.columns if re.match(r'^\d{4}$', str(col))]
+    def column_label(self, cell, position: int) -> str:
+        """Nome da coluna a partir da célula de cabeçalho, no mesmo formato do pandas"""
+        if cell is None:
+            return f'Unnamed: {position}'
+        if isinstance(cell, float) and cell.is_integer():
+            cell = int(cell)
+        return str(cell)
 
-    def process_indicator_sheet(self, xl: pd.ExcelFile, sheet_name: str) -> Optional[pd.DataFrame]:
-        """Processa planilha de indicador individual"""
+    def process_indicator_sheet(self, sheet_name: str, grid: List[tuple]) -> Optional[pd.DataFrame]:
+        """Monta o DataFrame do indicador apenas com as colunas usadas na carga"""
         try:
-            df = xl.parse(sheet_name, header=2)
-            
-            if not self.validate_sheet_structure(df):
+            if len(grid) <= HEADER_ROW:
+                self.logger.warning(f"Estrutura de planilha inválida: {sheet_name}")
+                return None
+
+            header = [self.column_label(cell, i) for i, cell in enumerate(grid[HEADER_ROW])]
+            if not self.validate_sheet_structure(header):
                 self.logger.warning(f"Estrutura de planilha inválida: {sheet_name}")
                 return None
-                
+
+            columns = {}
+            for position, label in enumerate(header):
+                if label in REQUIRED_COLUMNS or YEAR_COLUMN.match(label):
+                    columns.setdefault(label, position)
+
+            rows = grid[HEADER_ROW + 1:]
+            df = pd.DataFrame({
+                label: [row[position] if position < len(row) else None for row in rows]
+                for label, position in columns.items()
+            })
+
+            # Linhas de rodapé (fonte, notas) não têm código IBGE numérico
+            df['Cod. IBGE'] = pd.to_numeric(df['Cod. IBGE'], errors='coerce')
             df = df.dropna(subset=['Cod. IBGE'])
-            df['Cod. IBGE'] = df['Cod. IBGE'].astype(int)
-            
-            year_cols = self.extract_year_columns(df)
-            for col in year_cols:
-                df[col] = df[col].apply(self.clean_numeric_value)
-                
-            return df
-            
+            df['Cod. IBGE'] = df['Cod. IBGE'].astype('int64').astype('string')
+            df = df.astype({col: 'string' for col in REQUIRED_COLUMNS if col != 'Cod. IBGE'})
+
+            for col in self.extract_year_columns(df):
+                df[col] = self.clean_numeric_series(df[col])
+
+            return df.reset_index(drop=True)
+
         except Exception as e:
             self.logger.error(f"Erro ao processar planilha {sheet_name}: {str(e)}")
             return None
 
+    def extract_year_columns(self, df: pd.DataFrame) -> List[str]:
+        """Extrai colunas que representam anos"""
+        return [col for col in df.columns if YEAR_COLUMN.match(str(col))]
+
     def is_valid_indicator_sheet(self, sheet_name: str) -> bool:
         """Verifica se o nome da planilha corresponde ao padrão de indicador válido"""
         return bool(re.match(r'^indicador_\d+$', sheet_name.lower().replace(" ", "_")))
 
     @transaction.atomic
-    def import_to_database(self):
+    def import_to_database(self, sheets: List[IndicatorSheet]):
         """Importa dados processados para o banco de dados"""
         try:
-            self.import_regions_and_cities()
-            
-            self.import_indicators()
-            
-            self.import_indicator_values()
-            
+            with self.report.stage('regions'):
+                self.import_regions_and_cities(sheets)
+
+            with self.report.stage('indicators') as stage:
+                self.import_indicators(sheets)
+                stage.add(rows_in=len(sheets), rows_out=len(sheets))
+
+            with self.report.stage('values') as stage:
+                totais = self.import_indicator_values(sheets)
+                stage.add(
+                    rows_in=sum(len(sheet.dados) for sheet in sheets if sheet.dados is not None),
+                    rows_out=sum(totais.values()),
+                )
+
         except Exception as e:
             self.logger.error(f"Importação para o banco de dados falhou: {str(e)}")
             raise
@@ -146,59 +361,141 @@ class HealthDataETL:
         df.to_csv(output_path, index=False, encoding='utf-8')
         
 
-    def import_regions_and_cities(self):
+    def save_indicator_store(self, sheets: List[IndicatorSheet], replace: bool) -> int:
+        """Grava o cache Parquet em formato longo com os dados das planilhas
+
+        Em cargas incrementais, apenas as linhas dos indicadores processados são substituídas.
+        Retorna o número de linhas do cache.
+        """
+        path = self.data_dir / INDICADORES_PARQUET
+        partes = [self.long_indicator_frame(sheet) for sheet in sheets if sheet.dados is not None]
+        metadados = {}
+        if not replace and path.exists():
+            atual = pd.read_parquet(path)
+            alterados = [sheet.nome_arquivo for sheet in sheets]
+            partes.insert(0, atual[~atual['nome_arquivo'].isin(alterados)])
+            metadados.update(atual.attrs.get('indicadores', {}))
+        for sheet in sheets:
+            metadados[sheet.nome_arquivo] = {
+                'titulo': sheet.titulo, 'subtitulo': sheet.subtitulo, 'fonte': sheet.fonte,
+            }
+
+        colunas = list(STORE_DTYPES)
+        store = pd.concat(partes + [pd.DataFrame(columns=colunas)], ignore_index=True)
+        store = store[colunas].astype(STORE_DTYPES)
+        store.attrs['indicadores'] = metadados
+        # Grava em arquivo temporário para que leitores nunca vejam um arquivo incompleto
+        tmp_path = path.with_suffix('.parquet.tmp')
+        store.to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+        self.logger.info(f"Cache de indicadores gravado em {path}: {len(store)} linhas")
+        return len(store)
+
+    def long_indicator_frame(self, sheet: IndicatorSheet) -> pd.DataFrame:
+        """Planilha em formato longo, uma linha por município e ano"""
+        longo = sheet.dados.melt(
+            id_vars=REQUIRED_COLUMNS,
+            value_vars=self.extract_year_columns(sheet.dados),
+            var_name='ano',
+            value_name='valor',
+        ).rename(columns=STORE_COLUMNS)
+        return longo.assign(nome_arquivo=sheet.nome_arquivo)
+
+    def import_regions_and_cities(self, sheets: List[IndicatorSheet]):
         """Importa dados de cidades e regiões de saúde"""
         try:
-            df_indicador = pd.read_csv(self.indicadores_dir / 'indicador_3.csv')
-            
-            cidade_regiao_map = {}
-            for _, row in df_indicador.iterrows():
-                macro_nome = row['Macrorregião de Saúde']
-                regiao_nome = row['Região de Saúde']
-                codigo_ibge = str(row['Cod. IBGE'])
-                
-                macro_regiao, _ = MacroRegiao.objects.get_or_create(nome=macro_nome)
-                regiao_saude, _ = RegiaoSaude.objects.get_or_create(
-                    nome=regiao_nome,
-                    macro_regiao=macro_regiao
-                )
-                
-                cidade_regiao_map[codigo_ibge] = regiao_saude
-            
-            df_cidades = pd.read_csv(self.data_dir / 'municipios.csv')
-            for _, row in df_cidades.iterrows():
-                codigo_ibge = row['codigo_ibge']
-                codigo_ibge_sem_digito = str(codigo_ibge)[:-1]
-                
-                regiao_saude = cidade_regiao_map.get(codigo_ibge_sem_digito)
-                if regiao_saude:
-                    Cidade.objects.get_or_create(
-                        codigo_ibge=str(codigo_ibge),
-                        defaults={
-                            'nome': row['nome'],
-                            'latitude': row['latitude'],
-                            'longitude': row['longitude'],
-                            'regiao_saude': regiao_saude
-                        }
+            df_indicador = next(
+                (
+                    sheet.dados for sheet in sheets
+                    if sheet.nome_arquivo == REGIOES_INDICADOR and sheet.dados is not None
+                ),
+                None,
+            )
+            if df_indicador is None:
+                self.logger.info("Planilha de regiões sem alterações, cidades mantidas")
+                return
+
+            regioes = (
+                df_indicador[['Macrorregião de Saúde', 'Região de Saúde', 'Cod. IBGE']]
+                .dropna()
+                .drop_duplicates(subset=['Cod. IBGE'], keep='last')
+                .rename(columns={'Macrorregião de Saúde': 'macro', 'Região de Saúde': 'regiao'})
+                .astype(str)
+            )
+
+            macro_nomes = regioes['macro'].unique().tolist()
+            MacroRegiao.objects.bulk_create(
+                [MacroRegiao(nome=nome) for nome in macro_nomes], ignore_conflicts=True
+            )
+            macro_ids = dict(
+                MacroRegiao.objects.filter(nome__in=macro_nomes).values_list('nome', 'id')
+            )
+            regioes['macro_regiao_id'] = regioes['macro'].map(macro_ids)
+
+            pares = regioes[['regiao', 'macro_regiao_id']].drop_duplicates()
+            RegiaoSaude.objects.bulk_create(
+                [
+                    RegiaoSaude(nome=nome, macro_regiao_id=macro_regiao_id)
+                    for nome, macro_regiao_id in pares.itertuples(index=False)
+                ],
+                ignore_conflicts=True,
+            )
+            regiao_ids = {
+                (nome, macro_regiao_id): regiao_id
+                for regiao_id, nome, macro_regiao_id in RegiaoSaude.objects.filter(
+                    macro_regiao_id__in=macro_ids.values()
+                ).values_list('id', 'nome', 'macro_regiao_id')
+            }
+            regioes['regiao_saude_id'] = [
+                regiao_ids[par] for par in zip(regioes['regiao'], regioes['macro_regiao_id'])
+            ]
+
+            # Apenas os municípios das UFs presentes na planilha
+            df_cidades = pd.read_csv(
+                self.data_dir / MUNICIPIOS_CSV,
+                usecols=['codigo_ibge', 'nome', 'latitude', 'longitude', 'codigo_uf'],
+                dtype={
+                    'codigo_ibge': str, 'nome': str, 'latitude': float, 'longitude': float, 'codigo_uf': str,
+                },
+            )
+            df_cidades = df_cidades[df_cidades['codigo_uf'].isin(regioes['Cod. IBGE'].str[:2].unique())]
+            df_cidades = df_cidades.assign(codigo_sem_digito=df_cidades['codigo_ibge'].str[:-1]).merge(
+                regioes[['Cod. IBGE', 'regiao_saude_id']],
+                left_on='codigo_sem_digito',
+                right_on='Cod. IBGE',
+            )
+
+            Cidade.objects.bulk_create(
+                [
+                    Cidade(
+                        codigo_ibge=row.codigo_ibge,
+                        nome=row.nome,
+                        latitude=row.latitude,
+                        longitude=row.longitude,
+                        regiao_saude_id=row.regiao_saude_id,
                     )
-            
+                    for row in df_cidades.itertuples(index=False)
+                ],
+                update_conflicts=True,
+                unique_fields=['codigo_ibge'],
+                update_fields=['nome', 'latitude', 'longitude', 'regiao_saude'],
+            )
+
             self.logger.info("Cidades e regiões importadas com sucesso")
         except Exception as e:
             self.logger.error(f"Erro ao importar cidades e regiões: {str(e)}")
             raise
 
-    def import_indicators(self):
+    def import_indicators(self, sheets: List[IndicatorSheet]):
         """Importa metadados dos indicadores"""
         try:
-            df = pd.read_csv(self.data_dir / 'titulo_subtitulo.csv')
-            
-            for _, row in df.iterrows():
-                Indicador.objects.get_or_create(
-                    nome_arquivo=row['nome_arquivo'],
+            for sheet in sheets:
+                Indicador.objects.update_or_create(
+                    nome_arquivo=sheet.nome_arquivo,
                     defaults={
-                        'titulo': row['titulo'],
-                        'subtitulo': row['subtitulo'],
-                        'fonte': row['fonte']
+                        'titulo': sheet.titulo,
+                        'subtitulo': sheet.subtitulo,
+                        'fonte': sheet.fonte or ''
                     }
                 )
             
@@ -207,47 +504,135 @@ class HealthDataETL:
             self.logger.error(f"Erro ao importar metadados dos indicadores: {str(e)}")
             raise
 
-    def import_indicator_values(self):
-        """Importa valores dos indicadores"""
+    @transaction.atomic
+    def import_indicator_values(self, sheets: List[IndicatorSheet]) -> Dict[str, int]:
+        """Aplica nos valores dos indicadores apenas as diferenças em relação ao banco
+
+        Cada planilha gera um CargaIndicador com as contagens de inserções, atualizações
+        e remoções aplicadas; retorna os totais da carga.
+        """
         try:
-            indicator_files = list(self.indicadores_dir.glob('indicador_*.csv'))
-            
-            for file_path in indicator_files:
-                indicador_nome = file_path.stem
-                df = pd.read_csv(file_path)
-                
-                try:
-                    indicador = Indicador.objects.get(nome_arquivo=indicador_nome)
-                except Indicador.DoesNotExist:
-                    self.logger.warning(f"Indicador não encontrado: {indicador_nome}")
+            # O código IBGE das planilhas não tem o dígito verificador
+            cidades = {
+                codigo_ibge[:-1]: cidade_id
+                for cidade_id, codigo_ibge in Cidade.objects.values_list('id', 'codigo_ibge')
+            }
+            indicadores = dict(Indicador.objects.values_list('nome_arquivo', 'id'))
+            totais = {'inseridos': 0, 'atualizados': 0, 'removidos': 0}
+
+            for sheet in sheets:
+                if sheet.dados is None:
                     continue
-                
-                for _, row in df.iterrows():
-                    codigo_ibge = str(row['Cod. IBGE'])
-                    try:
-                        cidade = Cidade.objects.get(codigo_ibge__startswith=codigo_ibge)
-                        
-                        for ano in range(2010, 2021):
-                            ano_str = str(ano)
-                            if ano_str in df.columns:
-                                valor = self.clean_numeric_value(row[ano_str])
-                                if valor is not None:
-                                    ValorIndicador.objects.get_or_create(
-                                        cidade=cidade,
-                                        indicador=indicador,
-                                        ano=ano,
-                                        defaults={'valor': valor}
-                                    )
-                                    
-                    except Cidade.DoesNotExist:
-                        self.logger.warning(f"Cidade não encontrada para o código IBGE: {codigo_ibge}")
-                        continue
-            
-            self.logger.info("Valores dos indicadores importados com sucesso")
+                indicador_id = indicadores.get(sheet.nome_arquivo)
+                if indicador_id is None:
+                    self.logger.warning(f"Indicador não encontrado: {sheet.nome_arquivo}")
+                    continue
+
+                valores = self.melt_indicator_values(sheet.dados, cidades)
+                existentes = pd.DataFrame(
+                    ValorIndicador.objects.filter(indicador_id=indicador_id)
+                    .values_list('id', 'cidade_id', 'ano', 'valor'),
+                    columns=['id', 'cidade_id', 'ano', 'valor'],
+                ).astype({'id': int, 'cidade_id': int, 'ano': int, 'valor': float})
+                inserir, atualizar, remover = self.diff_indicator_values(existentes, valores)
+
+                ValorIndicador.objects.bulk_create(
+                    (
+                        ValorIndicador(
+                            cidade_id=cidade_id,
+                            indicador_id=indicador_id,
+                            ano=ano,
+                            valor=valor,
+                        )
+                        for cidade_id, ano, valor in inserir.itertuples(index=False)
+                    ),
+                    batch_size=VALORES_BATCH_SIZE,
+                )
+                ValorIndicador.objects.bulk_update(
+                    [
+                        ValorIndicador(id=valor_id, valor=valor)
+                        for valor_id, valor in atualizar.itertuples(index=False)
+                    ],
+                    ['valor'],
+                    batch_size=VALORES_BATCH_SIZE,
+                )
+                for inicio in range(0, len(remover), VALORES_BATCH_SIZE):
+                    ValorIndicador.objects.filter(
+                        id__in=remover[inicio:inicio + VALORES_BATCH_SIZE]
+                    ).delete()
+
+                carga = CargaIndicador.objects.create(
+                    indicador_id=indicador_id,
+                    hash_conteudo=sheet.hash_conteudo,
+                    inseridos=len(inserir),
+                    atualizados=len(atualizar),
+                    removidos=len(remover),
+                )
+                for campo in totais:
+                    totais[campo] += getattr(carga, campo)
+
+            self.logger.info(
+                "Valores dos indicadores importados com sucesso: "
+                f"{totais['inseridos']} inseridos, {totais['atualizados']} atualizados, "
+                f"{totais['removidos']} removidos"
+            )
+            return totais
         except Exception as e:
             self.logger.error(f"Erro ao importar valores dos indicadores: {str(e)}")
             raise
 
+    def diff_indicator_values(self, existentes: pd.DataFrame, valores: pd.DataFrame):
+        """Compara os valores gravados com os da planilha pela chave (cidade_id, ano)
+
+        Retorna as linhas a inserir (cidade_id, ano, valor), a atualizar (id, valor) e os
+        ids a remover.
+        """
+        comparacao = existentes.merge(
+            valores, on=['cidade_id', 'ano'], how='outer', suffixes=('_atual', ''), indicator=True
+        )
+        inserir = comparacao.loc[comparacao['_merge'] == 'right_only', ['cidade_id', 'ano', 'valor']]
+        ambos = comparacao[comparacao['_merge'] == 'both']
+        mudou = ~np.isclose(ambos['valor_atual'], ambos['valor'], rtol=0, atol=1e-12, equal_nan=True)
+        atualizar = ambos.loc[mudou, ['id', 'valor']]
+        remover = comparacao.loc[comparacao['_merge'] == 'left_only', 'id']
+        return (
+            inserir.astype({'cidade_id': int, 'ano': int}),
+            atualizar.astype({'id': int}),
+            remover.astype(int).tolist(),
+        )
+
+    def melt_indicator_values(self, df: pd.DataFrame, cidades: Dict[str, int]) -> pd.DataFrame:
+        """Converte a planilha larga (uma coluna por ano) em linhas (cidade_id, ano, valor)"""
+        anos = [str(ano) for ano in ANOS_INDICADOR if str(ano) in df.columns]
+        df = df.dropna(subset=['Cod. IBGE'])
+        valores = df.melt(
+            id_vars=['Cod. IBGE'], value_vars=anos, var_name='ano', value_name='valor'
+        )
+        valores = valores.dropna(subset=['valor'])
+
+        valores['cidade_id'] = valores['Cod. IBGE'].map(cidades)
+        for codigo_ibge in valores.loc[valores['cidade_id'].isna(), 'Cod. IBGE'].unique():
+            self.logger.warning(f"Cidade não encontrada para o código IBGE: {codigo_ibge}")
+        valores = valores.dropna(subset=['cidade_id'])
+
+        valores['cidade_id'] = valores['cidade_id'].astype(int)
+        valores['ano'] = valores['ano'].astype(int)
+        # Linhas repetidas do mesmo município: prevalece a primeira
+        valores = valores.drop_duplicates(subset=['cidade_id', 'ano'])
+        return valores[['cidade_id', 'ano', 'valor']]
+
+def _parse_sheets(
+    xlsx_path: str, sheet_names: List[str], manifest: Dict[str, str], schema: Optional[SheetSchema] = None
+):
+    """Ponto de entrada dos processos do pool; cada processo abre o arquivo uma única vez"""
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        etl = HealthDataETL(workers=1)
+        etl.schema = schema
+        return etl.parse_sheets(workbook, sheet_names, manifest)
+    finally:
+        workbook.close()
+
 def run_etl():
     """Executa o processo ETL"""
     etl = HealthDataETL()
@@ -1,36 +1,82 @@
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 import logging
 from django.db import transaction
 from django.db.utils import DataError
-from api.models import Estabelecimento, TipoUnidade
+from django.utils import timezone
+from api.models import CargaApi, Estabelecimento, TipoUnidade
+from etl.bulk_load import BULK_BATCH_SIZE, bulk_mode, bulk_upsert, deferred_indexes
+from etl.checkpoint import content_hash, publish_run, staged_records
+from etl.fetch_client import FetchClient
+from etl.field_mapping import FieldSpec, RecordError, RecordMapping
+from etl.instrumentation import RunReport
+from etl.page_cache import PageCache
+from etl.pipeline import batched
+from etl.sharding import import_shards, parse_ufs
 from tqdm import tqdm
-from typing import List, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Iterable, Iterator, List, Dict, Any, Sequence, Union
 from datetime import datetime
-import backoff
+
+SYNC_UPDATE_FIELDS = [
+    field.name for field in Estabelecimento._meta.concrete_fields if not field.primary_key
+]
+SOFT_DELETE_BATCH_SIZE = 500
+# A download with fewer establishments than this share of the active ones is taken as
+# empty or truncated, and its missing rows are not soft-deleted
+SOFT_DELETE_MIN_FRACTION = 0.5
+# API keys match the model fields; type, truncation and nullability come from the model
+ESTABELECIMENTO_MAPPING = RecordMapping(Estabelecimento, [
+    FieldSpec('codigo_cnes'),
+    FieldSpec('nome_fantasia'),
+    FieldSpec('endereco_estabelecimento'),
+    FieldSpec('numero_estabelecimento'),
+    FieldSpec('bairro_estabelecimento', max_length=100),
+    *(FieldSpec(name) for name in [
+        'codigo_cep_estabelecimento', 'latitude_estabelecimento_decimo_grau',
+        'longitude_estabelecimento_decimo_grau', 'numero_telefone_estabelecimento',
+        'descricao_turno_atendimento', 'estabelecimento_faz_atendimento_ambulatorial_sus',
+        'estabelecimento_possui_centro_cirurgico', 'estabelecimento_possui_servico_apoio',
+        'estabelecimento_possui_atendimento_ambulatorial', 'codigo_municipio',
+        'numero_cnpj_entidade', 'nome_razao_social', 'natureza_organizacao_entidade',
+        'tipo_gestao', 'descricao_nivel_hierarquia', 'descricao_esfera_administrativa',
+        'codigo_tipo_unidade', 'endereco_email_estabelecimento', 'numero_cnpj',
+        'codigo_identificador_turno_atendimento', 'codigo_estabelecimento_saude',
+        'codigo_uf', 'descricao_natureza_juridica_estabelecimento',
+        'codigo_motivo_desabilitacao_estabelecimento', 'estabelecimento_possui_centro_obstetrico',
+        'estabelecimento_possui_centro_neonatal', 'estabelecimento_possui_atendimento_hospitalar',
+        'codigo_atividade_ensino_unidade', 'codigo_natureza_organizacao_unidade',
+        'codigo_nivel_hierarquia_unidade', 'codigo_esfera_administrativa_unidade',
+    ]),
+])
 
 class EstabelecimentosETL:
-    def __init__(self, uf_code: int = 29, batch_size: int = 100):
+    def __init__(
+        self, uf_code: Union[int, str, Sequence] = 29, batch_size: int = 100, concurrency: int = 8,
+        queue_size: int = 16, page_size: int = None, cache: PageCache = None, shard_workers: int = 4,
+        bulk_load: bool = False
+    ):
         self.base_url = 'https://apidadosabertos.saude.gov.br/cnes/estabelecimentos'
         self.tipo_unidade_url = 'https://apidadosabertos.saude.gov.br/cnes/tipounidades'
-        self.uf_code = uf_code
+        # One shard per UF; uf_code is the UF of this instance or shard
+        self.uf_codes = parse_ufs(uf_code)
+        self.uf_code = self.uf_codes[0]
+        self.shard_workers = max(1, shard_workers)
         self.batch_size = batch_size
-        self.session = self._setup_session()
-        self.setup_logging()
-
-    def _setup_session(self) -> requests.Session:
-        """Configure session with retry logic"""
-        session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
+        self.concurrency = max(1, concurrency)
+        # None negotiates the largest page size the API accepts on the first download
+        self.page_size = page_size
+        self.queue_size = queue_size
+        # Fast, non-durable SQLite settings, deferred indexes and executemany upserts
+        self.bulk_load = bulk_load
+        self.report = RunReport('estabelecimentos')
+        # One pooled connection per concurrent page request, across the shards downloading at once
+        self.client = FetchClient(
+            report=self.report,
+            pool_size=self.concurrency * min(self.shard_workers, len(self.uf_codes)),
+            cache=cache,
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        return session
+        self.setup_logging()
 
     def setup_logging(self) -> None:
         """Configure logging with rotation and structured format"""
@@ -49,43 +95,82 @@ class EstabelecimentosETL:
         )
         self.logger = logging.getLogger(__name__)
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=3)
     def fetch_data(self, url: str, params: Dict = None) -> Dict:
-        """Fetch data with exponential backoff retry"""
+        """Fetch data through the shared client, which rate-limits and retries"""
         self.logger.info(f"Fetching data from {url} with params {params}")
         try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.client.get_json(url, params)
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching data: {str(e)}")
             raise
 
+    def negotiate_page_size(self) -> int:
+        """Largest page size the API accepts, negotiated once per host by the client unless set explicitly"""
+        if self.page_size is None:
+            self.page_size = self.client.negotiate_page_size(
+                self.base_url, {'codigo_uf': self.uf_code}, 'estabelecimentos'
+            )
+            self.logger.info(f"Using page size {self.page_size}")
+        return self.page_size
+
+    def fetch_page(self, offset: int) -> List[Dict[str, Any]]:
+        """Fetch a single page of establishments; retries apply to this page only"""
+        params = {
+            'codigo_uf': self.uf_code,
+            'limit': self.page_size,
+            'offset': offset
+        }
+        return self.fetch_data(self.base_url, params)['estabelecimentos']
+
+    def iter_pages(self, start_offset: int = 0) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield establishment pages in offset order from `start_offset`, keeping
+        up to `concurrency` requests in flight. The first short page marks the
+        end of the data; pages past it, including failed ones (e.g. uncached
+        pages when offline), are discarded.
+        """
+        self.negotiate_page_size()
+        fetched = {}
+        end = None
+        next_offset = expected = start_offset
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            pending = {}
+            while pending or end is None:
+                while end is None and len(pending) < self.concurrency:
+                    pending[pool.submit(self.fetch_page, next_offset)] = next_offset
+                    next_offset += self.page_size
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offset = pending.pop(future)
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        # A failed page also stops new requests, but it is only raised
+                        # if no earlier short page shows it lies past the end
+                        page = e
+                    fetched[offset] = page
+                    if (isinstance(page, Exception) or len(page) < self.page_size) and (end is None or offset < end):
+                        end = offset
+
+                # Pages are released only once every earlier offset has arrived
+                while expected in fetched and (end is None or expected <= end):
+                    page = fetched.pop(expected)
+                    if isinstance(page, Exception):
+                        raise page
+                    yield page
+                    expected += self.page_size
+
     def fetch_all_estabelecimentos(self) -> List[Dict[str, Any]]:
-        """Fetch all establishments with pagination"""
+        """Fetch all establishments into a single list, in offset order"""
         estabelecimentos = []
-        offset = 0
-        limit = 20
         
         try:
             with tqdm(desc="Fetching estabelecimentos") as pbar:
-                while True:
-                    params = {
-                        'codigo_uf': self.uf_code,
-                        'limit': limit,
-                        'offset': offset
-                    }
-                    data = self.fetch_data(self.base_url, params)
-                    current_batch = data['estabelecimentos']
-                    estabelecimentos.extend(current_batch)
-                    
-                    pbar.update(len(current_batch))
-                    
-                    if len(current_batch) < limit:
-                        break
-                        
-                    offset += limit
-                    
+                for page in self.iter_pages():
+                    estabelecimentos.extend(page)
+                    pbar.update(len(page))
+
             self.logger.info(f"Successfully fetched {len(estabelecimentos)} estabelecimentos")
             return estabelecimentos
             
@@ -102,112 +187,189 @@ class EstabelecimentosETL:
             self.logger.error(f"Error fetching tipos_unidade: {str(e)}")
             raise
 
-    def _create_estabelecimento_object(self, est: Dict) -> Estabelecimento:
-        """Create Estabelecimento object with data validation"""
+    def import_estabelecimentos(self, resume: bool = False) -> None:
+        """
+        Download establishments of each UF, writing each page to the table in
+        the transaction that stages it in the checkpoint, then close each UF
+        once its download ends. With `resume`, the last unpublished run of
+        each UF continues from its last durable page instead of starting over.
+        With `bulk_load`, the whole import runs in SQLite bulk mode.
+        """
         try:
-            return Estabelecimento(
-                codigo_cnes=est['codigo_cnes'],
-                nome_fantasia=est['nome_fantasia'][:255] if est['nome_fantasia'] else None,
-                endereco_estabelecimento=est['endereco_estabelecimento'][:255] if est['endereco_estabelecimento'] else None,
-                numero_estabelecimento=est['numero_estabelecimento'],
-                bairro_estabelecimento=est['bairro_estabelecimento'][:100] if est['bairro_estabelecimento'] else None,
-                codigo_cep_estabelecimento=est['codigo_cep_estabelecimento'],
-                latitude_estabelecimento_decimo_grau=est['latitude_estabelecimento_decimo_grau'],
-                longitude_estabelecimento_decimo_grau=est['longitude_estabelecimento_decimo_grau'],
-                numero_telefone_estabelecimento=est['numero_telefone_estabelecimento'],
-                descricao_turno_atendimento=est['descricao_turno_atendimento'],
-                estabelecimento_faz_atendimento_ambulatorial_sus=est['estabelecimento_faz_atendimento_ambulatorial_sus'],
-                estabelecimento_possui_centro_cirurgico=est['estabelecimento_possui_centro_cirurgico'],
-                estabelecimento_possui_servico_apoio=est['estabelecimento_possui_servico_apoio'],
-                estabelecimento_possui_atendimento_ambulatorial=est['estabelecimento_possui_atendimento_ambulatorial'],
-                codigo_municipio=est['codigo_municipio'],
-                **{k: est.get(k) for k in [
-                    'numero_cnpj_entidade', 'nome_razao_social', 'natureza_organizacao_entidade',
-                    'tipo_gestao', 'descricao_nivel_hierarquia', 'descricao_esfera_administrativa',
-                    'codigo_tipo_unidade', 'endereco_email_estabelecimento', 'numero_cnpj',
-                    'codigo_identificador_turno_atendimento', 'codigo_estabelecimento_saude',
-                    'codigo_uf', 'descricao_natureza_juridica_estabelecimento',
-                    'codigo_motivo_desabilitacao_estabelecimento', 'estabelecimento_possui_centro_obstetrico',
-                    'estabelecimento_possui_centro_neonatal', 'estabelecimento_possui_atendimento_hospitalar',
-                    'codigo_atividade_ensino_unidade', 'codigo_natureza_organizacao_unidade',
-                    'codigo_nivel_hierarquia_unidade', 'codigo_esfera_administrativa_unidade'
-                ]}
-            )
+            with bulk_mode(self.bulk_load, report=self.report):
+                import_shards(
+                    self, 'estabelecimentos', resume, deferred_model=Estabelecimento if self.bulk_load else None
+                )
         except Exception as e:
-            self.logger.error(f"Error creating estabelecimento object: {str(e)}")
+            self.logger.error(f"Error in import_estabelecimentos: {str(e)}")
             raise
 
+    def start_publish(self) -> None:
+        """
+        Reset the sync state of this UF before its first page is published:
+        the stored hash of each establishment, the active ones, the codes
+        seen in the download, the counters and the rejected records.
+        """
+        self.hashes = {}
+        # Active rows loaded before hash_registro existed have no hash but are still active
+        self.ativos = set()
+        for codigo_cnes, hash_registro, removido_em in Estabelecimento.objects.filter(
+            codigo_uf=self.uf_code
+        ).values_list('codigo_cnes', 'hash_registro', 'removido_em'):
+            # Removed rows map to None so that a reappearing record always counts as changed
+            self.hashes[codigo_cnes] = hash_registro if removido_em is None else None
+            if removido_em is None:
+                self.ativos.add(codigo_cnes)
+        self.vistos = set()
+        self.inseridos = self.atualizados = 0
+        self.batches = 0
+        self.failed_records = []
+
+    def publish_page(self, registros: Iterable[Dict[str, Any]]) -> None:
+        """
+        Sync a page of downloaded establishments with the table, in batches.
+        Each record is hashed and only new or changed rows are upserted;
+        reappearing rows are restored. Records rejected by the mapping are
+        logged and saved with their errors, without failing the rest of their
+        batch, and each batch is written in its own savepoint, so a failed one
+        does not undo the page. With `bulk_load`, batches are larger and rows
+        are upserted with executemany.
+        """
+        batch_size = max(self.batch_size, BULK_BATCH_SIZE) if self.bulk_load else self.batch_size
+        for batch in batched(registros, batch_size):
+            self.batches += 1
+            number = self.batches
+            rejected = 0
+            try:
+                with self.report.stage('transform') as stage:
+                    changed = {}
+                    for est in batch:
+                        hash_registro = content_hash(est)
+                        self.vistos.add(est['codigo_cnes'])
+                        if self.hashes.get(est['codigo_cnes']) != hash_registro:
+                            try:
+                                obj = ESTABELECIMENTO_MAPPING(est, hash_registro=hash_registro)
+                            except RecordError as e:
+                                self.failed_records.append((est, str(e)))
+                                rejected += 1
+                                continue
+                            changed[obj.codigo_cnes] = obj
+                    stage.add(rows_in=len(batch), rows_out=len(changed))
+                if rejected:
+                    self.logger.warning(f"Rejected {rejected} invalid records in batch {number}")
+                with self.report.stage('load') as stage, transaction.atomic():
+                    if self.bulk_load:
+                        bulk_upsert(Estabelecimento, list(changed.values()), ['codigo_cnes'], SYNC_UPDATE_FIELDS)
+                    else:
+                        Estabelecimento.objects.bulk_create(
+                            changed.values(),
+                            update_conflicts=True,
+                            unique_fields=['codigo_cnes'],
+                            update_fields=SYNC_UPDATE_FIELDS,
+                            batch_size=self.batch_size
+                        )
+                    stage.add(rows_in=len(changed), rows_out=len(changed))
+                for codigo_cnes, obj in changed.items():
+                    if codigo_cnes in self.hashes:
+                        self.atualizados += 1
+                    else:
+                        self.inseridos += 1
+                    self.hashes[codigo_cnes] = obj.hash_registro
+            except DataError as e:
+                self.logger.error(f"Data error in batch {number}: {str(e)}")
+                self.failed_records.extend((record, str(e)) for record in batch)
+            except Exception as e:
+                self.logger.error(f"Error processing batch {number}: {str(e)}")
+                self.failed_records.extend((record, str(e)) for record in batch)
+
+    def finish_publish(self, carga: CargaApi) -> None:
+        """
+        Soft-delete the rows of this UF missing from the download and mark the
+        run published; call inside the transaction that closes the UF, once
+        every page went through publish_page. An empty download, or one with
+        fewer than SOFT_DELETE_MIN_FRACTION of the active establishments,
+        soft-deletes nothing.
+        """
+        with self.report.stage('soft_delete') as stage:
+            removidos = [codigo_cnes for codigo_cnes in self.ativos if codigo_cnes not in self.vistos]
+            if removidos and len(self.vistos) < SOFT_DELETE_MIN_FRACTION * len(self.ativos):
+                self.logger.warning(
+                    f"Soft delete skipped: the download has {len(self.vistos)} establishments, "
+                    f"fewer than {SOFT_DELETE_MIN_FRACTION:.0%} of the {len(self.ativos)} active ones"
+                )
+                removidos = []
+            removido_em = timezone.now()
+            for i in range(0, len(removidos), SOFT_DELETE_BATCH_SIZE):
+                Estabelecimento.objects.filter(
+                    codigo_cnes__in=removidos[i:i + SOFT_DELETE_BATCH_SIZE]
+                ).update(removido_em=removido_em)
+            stage.add(rows_out=len(removidos))
+        self.logger.info(
+            f"Estabelecimentos synced: {self.inseridos} inserted, {self.atualizados} updated, "
+            f"{len(self.vistos) - self.inseridos - self.atualizados} unchanged, {len(removidos)} removed"
+        )
+
+        publish_run(carga)
+        if self.failed_records:
+            self.logger.warning(f"Failed to import {len(self.failed_records)} records")
+            # Save failed records for later analysis
+            with open(f'failed_records_{datetime.now().strftime("%Y%m%d")}.log', 'w') as f:
+                for record, error in self.failed_records:
+                    f.write(f"{error}\t{record}\n")
+
     @transaction.atomic
-    def import_estabelecimentos(self) -> None:
-        """Import establishments with error handling and progress tracking"""
-        try:
-            estabelecimentos = self.fetch_all_estabelecimentos()
-            failed_records = []
-            
-            for i in tqdm(range(0, len(estabelecimentos), self.batch_size), desc="Importando estabelecimentos"):
-                batch = estabelecimentos[i:i + self.batch_size]
-                try:
-                    objects_to_create = [
-                        self._create_estabelecimento_object(est) for est in batch
-                    ]
-                    Estabelecimento.objects.bulk_create(
-                        objects_to_create,
-                        ignore_conflicts=True,
-                        batch_size=self.batch_size
-                    )
-                except DataError as e:
-                    self.logger.error(f"Data error in batch {i // self.batch_size + 1}: {str(e)}")
-                    failed_records.extend(batch)
-                except Exception as e:
-                    self.logger.error(f"Error processing batch {i // self.batch_size + 1}: {str(e)}")
-                    failed_records.extend(batch)
-                # else:
-                #     self.logger.info(f"Successfully imported batch {i // self.batch_size + 1}")
-            
-            if failed_records:
-                self.logger.warning(f"Failed to import {len(failed_records)} records")
-                # Save failed records for later analysis
-                with open(f'failed_records_{datetime.now().strftime("%Y%m%d")}.log', 'w') as f:
-                    for record in failed_records:
-                        f.write(f"{record}\n")
-                        
-        except Exception as e:
-            self.logger.error(f"Error in import_estabelecimentos: {str(e)}")
-            raise
+    def publish(self, carga: CargaApi) -> None:
+        """
+        Publish a fully staged run in one transaction, as import_shards does
+        page by page during the download. With `bulk_load` and an empty table,
+        secondary indexes are rebuilt once after the last page.
+        """
+        self.start_publish()
+        indexes = deferred_indexes(Estabelecimento, report=self.report) if self.bulk_load else nullcontext()
+        with indexes:
+            self.publish_page(tqdm(staged_records(carga), desc="Importando estabelecimentos"))
+        self.finish_publish(carga)
 
     @transaction.atomic
     def import_tipos_unidade(self) -> None:
         """Import unit types with error handling"""
         try:
-            tipos_unidade = self.fetch_tipos_unidade()
-            for tipo in tqdm(tipos_unidade, desc="Importando tipos de unidade"):
-                try:
-                    TipoUnidade.objects.update_or_create(
-                        codigo_tipo_unidade=tipo['codigo_tipo_unidade'],
-                        defaults={'descricao_tipo_unidade': tipo['descricao_tipo_unidade']}
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error importing tipo unidade {tipo.get('codigo_tipo_unidade')}: {str(e)}")
+            with self.report.stage('tipos_unidade_fetch') as stage:
+                tipos_unidade = self.fetch_tipos_unidade()
+                stage.add(rows_out=len(tipos_unidade))
+            with self.report.stage('tipos_unidade_load') as stage:
+                for tipo in tqdm(tipos_unidade, desc="Importando tipos de unidade"):
+                    try:
+                        TipoUnidade.objects.update_or_create(
+                            codigo_tipo_unidade=tipo['codigo_tipo_unidade'],
+                            defaults={'descricao_tipo_unidade': tipo['descricao_tipo_unidade']}
+                        )
+                        stage.add(rows_out=1)
+                    except Exception as e:
+                        self.logger.error(f"Error importing tipo unidade {tipo.get('codigo_tipo_unidade')}: {str(e)}")
+                stage.add(rows_in=len(tipos_unidade))
             
             self.logger.info("Tipos de unidade importados com sucesso")
         except Exception as e:
             self.logger.error(f"Error in import_tipos_unidade: {str(e)}")
             raise
 
-    def run(self) -> None:
+    def run(self, resume: bool = False) -> None:
         """Run the ETL process with timing information"""
         start_time = datetime.now()
         self.logger.info(f"Starting ETL process at {start_time}")
         
         try:
             self.import_tipos_unidade()
-            self.import_estabelecimentos()
+            self.import_estabelecimentos(resume=resume)
             
             end_time = datetime.now()
             duration = end_time - start_time
             self.logger.info(f"ETL process completed successfully at {end_time}. Duration: {duration}")
+            self.report.finish()
         except Exception as e:
             self.logger.error(f"ETL process failed: {str(e)}")
+            self.report.finish(error=e)
             raise
 
 if __name__ == "__main__":
@@ -1,38 +1,90 @@
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 import logging
 from django.db import transaction
 from django.db.utils import DataError
-from api.models import Estoque
+from api.models import CargaApi, EstabelecimentoEstoque, Estoque, Produto, ProgramaSaude
+from api.rollups import refresh_rollups, touched_keys
+from api.snapshots import compact_snapshots, refresh_snapshots, snapshot_keys
+from api.spatial import refresh_spatial_index
+from etl.bulk_load import BULK_BATCH_SIZE, bulk_mode, bulk_upsert, deferred_indexes
+from etl.checkpoint import publish_run, staged_records
+from etl.fetch_client import FetchClient
+from etl.field_mapping import FieldSpec, RecordError, RecordMapping
+from etl.instrumentation import RunReport
+from etl.page_cache import PageCache
+from etl.pipeline import batched
+from etl.sharding import import_shards, parse_ufs
 from tqdm import tqdm
-from typing import List, Dict, Any
-from datetime import datetime
-import backoff
+from contextlib import nullcontext
+from typing import Iterable, Iterator, List, Dict, Any, Sequence, Tuple, Union
+from datetime import date, datetime
+
+SNAPSHOT_UNIQUE_FIELDS = [
+    'data_posicao_estoque', 'estabelecimento', 'produto', 'numero_lote', 'programa'
+]
+SNAPSHOT_UPDATE_FIELDS = [
+    field.name for field in Estoque._meta.concrete_fields
+    if not field.primary_key and field.name not in SNAPSHOT_UNIQUE_FIELDS + ['atual']
+]
+# Tipo, truncamento e obrigatoriedade não informados aqui vêm dos campos do modelo
+ESTABELECIMENTO_MAPPING = RecordMapping(EstabelecimentoEstoque, [
+    *(FieldSpec(name) for name in [
+        'codigo_cnes', 'codigo_uf', 'uf', 'codigo_municipio', 'municipio', 'razao_social',
+        'nome_fantasia', 'cep', 'logradouro', 'numero_endereco', 'telefone', 'latitude',
+        'longitude', 'email',
+    ]),
+    FieldSpec('bairro', default=''),
+])
+PRODUTO_MAPPING = RecordMapping(Produto, [
+    FieldSpec('codigo_catmat', default=''),
+    FieldSpec('descricao_produto'),
+    FieldSpec('tipo_produto'),
+])
+PROGRAMA_MAPPING = RecordMapping(ProgramaSaude, [
+    FieldSpec('sigla_programa_saude', default=''),
+    FieldSpec('descricao_programa_saude'),
+])
+# Os ids de produto e programa vêm dos mapas das dimensões na montagem do fato
+ESTOQUE_MAPPING = RecordMapping(Estoque, [
+    FieldSpec('estabelecimento', source='codigo_cnes', type='int'),
+    FieldSpec('quantidade_estoque'),
+    FieldSpec('data_posicao_estoque'),
+    FieldSpec('data_posicao_estoque_original', source='data_posicao_estoque'),
+    FieldSpec('data_validade'),
+    FieldSpec('data_validade_original', source='data_validade'),
+    # Campo da chave do snapshot não pode ser nulo para que o upsert detecte conflitos
+    FieldSpec('numero_lote', default=''),
+    FieldSpec('sigla_sistema_origem'),
+])
 
 class EstoqueETL:
-    def __init__(self, uf_code: int = 29, batch_size: int = 100):
+    def __init__(
+        self, uf_code: Union[int, str, Sequence] = 29, batch_size: int = 100, queue_size: int = 16,
+        page_size: int = None, cache: PageCache = None, shard_workers: int = 4, bulk_load: bool = False
+    ):
         self.base_url = 'https://apidadosabertos.saude.gov.br/daf/estoque-medicamentos-bnafar-horus'
-        self.uf_code = uf_code
+        # Uma carga por UF; uf_code é a UF desta instância ou cópia
+        self.uf_codes = parse_ufs(uf_code)
+        self.uf_code = self.uf_codes[0]
+        self.shard_workers = max(1, shard_workers)
         self.batch_size = batch_size
-        self.session = self._setup_session()
-        self.setup_logging()
-
-    def _setup_session(self) -> requests.Session:
-        """Configure session with retry logic"""
-        session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
+        self.queue_size = queue_size
+        # None negocia no primeiro download o maior tamanho de página aceito pela API
+        self.page_size = page_size
+        # Configurações rápidas e não duráveis do SQLite, índices adiados e upserts com executemany
+        self.bulk_load = bulk_load
+        self.load_date = date.today()
+        self.estabelecimentos_vistos = set()
+        self.produto_ids = {}
+        self.programa_ids = {}
+        self.report = RunReport('estoque')
+        self.client = FetchClient(
+            report=self.report, pool_size=min(self.shard_workers, len(self.uf_codes)), cache=cache
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        return session
+        self.setup_logging()
 
     def setup_logging(self) -> None:
-        """Configure logging with rotation and structured format"""
+        """Configura o log com rotação e formato estruturado"""
         log_filename = f'etl_estoque_{datetime.now().strftime("%Y%m%d")}.log'
         logging.basicConfig(
             level=logging.INFO,
@@ -48,43 +100,50 @@ class EstoqueETL:
         )
         self.logger = logging.getLogger(__name__)
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=3)
     def fetch_data(self, url: str, params: Dict = None) -> Dict:
-        """Fetch data with exponential backoff retry"""
+        """Busca os dados pelo cliente compartilhado, que limita a taxa e faz novas tentativas"""
         self.logger.info(f"Fetching data from {url} with params {params}")
         try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.client.get_json(url, params)
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error fetching data: {str(e)}")
             raise
 
+    def negotiate_page_size(self) -> int:
+        """Maior tamanho de página aceito pela API, negociado uma vez por host pelo cliente, salvo se informado"""
+        if self.page_size is None:
+            self.page_size = self.client.negotiate_page_size(
+                self.base_url, {'codigo_uf': self.uf_code}, 'estoque'
+            )
+            self.logger.info(f"Using page size {self.page_size}")
+        return self.page_size
+
+    def iter_pages(self, start_offset: int = 0) -> Iterator[List[Dict[str, Any]]]:
+        """Produz as páginas de estoque na ordem dos offsets, de `start_offset` até a primeira página curta"""
+        self.negotiate_page_size()
+        offset = start_offset
+        while True:
+            params = {
+                'codigo_uf': self.uf_code,
+                'limit': self.page_size,
+                'offset': offset
+            }
+            current_batch = self.fetch_data(self.base_url, params)['estoque']
+            yield current_batch
+            if len(current_batch) < self.page_size:
+                return
+            offset += self.page_size
+
     def fetch_all_estoque(self) -> List[Dict[str, Any]]:
-        """Fetch all establishments with pagination"""
+        """Busca todo o estoque, página a página"""
         estoque = []
-        offset = 0
-        limit = 20
         
         try:
             with tqdm(desc="Fetching estoque") as pbar:
-                while True:
-                    params = {
-                        'codigo_uf': self.uf_code,
-                        'limit': limit,
-                        'offset': offset
-                    }
-                    data = self.fetch_data(self.base_url, params)
-                    current_batch = data['estoque']
+                for current_batch in self.iter_pages():
                     estoque.extend(current_batch)
-                    
                     pbar.update(len(current_batch))
                     
-                    if len(current_batch) < limit:
-                        break
-                        
-                    offset += limit
-                    
             self.logger.info(f"Successfully fetched {len(estoque)} estoque")
             return estoque
             
@@ -92,94 +151,293 @@ class EstoqueETL:
             self.logger.error(f"Error in fetch_all_estoque: {str(e)}")
             raise
     
+    @staticmethod
+    def _codigo_catmat(est: Dict) -> str:
+        return est['codigo_catmat'][:255] if est.get('codigo_catmat') else ''
+
+    @staticmethod
+    def _sigla_programa(est: Dict) -> str:
+        return est['sigla_programa_saude'][:255] if est.get('sigla_programa_saude') else ''
+
+    def _upsert_dimensions(self, batch: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, RecordError]]]:
+        """
+        Grava (upsert) as dimensões de estabelecimento, produto e programa de um lote.
+        Cada chave é gravada uma vez por carga e depois resolvida pelos mapas em memória,
+        onde os ids novos ficam pendentes até a confirmação da transação. Devolve os
+        registros com dimensões válidas e os rejeitados, que não podem chegar aos fatos.
+        """
+        estabelecimentos, produtos, programas = {}, {}, {}
+        valid, rejected = [], []
+        for est in batch:
+            try:
+                cnes = est.get('codigo_cnes')
+                estabelecimento = (
+                    ESTABELECIMENTO_MAPPING(est)
+                    if cnes not in self.estabelecimentos_vistos and cnes not in self.estabelecimentos_pendentes
+                    and cnes not in estabelecimentos else None
+                )
+                catmat = self._codigo_catmat(est)
+                produto = (
+                    PRODUTO_MAPPING(est)
+                    if catmat not in self.produto_ids and catmat not in self.produtos_pendentes
+                    and catmat not in produtos else None
+                )
+                sigla = self._sigla_programa(est)
+                programa = (
+                    PROGRAMA_MAPPING(est)
+                    if sigla not in self.programa_ids and sigla not in self.programas_pendentes
+                    and sigla not in programas else None
+                )
+            except RecordError as e:
+                rejected.append((est, e))
+                continue
+            if estabelecimento is not None:
+                estabelecimentos[estabelecimento.codigo_cnes] = estabelecimento
+            if produto is not None:
+                produtos[catmat] = produto
+            if programa is not None:
+                programas[sigla] = programa
+            valid.append(est)
+
+        if estabelecimentos:
+            EstabelecimentoEstoque.objects.bulk_create(
+                estabelecimentos.values(),
+                update_conflicts=True,
+                unique_fields=['codigo_cnes'],
+                update_fields=[f.name for f in EstabelecimentoEstoque._meta.concrete_fields if not f.primary_key],
+            )
+            self.estabelecimentos_pendentes.update(estabelecimentos)
+
+        if produtos:
+            Produto.objects.bulk_create(
+                produtos.values(),
+                update_conflicts=True,
+                unique_fields=['codigo_catmat'],
+                update_fields=['descricao_produto', 'tipo_produto'],
+            )
+            self.produtos_pendentes.update(
+                Produto.objects.filter(codigo_catmat__in=list(produtos)).values_list('codigo_catmat', 'id')
+            )
+
+        if programas:
+            ProgramaSaude.objects.bulk_create(
+                programas.values(),
+                update_conflicts=True,
+                unique_fields=['sigla_programa_saude'],
+                update_fields=['descricao_programa_saude'],
+            )
+            self.programas_pendentes.update(
+                ProgramaSaude.objects.filter(sigla_programa_saude__in=list(programas)).values_list('sigla_programa_saude', 'id')
+            )
+        return valid, rejected
+
+    def _cache_dimensions(self) -> None:
+        """Move para os caches compartilhados entre as UFs os ids das dimensões já confirmadas"""
+        self.estabelecimentos_vistos.update(self.estabelecimentos_pendentes)
+        self.produto_ids.update(self.produtos_pendentes)
+        self.programa_ids.update(self.programas_pendentes)
+        self._discard_dimensions()
+
+    def _discard_dimensions(self) -> None:
+        self.estabelecimentos_pendentes = set()
+        self.produtos_pendentes = {}
+        self.programas_pendentes = {}
+
     def _create_estoque_object(self, est: Dict) -> Estoque:
-        """Create Estoque object with data validation"""
-        try:
-            return Estoque(
-                codigo_uf=est['codigo_uf'],
-                uf=est['uf'][:2] if est['uf'] else None,
-                endereco_estabelecimento=est['endereco_estabelecimento'][:255] if est['endereco_estabelecimento'] else None,
-                numero_estabelecimento=est['numero_estabelecimento'],
-                bairro_estabelecimento=est['bairro_estabelecimento'][:100] if est['bairro_estabelecimento'] else None,
-                codigo_cep_estabelecimento=est['codigo_cep_estabelecimento'],
-                latitude_estabelecimento_decimo_grau=est['latitude_estabelecimento_decimo_grau'],
-                longitude_estabelecimento_decimo_grau=est['longitude_estabelecimento_decimo_grau'],
-                numero_telefone_estabelecimento=est['numero_telefone_estabelecimento'],
-                descricao_turno_atendimento=est['descricao_turno_atendimento'],
-                estabelecimento_faz_atendimento_ambulatorial_sus=est['estabelecimento_faz_atendimento_ambulatorial_sus'],
-                estabelecimento_possui_centro_cirurgico=est['estabelecimento_possui_centro_cirurgico'],
-                estabelecimento_possui_servico_apoio=est['estabelecimento_possui_servico_apoio'],
-                estabelecimento_possui_atendimento_ambulatorial=est['estabelecimento_possui_atendimento_ambulatorial'],
-                codigo_municipio=est['codigo_municipio'],
-                **{k: est.get(k) for k in [
-                    'numero_cnpj_entidade', 'nome_razao_social', 'natureza_organizacao_entidade',
-                    'tipo_gestao', 'descricao_nivel_hierarquia', 'descricao_esfera_administrativa',
-                    'codigo_tipo_unidade', 'endereco_email_estabelecimento', 'numero_cnpj',
-                    'codigo_identificador_turno_atendimento', 'codigo_estabelecimento_saude',
-                    'codigo_uf', 'descricao_natureza_juridica_estabelecimento',
-                    'codigo_motivo_desabilitacao_estabelecimento', 'estabelecimento_possui_centro_obstetrico',
-                    'estabelecimento_possui_centro_neonatal', 'estabelecimento_possui_atendimento_hospitalar',
-                    'codigo_atividade_ensino_unidade', 'codigo_natureza_organizacao_unidade',
-                    'codigo_nivel_hierarquia_unidade', 'codigo_esfera_administrativa_unidade'
-                ]}
+        """Monta o fato de Estoque; as dimensões já devem estar gravadas"""
+        values = ESTOQUE_MAPPING.values(est)
+        # Sem data de posição válida, o registro entra no snapshot do dia da carga
+        if values['data_posicao_estoque'] is None:
+            values['data_posicao_estoque'] = self.load_date
+        catmat, sigla = self._codigo_catmat(est), self._sigla_programa(est)
+        return Estoque(
+            produto_id=self.produtos_pendentes.get(catmat) or self.produto_ids[catmat],
+            programa_id=self.programas_pendentes.get(sigla) or self.programa_ids[sigla],
+            **values
+        )
+
+    @staticmethod
+    def _snapshot_key(obj: Estoque) -> Tuple:
+        return obj.data_posicao_estoque, obj.estabelecimento_id, obj.produto_id, obj.numero_lote, obj.programa_id
+
+    def _split_current(self, objects: List[Estoque]) -> Tuple[List[Estoque], List[Estoque]]:
+        """
+        Separa os fatos que alteram linhas do snapshot atual dos demais. As linhas novas
+        entram com `atual` falso e só passam a valer em finish_publish; as já atuais
+        também só podem mudar ali, para que a API não veja o snapshot atual pela metade
+        """
+        if not objects:
+            return [], []
+        chaves_atuais = set(Estoque.objects.filter(
+            atual=True,
+            estabelecimento_id__in={obj.estabelecimento_id for obj in objects},
+            data_posicao_estoque__in={obj.data_posicao_estoque for obj in objects},
+        ).values_list('data_posicao_estoque', 'estabelecimento_id', 'produto_id', 'numero_lote', 'programa_id'))
+        atuais, novos = [], []
+        for obj in objects:
+            if self._snapshot_key(obj) in chaves_atuais:
+                atuais.append(obj)
+            else:
+                novos.append(obj)
+        return atuais, novos
+
+    def _load_estoque(self, objects: List[Estoque]) -> None:
+        if self.bulk_load:
+            bulk_upsert(Estoque, objects, SNAPSHOT_UNIQUE_FIELDS, SNAPSHOT_UPDATE_FIELDS)
+        else:
+            Estoque.objects.bulk_create(
+                objects,
+                update_conflicts=True,
+                unique_fields=SNAPSHOT_UNIQUE_FIELDS,
+                update_fields=SNAPSHOT_UPDATE_FIELDS,
+                batch_size=self.batch_size
             )
-        except Exception as e:
-            self.logger.error(f"Error creating estabelecimento object: {str(e)}")
-            raise
 
-    @transaction.atomic
-    def import_estoque(self) -> None:
-        """Import establishments with error handling and progress tracking"""
+    def import_estoque(self, resume: bool = False) -> None:
+        """
+        Baixa o estoque de cada UF, gravando cada página nas tabelas na mesma transação
+        que a grava no staging do checkpoint, e atualiza as tabelas derivadas de cada UF
+        ao fim do download dela. Com `resume`, a última carga não publicada de cada UF
+        continua da última página gravada, em vez de recomeçar. Com `bulk_load`, toda a
+        importação roda no modo de carga em massa do SQLite.
+        """
         try:
-            estoque = self.fetch_all_estoque()
-            failed_records = []
-            
-            for i in tqdm(range(0, len(estoque), self.batch_size), desc="Importando estoque"):
-                batch = estoque[i:i + self.batch_size]
-                try:
-                    objects_to_create = [
-                        self._create_estoque_object(est) for est in batch
-                    ]
-                    Estoque.objects.bulk_create(
-                        objects_to_create,
-                        ignore_conflicts=True,
-                        batch_size=self.batch_size
-                    )
-                except DataError as e:
-                    self.logger.error(f"Data error in batch {i // self.batch_size + 1}: {str(e)}")
-                    failed_records.extend(batch)
-                except Exception as e:
-                    self.logger.error(f"Error processing batch {i // self.batch_size + 1}: {str(e)}")
-                    failed_records.extend(batch)
-                # else:
-                #     self.logger.info(f"Successfully imported batch {i // self.batch_size + 1}")
-            
-            if failed_records:
-                self.logger.warning(f"Failed to import {len(failed_records)} records")
-                # Save failed records for later analysis
-                with open(f'failed_records_{datetime.now().strftime("%Y%m%d")}.log', 'w') as f:
-                    for record in failed_records:
-                        f.write(f"{record}\n")
-                        
+            with bulk_mode(self.bulk_load, report=self.report):
+                import_shards(self, 'estoque', resume, deferred_model=Estoque if self.bulk_load else None)
         except Exception as e:
             self.logger.error(f"Error in import_estoque: {str(e)}")
             raise
 
+    def start_publish(self) -> None:
+        """
+        Reinicia o estado da publicação desta UF antes da primeira página: as chaves de
+        rollups e snapshots tocadas pela carga e os registros rejeitados.
+        """
+        self.rollup_keys = touched_keys([])
+        self.snapshot_touched = snapshot_keys([])
+        self.batches = 0
+        self.failed_records = []
+        # Fatos que alteram linhas do snapshot atual, gravados só em finish_publish
+        self.atuais_pendentes = {}
+        # Ids das dimensões gravadas em transações ainda não confirmadas. Só vão para os
+        # caches compartilhados entre as UFs na confirmação: se a transação for desfeita,
+        # as linhas somem e os caches não podem mantê-los
+        self._discard_dimensions()
+
+    def publish_page(self, registros: Iterable[Dict[str, Any]]) -> None:
+        """
+        Grava (upsert) uma página de estoque baixada e suas dimensões, em lotes. Os
+        registros rejeitados pelos mapeamentos vão para o log e são salvos com o erro,
+        sem derrubar o restante do lote, e cada lote é gravado em seu próprio savepoint,
+        de modo que um lote com falha não desfaz a página. Fatos que alteram linhas do
+        snapshot atual ficam para finish_publish. Com `bulk_load`, os lotes são maiores
+        e os fatos são gravados com executemany.
+        """
+        batch_size = max(self.batch_size, BULK_BATCH_SIZE) if self.bulk_load else self.batch_size
+        for batch in batched(registros, batch_size):
+            self.batches += 1
+            number = self.batches
+            try:
+                with transaction.atomic():
+                    with self.report.stage('dimensions') as stage:
+                        valid, rejected = self._upsert_dimensions(batch)
+                        stage.add(rows_in=len(batch), rows_out=len(valid))
+                    with self.report.stage('transform') as stage:
+                        objects_to_create = []
+                        for est in valid:
+                            try:
+                                objects_to_create.append(self._create_estoque_object(est))
+                            except RecordError as e:
+                                rejected.append((est, e))
+                        stage.add(rows_in=len(valid), rows_out=len(objects_to_create))
+                    with self.report.stage('load') as stage:
+                        atuais, novos = self._split_current(objects_to_create)
+                        self._load_estoque(novos)
+                        stage.add(rows_in=len(objects_to_create), rows_out=len(novos))
+                # Um registro repetido em outra página substitui o anterior
+                self.atuais_pendentes.update((self._snapshot_key(obj), obj) for obj in atuais)
+                if rejected:
+                    self.logger.warning(f"Rejected {len(rejected)} invalid records in batch {number}")
+                    self.failed_records.extend((record, str(e)) for record, e in rejected)
+                touched_keys(
+                    ({'codigo_catmat': self._codigo_catmat(est), 'codigo_cnes': est['codigo_cnes']} for est in valid),
+                    self.rollup_keys
+                )
+                snapshot_keys(objects_to_create, self.snapshot_touched)
+                transaction.on_commit(self._cache_dimensions)
+            except DataError as e:
+                self.logger.error(f"Data error in batch {number}: {str(e)}")
+                self.failed_records.extend((record, str(e)) for record in batch)
+                # O lote desfeito pode ter gravado dimensões que já estão entre as pendentes
+                self._discard_dimensions()
+            except Exception as e:
+                self.logger.error(f"Error processing batch {number}: {str(e)}")
+                self.failed_records.extend((record, str(e)) for record in batch)
+                self._discard_dimensions()
+
+    def finish_publish(self, carga: CargaApi) -> None:
+        """
+        Grava os fatos adiados do snapshot atual, atualiza as tabelas derivadas das
+        chaves tocadas pela carga e a marca como publicada. Deve ser chamado na transação
+        que finaliza a UF, depois que todas as páginas passaram por publish_page.
+        """
+        with self.report.stage('load') as stage:
+            self._load_estoque(list(self.atuais_pendentes.values()))
+            stage.add(rows_in=len(self.atuais_pendentes), rows_out=len(self.atuais_pendentes))
+        with self.report.stage('snapshots') as stage:
+            refresh_snapshots(self.snapshot_touched, self.rollup_keys)
+            stage.add(rows_in=len(self.snapshot_touched))
+        with self.report.stage('spatial_index') as stage:
+            indexed = refresh_spatial_index(set().union(*self.snapshot_touched.values()))
+            stage.add(rows_out=indexed)
+        self.logger.info(f"Estoque spatial index refreshed with {indexed} locations")
+        with self.report.stage('compaction') as stage:
+            compacted = compact_snapshots()
+            stage.add(rows_out=sum(compacted.values()))
+        self.logger.info(f"Estoque snapshots refreshed for {len(self.snapshot_touched)} dates, compacted: {compacted}")
+
+        with self.report.stage('rollups') as stage:
+            refreshed = refresh_rollups(self.rollup_keys)
+            stage.add(rows_out=sum(refreshed.values()))
+        self.logger.info(f"Estoque rollups refreshed: {refreshed}")
+
+        publish_run(carga)
+        if self.failed_records:
+            self.logger.warning(f"Failed to import {len(self.failed_records)} records")
+            # Salva os registros com falha para análise posterior
+            with open(f'failed_records_{datetime.now().strftime("%Y%m%d")}.log', 'w') as f:
+                for record, error in self.failed_records:
+                    f.write(f"{error}\t{record}\n")
+
     @transaction.atomic
-    def run(self) -> None:
-        """Run the ETL process with timing information"""
+    def publish(self, carga: CargaApi) -> None:
+        """
+        Publica em uma única transação uma carga já toda em staging, como import_shards
+        faz página a página durante o download. Com `bulk_load` e a tabela vazia, os
+        índices secundários são recriados uma vez, antes da atualização das tabelas
+        derivadas.
+        """
+        self.start_publish()
+        indexes = deferred_indexes(Estoque, report=self.report) if self.bulk_load else nullcontext()
+        with indexes:
+            self.publish_page(tqdm(staged_records(carga), desc="Importando estoque"))
+        self.finish_publish(carga)
+
+    def run(self, resume: bool = False) -> None:
+        """Executa o processo de ETL, registrando a duração"""
         start_time = datetime.now()
         self.logger.info(f"Starting ETL process at {start_time}")
         
         try:
-            self.import_tipos_unidade()
-            self.import_estoque()
+            self.import_estoque(resume=resume)
             
             end_time = datetime.now()
             duration = end_time - start_time
             self.logger.info(f"ETL process completed successfully at {end_time}. Duration: {duration}")
+            self.report.finish()
         except Exception as e:
             self.logger.error(f"ETL process failed: {str(e)}")
+            self.report.finish(error=e)
             raise
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import backoff
+import requests
+from requests.adapters import HTTPAdapter
+
+from etl.instrumentation import RunReport
+from etl.page_cache import OfflineCacheMiss, PageCache
+
+# Tamanhos de página tentados na negociação, do maior para o menor
+PAGE_SIZES = (1000, 500, 200, 100, 50, 20)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Limite de requisições por segundo compartilhado entre threads. Com `rate` None, o
+    limite só passa a valer no primeiro 429, a partir da metade da taxa observada no
+    último segundo; até lá a concorrência dos downloads não é restringida. Depois, a
+    taxa cresce `increase` req/s a cada segundo de respostas bem-sucedidas, até
+    `max_rate`, e cai pela metade a cada 429; um Retry-After pausa todas as requisições
+    até o prazo informado. Os 429 de requisições concorrentes que chegam em até um
+    segundo contam como um só.
+    """
+
+    def __init__(
+        self, rate: Optional[float] = None, max_rate: float = 200.0, min_rate: float = 0.5,
+        increase: float = 5.0
+    ):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._throttled_at = None
+        # Inícios de requisição no último segundo, enquanto não há limite
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Bloqueia até haver uma ficha disponível; retorna o tempo de espera, em segundos"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.rate is None:
+                    self._recent.append(now)
+                    while now - self._recent[0] > 1.0:
+                        self._recent.popleft()
+                    return waited
+                else:
+                    # A capacidade de uma ficha espaça as requisições em vez de permitir rajadas
+                    self._tokens = min(1.0, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return waited
+                    delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def success(self) -> None:
+        with self._lock:
+            if self.rate is None:
+                return
+            # Cada resposta vale 1/rate segundos de sucesso
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._throttled_at is None or now - self._throttled_at >= 1.0:
+                current = len(self._recent) if self.rate is None else self.rate
+                self.rate = min(self.max_rate, max(self.min_rate, current / 2))
+                self._throttled_at = now
+                self._recent.clear()
+            self._tokens = 0.0
+            self._updated = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class HostStats:
+    """Vazão e contadores de respostas de um host"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.records = 0
+        self.bytes = 0
+        self.wait_seconds = 0.0
+        self.page_size = None
+        self.bucket = None
+        self._first = None
+        self._last = None
+
+    def add_response(self, response: requests.Response) -> None:
+        now = time.monotonic()
+        if self._first is None:
+            self._first = now - response.elapsed.total_seconds()
+        self._last = now
+        self.requests += 1
+        self.bytes += len(response.content)
+        if response.status_code == 429:
+            self.throttled += 1
+        elif response.status_code >= 500:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self._last - self._first) if self._first is not None else 0
+        return {
+            'host': self.host,
+            'requests': self.requests,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'cache_hits': self.cache_hits,
+            'records': self.records,
+            'megabytes': round(self.bytes / 1024 / 1024, 2),
+            'requests_per_second': round(self.requests / elapsed, 1) if elapsed else None,
+            'records_per_second': round(self.records / elapsed, 1) if elapsed else None,
+            'rate_limit_wait_seconds': round(self.wait_seconds, 4),
+            'rate_limit': round(self.bucket.rate, 2) if self.bucket and self.bucket.rate is not None else None,
+            'page_size': self.page_size,
+        }
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Prazo do cabeçalho Retry-After, em segundos ou como data HTTP"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchClient:
+    """
+    Cliente HTTP compartilhado pelas cargas da API. É a única camada de novas
+    tentativas: 429 e 503 respeitam o Retry-After e reduzem a taxa do host, os
+    demais 5xx e falhas de conexão esperam um backoff exponencial com jitter.
+    Cada host tem seu próprio TokenBucket, sem limite até o primeiro 429 salvo
+    uma `rate` inicial, e suas estatísticas, que entram no relatório da execução
+    quando `report` é informado. Com `rate_limited` falso, o limite é desligado
+    e os 429 só esperam o Retry-After. Com um PageCache em `cache`, as páginas
+    são gravadas em disco e revalidadas com requisições condicionais, ou lidas
+    só do cache quando ele é offline.
+    """
+
+    def __init__(
+        self,
+        report: Optional[RunReport] = None,
+        rate: Optional[float] = None,
+        max_rate: float = 200.0,
+        max_tries: int = 5,
+        backoff_factor: float = 0.5,
+        timeout: float = 30,
+        pool_size: int = 8,
+        cache: Optional[PageCache] = None,
+        rate_limited: bool = True,
+    ):
+        self.report = report
+        self.rate_limited = rate_limited
+        self.cache = cache
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_tries = max_tries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.hosts: Dict[str, HostStats] = report.hosts if report is not None else {}
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        # Sem Retry no adapter: as novas tentativas ficam todas em get
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def host(self, url: str) -> HostStats:
+        netloc = urlparse(url).netloc
+        with self._lock:
+            stats = self.hosts.get(netloc)
+            if stats is None:
+                stats = self.hosts[netloc] = HostStats(netloc)
+                stats.bucket = TokenBucket(self.rate, self.max_rate)
+            return stats
+
+    def get(self, url: str, params: Dict = None, headers: Dict = None) -> requests.Response:
+        """GET com limite de taxa e novas tentativas; levanta HTTPError para os demais erros"""
+        stats = self.host(url)
+        for attempt in range(1, self.max_tries + 1):
+            if self.rate_limited:
+                waited = stats.bucket.acquire()
+                with self._lock:
+                    stats.wait_seconds += waited
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_tries:
+                    raise
+                self._retry(stats, backoff.full_jitter(self.backoff_factor * 2 ** attempt))
+                continue
+            with self._lock:
+                stats.add_response(response)
+            if self.report is not None:
+                self.report.count_request()
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_tries:
+                retry_after = retry_after_seconds(response)
+                if (response.status_code == 429 or retry_after is not None) and self.rate_limited:
+                    stats.bucket.throttle(retry_after)
+                    self._retry(stats, 0)
+                elif retry_after is not None:
+                    self._retry(stats, retry_after)
+                else:
+                    self._retry(stats, backoff.full_jitter(self.backoff_factor * 2 ** attempt))
+                continue
+            response.raise_for_status()
+            stats.bucket.success()
+            return response
+
+    def get_json(self, url: str, params: Dict = None) -> Dict:
+        stats = self.host(url)
+        entry = self.cache.get(url, params) if self.cache is not None else None
+        if self.cache is not None and self.cache.offline:
+            if entry is None:
+                raise OfflineCacheMiss(f"{url} {params} is not cached")
+            data = entry['data']
+            with self._lock:
+                stats.cache_hits += 1
+        else:
+            response = self.get(url, params, headers=PageCache.conditional_headers(entry))
+            if response.status_code == 304 and entry is not None:
+                data = entry['data']
+                with self._lock:
+                    stats.cache_hits += 1
+            else:
+                data = response.json()
+                if self.cache is not None:
+                    self.cache.put(url, params, response, data)
+        with self._lock:
+            stats.records += sum(len(value) for value in data.values() if isinstance(value, list))
+        return data
+
+    def _retry(self, stats: HostStats, delay: float) -> None:
+        with self._lock:
+            stats.retries += 1
+        if self.report is not None:
+            self.report.count_retry()
+        if delay:
+            time.sleep(delay)
+
+    def negotiate_page_size(
+        self, url: str, params: Dict, key: str, sizes: Iterable[int] = PAGE_SIZES
+    ) -> int:
+        """
+        Maior tamanho de página aceito pela rota, negociado uma vez por host e guardado
+        em HostStats.page_size. Cada tamanho é testado na primeira página, do maior para
+        o menor: um erro 4xx descarta o tamanho. Uma página mais curta que o pedido só
+        reduz o tamanho quando há registros depois dela, ou seja, quando mostra o limite
+        aplicado pela API e não o fim dos dados de uma UF pequena. Offline, vale o maior
+        tamanho presente no cache.
+        """
+        stats = self.host(url)
+        if stats.page_size is not None:
+            return stats.page_size
+        sizes = sorted(sizes, reverse=True)
+        for size in sizes:
+            try:
+                data = self.get_json(url, {**params, 'limit': size, 'offset': 0})
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and 400 <= e.response.status_code < 500:
+                    continue
+                raise
+            except OfflineCacheMiss:
+                continue
+            registros = data[key]
+            capped = 0 < len(registros) < size and self._has_more(url, params, key, data, len(registros))
+            stats.page_size = len(registros) if capped else size
+            return stats.page_size
+        return sizes[-1]
+
+    def _has_more(self, url: str, params: Dict, key: str, data: Dict, offset: int) -> bool:
+        """
+        Se a rota tem registros a partir de `offset`. Vale o `total` ou o `next` da
+        resposta, quando a API os informa; sem eles, um registro de `offset` é pedido
+        """
+        if data.get('total') is not None:
+            return data['total'] > offset
+        if 'next' in data:
+            return bool(data['next'])
+        try:
+            return bool(self.get_json(url, {**params, 'limit': 1, 'offset': offset})[key])
+        except (requests.exceptions.HTTPError, OfflineCacheMiss):
+            return False
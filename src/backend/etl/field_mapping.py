@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import models
+
+from etl.parsing import parse_date
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    Mapeamento de um campo do modelo a partir de um registro da API. `source` é a chave
+    no registro (padrão: o próprio `target`); `type`, `max_length` e `null` vêm do campo
+    do modelo quando não informados, e `default` substitui valores ausentes ou vazios.
+    """
+    target: str
+    source: Optional[str] = None
+    type: Optional[str] = None
+    max_length: Optional[int] = None
+    null: Optional[bool] = None
+    default: Any = None
+
+
+class RecordError(ValueError):
+    """Registro rejeitado pelo mapeamento; `errors` associa cada campo inválido ao motivo"""
+
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+        super().__init__('; '.join(f'{campo}: {motivo}' for campo, motivo in errors.items()))
+
+
+def _to_str(value) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _to_int(value) -> int:
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('não é um inteiro')
+        return int(value)
+    return value if isinstance(value, int) else int(str(value).strip())
+
+
+def _to_float(value) -> float:
+    return value if isinstance(value, float) else float(value)
+
+
+COERCERS: Dict[str, Callable[[Any], Any]] = {
+    'str': _to_str,
+    'int': _to_int,
+    'float': _to_float,
+    # Datas não reconhecidas viram None; o texto original fica nos campos *_original.
+    # Os mesmos valores se repetem em toda a carga, então o resultado é memorizado
+    'date': lru_cache(maxsize=4096)(parse_date),
+    'raw': lambda value: value,
+}
+FIELD_TYPES = {
+    'CharField': 'str',
+    'TextField': 'str',
+    'IntegerField': 'int',
+    'BigIntegerField': 'int',
+    'SmallIntegerField': 'int',
+    'FloatField': 'float',
+    'DateField': 'date',
+}
+
+
+class RecordMapping:
+    """
+    Conversor de registros da API em instâncias de `model`, compilado uma vez a partir
+    dos FieldSpec: tipo, truncamento, obrigatoriedade e valor padrão de cada campo são
+    resolvidos aqui, e a conversão de um registro é um laço sobre tuplas prontas.
+    """
+
+    def __init__(self, model, specs: Sequence[FieldSpec]):
+        self.model = model
+        self.specs = tuple(specs)
+        self._fields: List[Tuple[str, str, Callable, Optional[int], Any, bool]] = []
+        for spec in self.specs:
+            field = model._meta.get_field(spec.target)
+            tipo = spec.type or FIELD_TYPES.get(field.get_internal_type(), 'raw')
+            max_length = spec.max_length or (field.max_length if tipo == 'str' else None)
+            null = field.null if spec.null is None else spec.null
+            default = spec.default
+            if default is None and field.has_default() and not callable(field.default):
+                default = field.default
+            self._fields.append((
+                # Chaves estrangeiras recebem o valor da chave primária no atributo *_id
+                field.attname, spec.source or spec.target, COERCERS[tipo], max_length, default, null
+            ))
+
+    def values(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Valores convertidos do registro por atributo do modelo; levanta RecordError"""
+        values = {}
+        errors = None
+        for attname, source, coerce, max_length, default, null in self._fields:
+            value = record.get(source)
+            if value is None or value == '':
+                value = default
+            else:
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError) as e:
+                    errors = errors or {}
+                    errors[attname] = f'{value!r}: {e}'
+                    continue
+                if max_length is not None:
+                    value = value[:max_length]
+            if value is None and not null:
+                errors = errors or {}
+                errors[attname] = 'obrigatório'
+                continue
+            values[attname] = value
+        if errors:
+            raise RecordError(errors)
+        return values
+
+    def __call__(self, record: Dict[str, Any], **extra) -> models.Model:
+        """Instância do modelo para o registro; `extra` define atributos fora do mapeamento"""
+        values = self.values(record)
+        values.update(extra)
+        return self.model(**values)
+
+    def convert_batch(
+        self, records: Iterable[Dict[str, Any]]
+    ) -> Tuple[List[models.Model], List[Tuple[Dict[str, Any], RecordError]]]:
+        """Converte um lote, separando as instâncias válidas dos registros rejeitados"""
+        objects, failures = [], []
+        for record in records:
+            try:
+                objects.append(self(record))
+            except RecordError as e:
+                failures.append((record, e))
+        return objects, failures
@@ -0,0 +1,150 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sized
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo até o momento, em MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+
+
+class StageStats:
+    """Métricas acumuladas de uma etapa; a mesma etapa pode ser executada várias vezes (ex.: por lote)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.http_requests = 0
+        self.http_retries = 0
+        self.peak_rss_mb = None
+
+    def add(self, rows_in: int = 0, rows_out: int = 0) -> None:
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'calls': self.calls,
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_second': round(self.rows_out / self.wall_seconds, 1) if self.wall_seconds else None,
+            'peak_rss_mb': self.peak_rss_mb,
+            'http_requests': self.http_requests,
+            'http_retries': self.http_retries,
+        }
+
+
+class RunReport:
+    """Relatório de uma execução de ETL, com métricas por etapa e contadores HTTP"""
+
+    def __init__(self, etl: str):
+        self.etl = etl
+        self.started_at = datetime.now()
+        self.status = 'running'
+        self.error = None
+        self.stages: Dict[str, StageStats] = {}
+        self.http_requests = 0
+        self.http_retries = 0
+        # Estatísticas por host, preenchidas pelo FetchClient da carga
+        self.hosts: Dict[str, Any] = {}
+        # Requisições podem ser contadas por várias threads de download
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._wall_seconds = None
+        self._cpu_seconds = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mede tempo de parede, CPU, memória e requisições HTTP do bloco"""
+        stats = self.stages.setdefault(name, StageStats(name))
+        requests_before, retries_before = self.http_requests, self.http_retries
+        start, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.calls += 1
+            stats.wall_seconds += time.perf_counter() - start
+            stats.cpu_seconds += time.process_time() - start_cpu
+            stats.http_requests += self.http_requests - requests_before
+            stats.http_retries += self.http_retries - retries_before
+            stats.peak_rss_mb = peak_rss_mb()
+
+    def iter_stage(
+        self, name: str, iterable: Iterable[Sized], rows: Callable[[Any], int] = len
+    ) -> Iterator[Sized]:
+        """
+        Repassa os itens de `iterable` medindo na etapa apenas a espera por cada um;
+        `rows` conta as linhas de cada item
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stats:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stats.add(rows_out=rows(item))
+            yield item
+
+    def count_request(self, retries: int = 0) -> None:
+        with self._lock:
+            self.http_requests += 1
+            self.http_retries += retries
+
+    def count_retry(self) -> None:
+        with self._lock:
+            self.http_retries += 1
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.status = 'failed' if error else 'succeeded'
+        self.error = str(error) if error else None
+        self._wall_seconds = time.perf_counter() - self._start
+        self._cpu_seconds = time.process_time() - self._start_cpu
+
+    def to_dict(self) -> Dict[str, Any]:
+        wall = self._wall_seconds if self._wall_seconds is not None else time.perf_counter() - self._start
+        cpu = self._cpu_seconds if self._cpu_seconds is not None else time.process_time() - self._start_cpu
+        return {
+            'etl': self.etl,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'status': self.status,
+            'error': self.error,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'http_requests': self.http_requests,
+            'http_retries': self.http_retries,
+            'hosts': [stats.to_dict() for stats in self.hosts.values()],
+            'stages': [stats.to_dict() for stats in self.stages.values()],
+        }
+
+    def write(self, path: str) -> None:
+        """Grava o relatório em JSON; '-' escreve na saída padrão"""
+        content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        if path == '-':
+            sys.stdout.write(content + '\n')
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content + '\n')
+
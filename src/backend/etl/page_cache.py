@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+
+class OfflineCacheMiss(LookupError):
+    """Página ausente do cache em uma execução --offline"""
+
+
+class PageCache:
+    """
+    Cache em disco das respostas brutas da API, em JSON com gzip, indexado pela URL e
+    pelos parâmetros da requisição. O ETag e o Last-Modified da resposta são guardados
+    para que a próxima execução faça uma requisição condicional; com `offline`, o
+    FetchClient não acessa a rede e só lê do cache.
+    """
+
+    def __init__(self, directory, offline: bool = False):
+        self.directory = Path(directory)
+        self.offline = offline
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        canonical = json.dumps(
+            [url, sorted((str(k), str(v)) for k, v in (params or {}).items())], ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def path(self, url: str, params: Optional[Dict] = None) -> Path:
+        key = self.key(url, params)
+        return self.directory / key[:2] / f'{key}.json.gz'
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """Entrada gravada para a requisição: data, etag, last_modified e fetched_at"""
+        try:
+            with gzip.open(self.path(url, params), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, params: Optional[Dict], response: requests.Response, data: Any) -> None:
+        path = self.path(url, params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            'url': url,
+            'params': params,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+            'data': data,
+        }
+        # Grava em um arquivo temporário e renomeia, para que threads e execuções
+        # interrompidas nunca deixem uma entrada truncada
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Cabeçalhos If-None-Match/If-Modified-Since a partir de uma entrada do cache"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
@@ -0,0 +1,26 @@
+from datetime import date, datetime
+from typing import Optional
+
+# Formatos de data observados nas APIs de dados abertos
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y%m%d', '%d-%m-%Y')
+
+
+def parse_date(value) -> Optional[date]:
+    """Converte o valor textual da API em date, retornando None se não for reconhecido"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    # Descarta componente de hora (ex.: 2024-11-20T00:00:00 ou 2024-11-20 00:00:00)
+    text = text.replace('T', ' ').split(' ')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
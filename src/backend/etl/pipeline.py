@@ -0,0 +1,76 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+K = TypeVar('K')
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Agrupa os itens em listas de até `size` elementos"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class SourceDone:
+    """Marca o fim de uma fonte em iter_merged; `error` é a exceção que a interrompeu, se houver"""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+def iter_merged(
+    sources: Dict[K, Iterable[T]], workers: int = 4, maxsize: int = 8
+) -> Iterator[Tuple[K, Union[T, SourceDone]]]:
+    """
+    Consome várias fontes em até `workers` threads e entrega `(chave, item)` na ordem de
+    chegada, por uma única fila limitada. O fim de cada fonte chega como `(chave,
+    SourceDone)`; uma fonte que falha não interrompe as demais, e sua exceção vai em
+    `SourceDone.error`. Se o consumidor parar antes do fim, as threads são interrompidas.
+    """
+    fila = queue.Queue(maxsize=max(1, maxsize))
+    parar = threading.Event()
+
+    def put(item) -> bool:
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produzir(chave, iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((chave, item)):
+                    break
+            else:
+                put((chave, SourceDone()))
+        except BaseException as e:
+            put((chave, SourceDone(e)))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    pool = ThreadPoolExecutor(max(1, workers))
+    for chave, iterable in sources.items():
+        pool.submit(produzir, chave, iterable)
+    try:
+        pendentes = len(sources)
+        while pendentes:
+            chave, item = fila.get()
+            if isinstance(item, SourceDone):
+                pendentes -= 1
+            yield chave, item
+    finally:
+        parar.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,162 @@
+import copy
+from contextlib import nullcontext
+from typing import Dict, List, Sequence, Union
+
+from django.db import transaction
+
+from api.models import CargaApi
+from etl.bulk_load import deferred_indexes
+from etl.checkpoint import fail_run, finish_download, stage_page, staged_records, start_run
+from etl.pipeline import SourceDone, iter_merged
+
+# Códigos IBGE das unidades da federação
+UF_CODES = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP',
+    41: 'PR', 42: 'SC', 43: 'RS',
+    50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF',
+}
+
+
+def parse_ufs(value: Union[int, str, Sequence]) -> List[int]:
+    """
+    Lista de códigos de UF a partir de um código, de uma lista de códigos ou siglas
+    separados por vírgula (ex.: "29,SE") ou de "all" para todas as UFs
+    """
+    if isinstance(value, int):
+        value = [value]
+    elif isinstance(value, str):
+        if value.strip().lower() == 'all':
+            return list(UF_CODES)
+        value = [item.strip() for item in value.split(',') if item.strip()]
+    siglas = {sigla: codigo for codigo, sigla in UF_CODES.items()}
+    ufs = []
+    for item in value:
+        codigo = siglas.get(str(item).upper()) or (int(item) if str(item).isdigit() else None)
+        if codigo not in UF_CODES:
+            raise ValueError(f"Unknown UF: {item}")
+        if codigo not in ufs:
+            ufs.append(codigo)
+    return ufs
+
+
+def shard(etl, uf_code: int):
+    """
+    Cópia rasa do ETL restrita a uma UF. Cliente HTTP, relatório, logger e caches de
+    dimensões são compartilhados, de modo que o limite de taxa vale para todas as UFs
+    """
+    copia = copy.copy(etl)
+    copia.uf_code = uf_code
+    return copia
+
+
+def import_shards(etl, fonte: str, resume: bool = False, deferred_model=None) -> None:
+    """
+    Importa cada UF de `etl.uf_codes` como uma carga própria (CargaApi por fonte e UF).
+
+    As UFs são baixadas em paralelo por até `etl.shard_workers` threads, que só acessam
+    a API; a thread atual é a única que escreve no banco, o que evita disputa pelo lock
+    de escrita do SQLite. Cada página é convertida e gravada nas tabelas finais assim
+    que chega (`publish_page` do ETL), na mesma transação que a grava em staging e
+    avança o checkpoint, de modo que a gravação se sobrepõe aos downloads. Quando o
+    download de uma UF termina, `finish_publish` fecha e publica a carga dela em outra
+    transação. Uma UF que falha não interrompe as demais; seu checkpoint fica
+    disponível para --resume e a falha é relançada ao fim, com todas as UFs que
+    falharam.
+
+    Com `deferred_model`, os índices secundários da tabela dele podem ser adiados
+    durante os downloads (ver deferred_indexes); nesse caso, as UFs só são finalizadas
+    depois que os índices são recriados.
+    """
+    shards, cargas = {}, {}
+    for uf in etl.uf_codes:
+        shards[uf] = shard(etl, uf)
+        cargas[uf] = start_run(fonte, uf, resume)
+
+    errors: Dict[int, BaseException] = {}
+    adiadas: List[int] = []
+
+    def fail(uf: int, error: BaseException) -> None:
+        etl.logger.error(f"UF {uf}: publish failed: {str(error)}")
+        errors[uf] = error
+
+    def finish(uf: int) -> None:
+        try:
+            with transaction.atomic():
+                shards[uf].finish_publish(cargas[uf])
+        except Exception as e:
+            fail(uf, e)
+
+    def downloaded(uf: int) -> None:
+        # Com os índices adiados, a finalização espera que eles sejam recriados
+        if deferred:
+            adiadas.append(uf)
+        else:
+            finish(uf)
+
+    indexes = (
+        deferred_indexes(deferred_model, report=etl.report)
+        if deferred_model is not None else nullcontext(False)
+    )
+    with indexes as deferred:
+        for uf, carga in cargas.items():
+            try:
+                shards[uf].start_publish()
+                # As páginas de uma carga retomada já estão nas tabelas finais; regravá-las,
+                # com upserts idempotentes, só refaz o estado da publicação da UF
+                if carga.registros:
+                    with transaction.atomic():
+                        shards[uf].publish_page(staged_records(carga))
+            except Exception as e:
+                fail(uf, e)
+            else:
+                # Cargas retomadas já baixadas só precisam ser finalizadas
+                if carga.status == CargaApi.BAIXADO:
+                    downloaded(uf)
+
+        downloads = {
+            uf: shards[uf].iter_pages(carga.ultimo_offset)
+            for uf, carga in cargas.items() if carga.status == CargaApi.BAIXANDO and uf not in errors
+        }
+        for uf in downloads:
+            if cargas[uf].ultimo_offset:
+                etl.logger.info(f"UF {uf}: resuming run {cargas[uf].run_id} from offset {cargas[uf].ultimo_offset}")
+
+        # A fila limitada define quanto os downloads podem se adiantar à gravação
+        pages = etl.report.iter_stage(
+            'fetch',
+            iter_merged(downloads, workers=etl.shard_workers, maxsize=etl.queue_size),
+            rows=lambda item: 0 if isinstance(item[1], SourceDone) else len(item[1]),
+        )
+        for uf, item in pages:
+            carga = cargas[uf]
+            if uf in errors:
+                # Depois de uma falha de gravação, o restante do download da UF é descartado
+                continue
+            if not isinstance(item, SourceDone):
+                try:
+                    with transaction.atomic():
+                        shards[uf].publish_page(item)
+                        with etl.report.stage('staging') as stats:
+                            stage_page(carga, item, shards[uf].page_size)
+                            stats.add(rows_in=len(item), rows_out=len(item))
+                except Exception as e:
+                    fail(uf, e)
+            elif item.error is not None:
+                etl.logger.error(f"UF {uf}: download failed: {str(item.error)}")
+                fail_run(carga, item.error)
+                errors[uf] = item.error
+            else:
+                finish_download(carga)
+                etl.logger.info(f"UF {uf}: successfully fetched {carga.registros} records")
+                downloaded(uf)
+
+    for uf in adiadas:
+        finish(uf)
+
+    if errors:
+        raise RuntimeError(
+            f"{len(errors)} of {len(cargas)} UF shards failed: "
+            + '; '.join(f"{uf}: {error}" for uf, error in sorted(errors.items()))
+        )
@@ -0,0 +1,123 @@
+import re
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Quantas linhas do topo da planilha são examinadas à procura do cabeçalho
+HEADER_SEARCH_ROWS = 10
+YEAR_LIKE = re.compile(r'(19|20)\d{2}')
+
+ERRO = 'erro'
+AVISO = 'aviso'
+
+ValidationIssue = namedtuple('ValidationIssue', ['planilha', 'nivel', 'mensagem'])
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    """Estrutura esperada de uma planilha de indicador"""
+    header_row: int
+    required_columns: Tuple[str, ...]
+    anos: range
+    # Códigos IBGE de 6 dígitos (sem o verificador) aceitos; vazio desativa a verificação
+    codigos_ibge: FrozenSet[str] = frozenset()
+    valor_min: Optional[float] = 0.0
+    valor_max: Optional[float] = None
+    # Faixas específicas por indicador: nome_arquivo -> (mínimo, máximo)
+    faixas: Dict[str, Tuple[Optional[float], Optional[float]]] = field(default_factory=dict)
+
+
+class SheetValidationError(ValueError):
+    """Falha de validação das planilhas, levantada antes de qualquer escrita no banco"""
+
+    def __init__(self, issues: Sequence[ValidationIssue]):
+        self.issues = list(issues)
+        erros = [issue for issue in self.issues if issue.nivel == ERRO]
+        super().__init__(
+            f"{len(erros)} erro(s) de validação: "
+            + '; '.join(f"{issue.planilha}: {issue.mensagem}" for issue in erros)
+        )
+
+
+def find_header_row(grid: List[tuple], required_columns: Sequence[str]) -> Optional[int]:
+    """Índice da primeira linha do topo que contém todas as colunas obrigatórias"""
+    for position, row in enumerate(grid[:HEADER_SEARCH_ROWS]):
+        if set(required_columns).issubset(cell for cell in row if isinstance(cell, str)):
+            return position
+    return None
+
+
+def validate_sheet(
+    nome: str, grid: List[tuple], dados: Optional[pd.DataFrame], schema: SheetSchema
+) -> List[ValidationIssue]:
+    """Verifica estrutura e valores de uma planilha já lida pelo carregador
+
+    As verificações de valores operam sobre colunas inteiras do DataFrame produzido pela
+    carga, sem reler a planilha.
+    """
+    issues = []
+
+    def issue(nivel: str, mensagem: str):
+        issues.append(ValidationIssue(nome, nivel, mensagem))
+
+    header_row = find_header_row(grid, schema.required_columns)
+    if header_row is None:
+        issue(ERRO, f"colunas obrigatórias não encontradas nas {HEADER_SEARCH_ROWS} primeiras linhas")
+        return issues
+    if header_row != schema.header_row:
+        # O carregador ignora a planilha com um aviso; as demais continuam sendo carregadas
+        issue(
+            AVISO,
+            f"cabeçalho na linha {header_row + 1}, esperado na linha {schema.header_row + 1}; "
+            "planilha não será carregada",
+        )
+        return issues
+    if dados is None:
+        issue(ERRO, "planilha não pôde ser processada")
+        return issues
+
+    year_columns = [col for col in dados.columns if col not in schema.required_columns]
+    if not year_columns:
+        ignoradas = [
+            ' '.join(str(cell).split())[:30] for cell in grid[header_row]
+            if cell is not None and YEAR_LIKE.search(str(cell))
+        ]
+        detalhe = f" (colunas ignoradas: {', '.join(ignoradas[:5])})" if ignoradas else ''
+        issue(AVISO, f"nenhuma coluna de ano reconhecida, valores não serão carregados{detalhe}")
+    fora = [col for col in year_columns if int(col) not in schema.anos]
+    if fora:
+        issue(ERRO, f"anos fora de {schema.anos.start}-{schema.anos.stop - 1}: {', '.join(fora)}")
+
+    codigos = dados['Cod. IBGE']
+    invalidos = ~codigos.str.fullmatch(r'\d{6}').fillna(False)
+    if schema.codigos_ibge:
+        # isin sobre a coluna 'string' compara elemento a elemento; em object usa hash
+        invalidos |= ~codigos.astype(object).isin(schema.codigos_ibge)
+    if invalidos.any():
+        issue(ERRO, f"{int(invalidos.sum())} código(s) IBGE inválido(s): {', '.join(codigos[invalidos].head(5))}")
+
+    duplicados = codigos.duplicated(keep=False)
+    if duplicados.any():
+        municipios = dados.loc[duplicados, 'Município'].astype(str).drop_duplicates()
+        issue(ERRO, f"{len(municipios)} município(s) duplicado(s): {', '.join(municipios.head(5))}")
+
+    if year_columns:
+        valor_min, valor_max = schema.faixas.get(nome, (schema.valor_min, schema.valor_max))
+        valores = dados[year_columns].to_numpy(dtype='float64')
+        fora_faixa = np.isinf(valores)
+        if valor_min is not None:
+            fora_faixa |= valores < valor_min
+        if valor_max is not None:
+            fora_faixa |= valores > valor_max
+        if fora_faixa.any():
+            colunas = [col for col, ruim in zip(year_columns, fora_faixa.any(axis=0)) if ruim]
+            issue(
+                ERRO,
+                f"{int(fora_faixa.sum())} valor(es) fora da faixa [{valor_min}, {valor_max}] "
+                f"nos anos {', '.join(colunas)}",
+            )
+
+    return issues
@@ -130,3 +130,15 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Estoque snapshots
+# Raw rows older than this many days are compacted into the aggregated time series
+ESTOQUE_SNAPSHOT_RETENCAO_DIAS = 90
+# Aggregated time series retention in days (None keeps it indefinitely)
+ESTOQUE_SERIE_RETENCAO_DIAS = None
+
+
+# API page cache
+# Gzip-compressed raw API pages used by import_estabelecimentos/import_estoque --cache and --offline
+ETL_API_CACHE_DIR = BASE_DIR / 'cache' / 'api'
@@ -25,6 +25,13 @@ from api.views import (
     TipoUnidadeListView,
     CidadeListView,
     EstoqueView,
+    EstabelecimentosExportView,
+    EstoqueExportView,
+    EstoqueVencimentoView,
+    EstoquePivotView,
+    EstoqueSnapshotListView,
+    EstoqueSerieView,
+    EstoqueProximosView,
 )
 
 urlpatterns = [
@@ -34,7 +41,28 @@ urlpatterns = [
     path(
         "api/estabelecimentos/", EstabelecimentosView.as_view(), name="estabelecimentos"
     ),
+    path(
+        "api/estabelecimentos/export/",
+        EstabelecimentosExportView.as_view(),
+        name="estabelecimentos_export",
+    ),
     path("api/tipos_unidade/", TipoUnidadeListView.as_view(), name="tipos_unidade"),
     path("api/cidades/", CidadeListView.as_view(), name="cidades"),
     path("api/estoque/", EstoqueView.as_view(), name="estoque"),
+    path("api/estoque/export/", EstoqueExportView.as_view(), name="estoque_export"),
+    path(
+        "api/estoque/vencimentos/",
+        EstoqueVencimentoView.as_view(),
+        name="estoque_vencimentos",
+    ),
+    path("api/estoque/pivot/", EstoquePivotView.as_view(), name="estoque_pivot"),
+    path(
+        "api/estoque/snapshots/",
+        EstoqueSnapshotListView.as_view(),
+        name="estoque_snapshots",
+    ),
+    path("api/estoque/serie/", EstoqueSerieView.as_view(), name="estoque_serie"),
+    path(
+        "api/estoque/proximos/", EstoqueProximosView.as_view(), name="estoque_proximos"
+    ),
 ]
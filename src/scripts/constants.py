@@ -3,4 +3,6 @@
 GEOJSON_PATH = "assets/data/geojs-29-mun.json"
 MUNICIPIOS_CSV_PATH = "assets/data/municipios.csv"
 SERIE_HISTORICA_XLSX_PATH = "assets/data/serie_historica.xlsx"
-TITULO_SUBTITULO_CSV_PATH = "assets/data/titulo_subtitulo.csv"
\ No newline at end of file
+TITULO_SUBTITULO_CSV_PATH = "assets/data/titulo_subtitulo.csv"
+INDICADORES_PARQUET_PATH = "assets/data/indicadores.parquet"
+INDICADORES_CSV_DIR = "assets/indicadores"
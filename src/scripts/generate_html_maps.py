@@ -5,7 +5,8 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import argparse
 import re
-from constants import GEOJSON_PATH, TITULO_SUBTITULO_CSV_PATH
+from constants import GEOJSON_PATH
+from indicator_store import load_indicador, load_metadados
 
 # Definição dos anos e indicadores
 anos = [
@@ -132,22 +133,20 @@ def extract_meta_value(meta_text):
         return float(match.group(1))
     return 0
 
-def generate_interactive_map(geojson_path, indicador_csv_path, titulo_subtitulo_csv_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
+def generate_interactive_map(geojson_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
     try:
         # Carregar dados
         print("Carregando dados...")
         with open(geojson_path, 'r', encoding='utf-8') as file:
             geojson_data = json.load(file)
         
-        df_indicador = pd.read_csv(indicador_csv_path)
-        df_indicador['Cod. IBGE'] = df_indicador['Cod. IBGE'].astype(str)
-        
-        df_titulo_subtitulo = pd.read_csv(titulo_subtitulo_csv_path).fillna("")
+        df_indicador = load_indicador(indicador)
         
         # Extrair informações
-        titulo = df_titulo_subtitulo[df_titulo_subtitulo['nome_arquivo'] == indicador]['titulo'].values[0]
-        fonte = df_titulo_subtitulo[df_titulo_subtitulo['nome_arquivo'] == indicador]['fonte'].values[0]
-        meta_estadual = df_titulo_subtitulo[df_titulo_subtitulo['nome_arquivo'] == indicador]['subtitulo'].values[0]
+        metadados = load_metadados(indicador)
+        titulo = metadados['titulo']
+        fonte = metadados['fonte']
+        meta_estadual = metadados['subtitulo']
         meta_estadual_valor = extract_meta_value(meta_estadual)
         
         print(f"Título: {titulo}")
@@ -233,13 +232,11 @@ def adjust_cod_ibge(df):
     return df
 
 # Função principal para gerar o mapa
-def generate_map(geojson_path, indicador_csv_path, titulo_subtitulo_csv_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
+def generate_map(geojson_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
     try:
         print("Iniciando geração do mapa...")
         output_path = generate_interactive_map(
             geojson_path=geojson_path,
-            indicador_csv_path=indicador_csv_path,
-            titulo_subtitulo_csv_path=titulo_subtitulo_csv_path,
             ano=ano,
             indicador=indicador,
             prefix_meta=prefix_meta,
@@ -255,7 +252,6 @@ def generate_map(geojson_path, indicador_csv_path, titulo_subtitulo_csv_path, an
 
 # Parâmetros
 geojson_path = GEOJSON_PATH
-titulo_subtitulo_csv_path = TITULO_SUBTITULO_CSV_PATH
 
 # Configurar argparse
 parser = argparse.ArgumentParser(description="Gerar mapas de indicadores de saúde.")
@@ -266,12 +262,9 @@ args = parser.parse_args()
 if args.indicador:
     if args.indicador in indicadores_dic:
         for ano in anos:
-            indicador_csv_path = f"assets/indicadores/{args.indicador}.csv"
             params = indicadores_dic[args.indicador]
             generate_map(
                 geojson_path,
-                indicador_csv_path,
-                titulo_subtitulo_csv_path,
                 ano,
                 args.indicador,
                 params["prefix_meta"],
@@ -283,11 +276,8 @@ if args.indicador:
 else:
     for ano in anos:
         for indicador, params in indicadores_dic.items():
-            indicador_csv_path = f"assets/indicadores/{indicador}.csv"
             generate_map(
                 geojson_path,
-                indicador_csv_path,
-                titulo_subtitulo_csv_path,
                 ano,
                 indicador,
                 params["prefix_meta"],
@@ -0,0 +1,79 @@
+"""Leitura do cache Parquet de indicadores gerado pelo `import_data`
+
+O cache guarda todas as planilhas em formato longo (uma linha por indicador, município e ano)
+com tipos fixos; título, subtítulo e fonte ficam nos metadados do arquivo. Quando ele ainda não
+existe, os CSVs de `assets/indicadores` e `titulo_subtitulo.csv` são usados.
+"""
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+try:
+    from constants import INDICADORES_CSV_DIR, INDICADORES_PARQUET_PATH, TITULO_SUBTITULO_CSV_PATH
+except ImportError:
+    from .constants import INDICADORES_CSV_DIR, INDICADORES_PARQUET_PATH, TITULO_SUBTITULO_CSV_PATH
+
+# Colunas do formato largo das planilhas originais
+WIDE_COLUMNS = {
+    'macrorregiao': 'Macrorregião de Saúde',
+    'regiao_saude': 'Região de Saúde',
+    'cod_ibge': 'Cod. IBGE',
+    'municipio': 'Município',
+}
+
+
+@lru_cache(maxsize=4)
+def _read_store(path: str, mtime: float) -> pd.DataFrame:
+    # `mtime` faz parte da chave para invalidar o cache quando o ETL regrava o arquivo
+    return pd.read_parquet(path)
+
+
+def has_store(path: str = INDICADORES_PARQUET_PATH) -> bool:
+    return os.path.exists(path)
+
+
+def load_indicadores(
+    indicadores: Optional[Iterable[str]] = None, path: str = INDICADORES_PARQUET_PATH
+) -> pd.DataFrame:
+    """Dados em formato longo, opcionalmente filtrados por nome do indicador (ex.: 'indicador_3')"""
+    store = _read_store(path, os.path.getmtime(path))
+    if indicadores is not None:
+        store = store[store['nome_arquivo'].isin([nome.lower() for nome in indicadores])]
+    return store.copy()
+
+
+def load_indicador(indicador: str, path: str = INDICADORES_PARQUET_PATH) -> pd.DataFrame:
+    """Indicador no formato largo das planilhas: 'Cod. IBGE' como texto e uma coluna float por ano
+
+    Sem o cache, lê o CSV correspondente mantendo os valores como estão no arquivo.
+    """
+    if not has_store(path):
+        return pd.read_csv(os.path.join(INDICADORES_CSV_DIR, f'{indicador}.csv'), dtype={'Cod. IBGE': str})
+
+    longo = load_indicadores([indicador], path)
+    if longo.empty:
+        raise KeyError(f"Indicador {indicador} não encontrado em {path}")
+
+    municipios = longo.drop_duplicates('cod_ibge')[list(WIDE_COLUMNS)]
+    valores = longo.pivot(index='cod_ibge', columns='ano', values='valor')
+    valores.columns = [str(ano) for ano in valores.columns]
+    wide = municipios.merge(valores, left_on='cod_ibge', right_index=True)
+    wide = wide.astype({coluna: str for coluna in WIDE_COLUMNS}).rename(columns=WIDE_COLUMNS)
+    return wide.reset_index(drop=True)
+
+
+def load_metadados(indicador: str, path: str = INDICADORES_PARQUET_PATH) -> Dict[str, str]:
+    """Título, subtítulo (meta estadual) e fonte do indicador, com '' para valores ausentes"""
+    campos = ['titulo', 'subtitulo', 'fonte']
+    if has_store(path):
+        metadados = _read_store(path, os.path.getmtime(path)).attrs.get('indicadores', {})
+        linha = metadados.get(indicador.lower())
+    else:
+        metadados = pd.read_csv(TITULO_SUBTITULO_CSV_PATH)
+        metadados = metadados[metadados['nome_arquivo'].str.lower() == indicador.lower()]
+        linha = None if metadados.empty else metadados.iloc[0]
+    if linha is None:
+        raise KeyError(f"Indicador {indicador} não encontrado")
+    return {campo: '' if pd.isna(linha[campo]) else str(linha[campo]) for campo in campos}
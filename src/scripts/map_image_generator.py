@@ -8,7 +8,8 @@ import os
 import textwrap
 import matplotlib.patches as patches
 import argparse
-from constants import GEOJSON_PATH, TITULO_SUBTITULO_CSV_PATH
+from constants import GEOJSON_PATH
+from indicator_store import load_indicador, load_metadados
 
 # Definição dos anos e indicadores
 anos = [
@@ -96,10 +97,6 @@ def load_geojson(geojson_path):
         geojson_data = json.load(file)
     return geojson_data
 
-# Função para carregar dados do CSV
-def load_csv_data(csv_path):
-    return pd.read_csv(csv_path)
-
 # Função para ajustar o código IBGE
 def adjust_cod_ibge(df):
     df["Cod. IBGE"] = df["Cod. IBGE"].astype(str)
@@ -171,17 +168,17 @@ def create_map(gdf, min_val, max_val, meta_estadual_valor, titulo, ano, fonte, p
     plt.savefig(f"imagens/mapa_bahia_{indicador}_{ano}.png", dpi=300, bbox_inches="tight")
 
 # Função principal para gerar o mapa
-def generate_map(geojson_path, indicador_csv_path, titulo_subtitulo_csv_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
+def generate_map(geojson_path, ano, indicador, prefix_meta, sufix_meta, invert_colors=False):
     try:
         # Carregar dados
         geojson_data = load_geojson(geojson_path)
-        df_indicador = load_csv_data(indicador_csv_path)
-        df_titulo_subtitulo = load_csv_data(titulo_subtitulo_csv_path).fillna("")
+        df_indicador = load_indicador(indicador)
         
         # Extrair título e meta estadual
-        titulo = df_titulo_subtitulo[df_titulo_subtitulo["nome_arquivo"] == indicador]["titulo"].values[0]
-        meta_estadual = df_titulo_subtitulo[df_titulo_subtitulo["nome_arquivo"] == indicador]["subtitulo"].values[0]
-        fonte = df_titulo_subtitulo[df_titulo_subtitulo["nome_arquivo"] == indicador]["fonte"].values[0]
+        metadados = load_metadados(indicador)
+        titulo = metadados["titulo"]
+        meta_estadual = metadados["subtitulo"]
+        fonte = metadados["fonte"]
         meta_estadual_valor = float(extract_meta_value(meta_estadual))
         print(f"Meta Estadual do Indicador : {meta_estadual_valor}")
         
@@ -209,7 +206,6 @@ def generate_map(geojson_path, indicador_csv_path, titulo_subtitulo_csv_path, an
 
 # Parâmetros
 geojson_path = GEOJSON_PATH
-titulo_subtitulo_csv_path = TITULO_SUBTITULO_CSV_PATH
 
 # Configurar argparse
 parser = argparse.ArgumentParser(description="Gerar mapas de indicadores de saúde.")
@@ -220,12 +216,9 @@ args = parser.parse_args()
 if args.indicador:
     if args.indicador in indicadores_dic:
         for ano in anos:
-            indicador_csv_path = f"assets/indicadores/{args.indicador}.csv"
             params = indicadores_dic[args.indicador]
             generate_map(
                 geojson_path,
-                indicador_csv_path,
-                titulo_subtitulo_csv_path,
                 ano,
                 args.indicador,
                 params["prefix_meta"],
@@ -237,11 +230,8 @@ if args.indicador:
 else:
     for ano in anos:
         for indicador, params in indicadores_dic.items():
-            indicador_csv_path = f"assets/indicadores/{indicador}.csv"
             generate_map(
                 geojson_path,
-                indicador_csv_path,
-                titulo_subtitulo_csv_path,
                 ano,
                 indicador,
                 params["prefix_meta"],
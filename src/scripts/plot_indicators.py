@@ -1,11 +1,12 @@
 import pandas as pd
 import folium
 from folium.plugins import HeatMap
+from indicator_store import load_indicador
 
 # Função para criar o mapa de calor
 def create_heatmap(year):
     # Carregar os dados dos indicadores
-    df_indicador_3 = pd.read_csv('./assets/indicadores/indicador_3.csv')
+    df_indicador_3 = load_indicador('indicador_3')
 
     # Carregar os dados de coordenadas das cidades
     df_coords = pd.read_csv('coordenadas_cidades.csv')
@@ -20,10 +21,7 @@ def create_heatmap(year):
         raise ValueError(f"Colunas necessárias ausentes em df_coords: {required_columns_coords}")
 
     # Ajustar o código IBGE da tabela de coordenadas para remover o último dígito
-    df_coords['codigo_ibge'] = df_coords['codigo_ibge'].astype(str).str[:-1].astype(int)
-
-    # Converter a coluna 'Cod. IBGE' para inteiro
-    df_indicador_3['Cod. IBGE'] = df_indicador_3['Cod. IBGE'].astype(int)
+    df_coords['codigo_ibge'] = df_coords['codigo_ibge'].astype(str).str[:-1]
 
     # Mesclar os dados dos indicadores com as coordenadas das cidades
     df_merged = pd.merge(df_indicador_3, df_coords, left_on='Cod. IBGE', right_on='codigo_ibge')